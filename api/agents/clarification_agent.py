@@ -1,10 +1,8 @@
 from loguru import logger
-from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
 from app.models.queries import EnrichedQuery
+from app.services.llm import run_agent
+from app.services.rate_limiter import Priority
 from app.utils import load_factor_templates
 
 
@@ -16,11 +14,8 @@ async def clarify_query(query: str, api_key: str) -> EnrichedQuery:
     templates = load_factor_templates()
     generic_factors = templates.get("generic", [])
 
-    provider = GoogleGLAProvider(api_key=api_key)
-    llm = GeminiModel(model_name="gemini-2.0-flash", provider=provider)
-
-    agent = Agent(
-        model=llm,
+    enriched_result = await run_agent(
+        f"Evaluate the following product query: '{query}'",
         system_prompt=(
             "You are a search query assistant. Your only job is to evaluate a user's query about a software product category. You have two possible outputs:\n"
             "1.  If the query is specific and clear (e.g., 'CRM software', 'API gateways'), set 'needs_clarification' to false and return the user's query **VERBATIM** in the 'clarified_query' field.\n"
@@ -28,13 +23,10 @@ async def clarify_query(query: str, api_key: str) -> EnrichedQuery:
             "**ABSOLUTELY DO NOT MODIFY, REFINE, OR CHANGE THE USER'S ORIGINAL QUERY IN ANY WAY.**"
         ),
         output_type=EnrichedQuery,
+        api_key=api_key,
+        priority=Priority.INTERACTIVE,
     )
 
-    response = await agent.run(
-        f"Evaluate the following product query: '{query}'"
-    )
-
-    enriched_result = response.output
     if not enriched_result.needs_clarification:
         enriched_result.comparison_factors = generic_factors
 
@@ -2,10 +2,8 @@ from typing import Any, Dict, List
 
 from loguru import logger
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
 from app.models.factors import Factor
+from app.services.llm import run_agent
 
 
 class EnrichedData(BaseModel):
@@ -23,9 +21,6 @@ async def enrich_product_data(
     Refines and enriches a product's data using the content of a specific,
     authoritative webpage (e.g., a pricing page).
     """
-    provider = GoogleGLAProvider(api_key=api_key)
-    llm = GeminiModel(model_name="gemini-2.0-flash", provider=provider)
-
     current_data_str = ", ".join(
         f"{factor['name']}: {factor['value']}"
         for factor in product_data.get("extracted_factors", [])
@@ -37,8 +32,6 @@ async def enrich_product_data(
         "2.  **Correct & Complete**: Fix inaccuracies and fill in missing information in the 'Current Data', especially for complex fields like 'Subscription Plans'.\n"
         "3.  **Return Full Structured Data**: Your final output must be the complete, authoritative, and structured data for the product. Use professional, business-appropriate terminology (e.g., for 'Maturity', use terms like 'Emerging', 'Growth Stage', 'Mature', not 'Adult')."
     )
-    
-    agent = Agent(model=llm, system_prompt=system_prompt, output_type=EnrichedData)
 
     try:
         query = (
@@ -47,9 +40,11 @@ async def enrich_product_data(
             f"**Current Data**: {current_data_str}\n\n"
             f"**Source Webpage Content**:\n{page_content}"
         )
-        result = await agent.run(query)
+        enriched_data = await run_agent(
+            query, system_prompt=system_prompt, output_type=EnrichedData, api_key=api_key
+        )
         logger.info(f"Successfully enriched data for {product_data.get('product_name')}")
-        return result.output.dict()
+        return enriched_data.dict()
     except Exception as e:
         logger.warning(
             f"Could not enrich data for {product_data.get('product_name')}. Returning original data. Error: {e}"
@@ -1,7 +1,16 @@
-from typing import Any, List, Dict
+from typing import Any, Iterable, Iterator, List, Dict
 import io
 import csv
 import ast
+import json
+
+try:
+    import pyarrow as pa  # type: ignore[import]
+except ImportError:  # Arrow output is optional
+    pa = None
+
+# Rows per chunk when streaming a table
+_STREAM_CHUNK_ROWS = 100
 
 def _format_value(value: Any) -> str:
     """
@@ -22,6 +31,7 @@ def _format_value(value: Any) -> str:
         if all(isinstance(item, dict) for item in value):
             formatted_items = []
             for item in value:
+                item = dict(item)  # Don't strip names from the caller's data
                 tier_name = item.pop('tier_name', item.pop('name', None))
                 
                 details = ", ".join(
@@ -48,36 +58,91 @@ def _format_header(header: str) -> str:
         return 'Name'
     return header.replace('_', ' ').title()
 
-def format_data_as_csv(
+def _unique_factors(comparison_factors: List[str]) -> List[str]:
+    return sorted(list(set(factor for factor in comparison_factors)))
+
+def format_table_header(comparison_factors: List[str]) -> List[str]:
+    """Returns the display headers for the output table."""
+    # Manually handle the 'product_name' -> 'Name' header transformation
+    return [_format_header(f) for f in ['product_name'] + _unique_factors(comparison_factors)]
+
+def format_product_row(item: Dict[str, Any], comparison_factors: List[str]) -> List[str]:
+    """Formats a single product as a row of display values, aligned with the header."""
+    product_name = item.get('product_name', 'N/A')
+
+    factors_dict = {
+        factor['name']: factor['value']
+        for factor in item.get('extracted_factors', [])
+        if 'name' in factor
+    }
+
+    row = [product_name]
+    for factor_name in _unique_factors(comparison_factors):
+        value = factors_dict.get(factor_name, "Not found")
+        row.append(_format_value(value))
+    return row
+
+def _iter_rows(
     extracted_data: List[Dict[str, Any]],
     comparison_factors: List[str],
-) -> str:
-    """
-    Formats the refined data into a CSV string.
-    """
-    unique_factors = sorted(list(set(factor for factor in comparison_factors)))
-    
+) -> Iterator[List[str]]:
+    for item in extracted_data:
+        yield format_product_row(item, comparison_factors)
+
+def _chunked(rows: Iterable[List[str]], size: int = _STREAM_CHUNK_ROWS) -> Iterator[List[List[str]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_table_csv(extracted_data: List[Dict[str, Any]], comparison_factors: List[str]) -> Iterator[bytes]:
+    """Yields the output table as CSV, a chunk of rows at a time."""
     output = io.StringIO()
-    
-    # Manually handle the 'product_name' -> 'Name' header transformation
-    display_fieldnames = [_format_header(f) for f in ['product_name'] + unique_factors]
     writer = csv.writer(output)
-    writer.writerow(display_fieldnames)
+    writer.writerow(format_table_header(comparison_factors))
+    for chunk in _chunked(_iter_rows(extracted_data, comparison_factors)):
+        writer.writerows(chunk)
+        yield output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        yield output.getvalue().encode("utf-8")
 
-    for item in extracted_data:
-        product_name = item.get('product_name', 'N/A')
-        
-        factors_dict = {
-            factor['name']: factor['value']
-            for factor in item.get('extracted_factors', [])
-            if 'name' in factor
-        }
-
-        row_for_csv = [product_name]
-        for factor_name in unique_factors:
-            value = factors_dict.get(factor_name, "Not found")
-            row_for_csv.append(_format_value(value))
-
-        writer.writerow(row_for_csv)
-        
-    return output.getvalue()
+def stream_table_jsonl(extracted_data: List[Dict[str, Any]], comparison_factors: List[str]) -> Iterator[bytes]:
+    """Yields the output table as JSON Lines, one object per row keyed by header."""
+    header = format_table_header(comparison_factors)
+    for chunk in _chunked(_iter_rows(extracted_data, comparison_factors)):
+        yield "".join(json.dumps(dict(zip(header, row))) + "\n" for row in chunk).encode("utf-8")
+
+def stream_table_arrow(extracted_data: List[Dict[str, Any]], comparison_factors: List[str]) -> Iterator[bytes]:
+    """
+    Yields the output table as an Arrow IPC stream with one record batch per
+    chunk of rows. Requires the optional `pyarrow` package.
+    """
+    if pa is None:
+        raise RuntimeError("Arrow output requires the optional 'pyarrow' package")
+
+    header = format_table_header(comparison_factors)
+    schema = pa.schema([pa.field(name, pa.string()) for name in header])
+    sink = io.BytesIO()
+
+    def _drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _chunked(_iter_rows(extracted_data, comparison_factors)):
+            columns = [pa.array(column, type=pa.string()) for column in zip(*chunk)]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            yield _drain()
+    yield _drain()
+
+def is_arrow_available() -> bool:
+    """Whether the optional Arrow output format can be served."""
+    return pa is not None
@@ -2,61 +2,85 @@ import asyncio
 from typing import Any, Dict, List
 
 from loguru import logger
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
+from app.config import PROCESSING_BATCH_SIZE, PROCESSING_CONCURRENCY, PROCESSING_MODE
 from app.models.factors import (
+    BatchedCategorizedFactor,
+    BatchedKeywordSummary,
+    BatchedProseSummary,
     CategorizedFactor,
+    CategorizedFactorBatch,
     FactorDefinition,
     KeywordSummary,
+    KeywordSummaryBatch,
+    MixedFactorBatch,
+    ProcessingMode,
     ProseSummary,
+    ProseSummaryBatch,
 )
+from app.services.llm import run_agent
+from app.services.processing_rules import record_resolution, resolve_locally
+
+_BATCH_OUTPUT_TYPES = {
+    "categorize": CategorizedFactorBatch,
+    "summarize_prose": ProseSummaryBatch,
+    "summarize_keywords": KeywordSummaryBatch,
+}
+
+_BATCH_RESULT_TYPES = {
+    "categorize": BatchedCategorizedFactor,
+    "summarize_prose": BatchedProseSummary,
+    "summarize_keywords": BatchedKeywordSummary,
+}
 
 
 async def process_value(
-    factor_definition: FactorDefinition, value: Any, api_key: str
+    factor_definition: FactorDefinition, value: Any, api_key: str, factor_name: str | None = None
 ) -> Any:
     """
     Refines a value based on the specific processing_type defined in its
     FactorDefinition. This agent does not guess; it follows instructions.
-    Structured data (lists, objects) or values marked 'none' are passed through.
+    Structured data (lists, objects) or values marked 'none' are passed through,
+    and values the local rules can settle never reach the LLM.
     """
     processing_type = factor_definition.processing_type
 
     if processing_type == "none" or not isinstance(value, str):
         return value  # Pass through non-strings or if no processing is needed
 
-    provider = GoogleGLAProvider(api_key=api_key)
-    llm = GeminiModel(model_name="gemini-2.0-flash", provider=provider)
+    if _needs_processing(factor_definition, value):
+        local_value = resolve_locally(factor_definition, value)
+        record_resolution(factor_name, local_value is not None)
+        if local_value is not None:
+            return local_value
 
     try:
         if processing_type == "categorize" and factor_definition.categories:
-            agent = Agent(
-                model=llm,
+            result = await run_agent(
+                f"Text to classify: '{value}'",
                 system_prompt=f"Classify the following text into one of these categories: {', '.join(factor_definition.categories)}.",
                 output_type=CategorizedFactor,
+                api_key=api_key,
             )
-            result = await agent.run(f"Text to classify: '{value}'")
-            return result.output.category
+            return result.category
 
         elif processing_type == "summarize_prose":
-            agent = Agent(
-                model=llm,
+            result = await run_agent(
+                f"Text to summarize: '{value}'",
                 system_prompt="Summarize the following text into a single, concise sentence.",
                 output_type=ProseSummary,
+                api_key=api_key,
             )
-            result = await agent.run(f"Text to summarize: '{value}'")
-            return result.output.summary
+            return result.summary
 
         elif processing_type == "summarize_keywords":
-            agent = Agent(
-                model=llm,
+            result = await run_agent(
+                f"Text to summarize: '{value}'",
                 system_prompt="Summarize the following text into a list of 1-3 descriptive keywords.",
                 output_type=KeywordSummary,
+                api_key=api_key,
             )
-            result = await agent.run(f"Text to summarize: '{value}'")
-            return ", ".join(result.output.summary_tags)
+            return ", ".join(result.summary_tags)
 
     except Exception as e:
         logger.warning(
@@ -67,25 +91,175 @@ async def process_value(
     return value
 
 
+def _needs_processing(factor_definition: FactorDefinition, value: Any) -> bool:
+    """Whether a value would be sent to the LLM for its processing type."""
+    processing_type = factor_definition.processing_type
+    if processing_type == "none" or not isinstance(value, str):
+        return False
+    if processing_type == "categorize":
+        return bool(factor_definition.categories)
+    return processing_type in _BATCH_OUTPUT_TYPES
+
+
+def _batch_instruction(factor_definition: FactorDefinition) -> str:
+    """The per-item instruction used in a batched processing prompt."""
+    if factor_definition.processing_type == "categorize":
+        return f"Classify into one of these categories: {', '.join(factor_definition.categories or [])}."
+    if factor_definition.processing_type == "summarize_prose":
+        return "Summarize into a single, concise sentence."
+    return "Summarize into a list of 1-3 descriptive keywords."
+
+
+def _batch_result_value(result: Any) -> Any:
+    """Extracts the final factor value from a batched result item."""
+    if isinstance(result, CategorizedFactor):
+        return result.category
+    if isinstance(result, ProseSummary):
+        return result.summary
+    return ", ".join(result.summary_tags)
+
+
+async def process_batch(
+    items: List[tuple[FactorDefinition, Any]], api_key: str, factor_names: List[str] | None = None
+) -> List[Any]:
+    """
+    Refines several values with a single structured-output LLM call. Each item
+    carries its own FactorDefinition, so a batch can hold one factor column or
+    every factor of a product. Items the local rules settle are left out of
+    the call. Items that need no processing, or that the LLM fails to answer,
+    keep their original value.
+    """
+    processed_values = [value for _, value in items]
+    pending = []
+    for i, (definition, value) in enumerate(items):
+        if not _needs_processing(definition, value):
+            continue
+        local_value = resolve_locally(definition, value)
+        record_resolution(factor_names[i] if factor_names else None, local_value is not None)
+        if local_value is None:
+            pending.append(i)
+        else:
+            processed_values[i] = local_value
+    if not pending:
+        return processed_values
+
+    processing_types = {items[i][0].processing_type for i in pending}
+    output_type = (
+        _BATCH_OUTPUT_TYPES[next(iter(processing_types))]
+        if len(processing_types) == 1
+        else MixedFactorBatch
+    )
+
+    item_lines = []
+    for batch_index, item_index in enumerate(pending):
+        definition, value = items[item_index]
+        item_lines.append(f"[{batch_index}] Instruction: {_batch_instruction(definition)}\nText: '{value}'")
+
+    try:
+        batch_result = await run_agent(
+            "Process each of the following items:\n\n" + "\n\n".join(item_lines),
+            system_prompt=(
+                "You process a numbered list of texts. Each item comes with its own instruction: "
+                "classify it into one of the listed categories, summarize it into a single concise sentence, "
+                "or summarize it into a list of 1-3 descriptive keywords. "
+                "Return exactly one result per item and set 'index' to the item's number."
+            ),
+            output_type=output_type,
+            api_key=api_key,
+        )
+    except Exception as e:
+        logger.warning(
+            f"Batched processing of {len(pending)} values failed, returning original values. Error: {e}"
+        )
+        return processed_values
+
+    answered = set()
+    for result in batch_result.results:
+        if not 0 <= result.index < len(pending) or result.index in answered:
+            continue
+        item_index = pending[result.index]
+        expected_type = _BATCH_RESULT_TYPES[items[item_index][0].processing_type]
+        if not isinstance(result, expected_type):
+            continue
+        processed_values[item_index] = _batch_result_value(result)
+        answered.add(result.index)
+
+    if len(answered) < len(pending):
+        logger.warning(
+            f"Batched processing answered {len(answered)} of {len(pending)} values; keeping original values for the rest."
+        )
+    return processed_values
+
+
+def _group_cells(cell_keys: List[tuple[int, str]], mode: ProcessingMode) -> List[List[int]]:
+    """Groups cell indices by product or by factor name, split into bounded batches."""
+    groups: Dict[Any, List[int]] = {}
+    for cell_index, (product_index, factor_name) in enumerate(cell_keys):
+        group_key = product_index if mode == "product" else factor_name
+        groups.setdefault(group_key, []).append(cell_index)
+
+    return [
+        group[start:start + PROCESSING_BATCH_SIZE]
+        for group in groups.values()
+        for start in range(0, len(group), PROCESSING_BATCH_SIZE)
+    ]
+
+
 async def process_data(
-    extracted_data: List[Dict[str, Any]], api_key: str
+    extracted_data: List[Dict[str, Any]],
+    api_key: str,
+    mode: ProcessingMode = PROCESSING_MODE,
 ) -> List[Dict[str, Any]]:
     """
     Iterates through extracted data, refining values based on the
-    processing instructions in their attached FactorDefinition.
+    processing instructions in their attached FactorDefinition. Factors
+    without a definition are already processed and are left unchanged.
+
+    Args:
+        extracted_data: The products to process.
+        api_key: The Google API key for the LLM.
+        mode: "cell" makes one LLM call per value; "column" batches each
+            factor across all products; "product" batches every factor of a product.
     """
-    processing_tasks = []
-    for product in extracted_data:
+    cells = []
+    cell_keys = []
+    for product_index, product in enumerate(extracted_data):
         for factor in product.get("extracted_factors", []):
-            definition = FactorDefinition(**factor["definition"])
-            task = process_value(definition, factor["value"], api_key)
-            processing_tasks.append(task)
+            if "definition" not in factor:
+                continue  # Already processed, e.g. a column reused from a cached analysis
+            cells.append((FactorDefinition(**factor["definition"]), factor["value"]))
+            cell_keys.append((product_index, factor["name"]))
 
-    processed_values = await asyncio.gather(*processing_tasks)
+    semaphore = asyncio.Semaphore(PROCESSING_CONCURRENCY)
+
+    async def _with_limit(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    if mode == "cell":
+        processed_values = await asyncio.gather(*(
+            _with_limit(process_value(definition, value, api_key, factor_name))
+            for (definition, value), (_, factor_name) in zip(cells, cell_keys)
+        ))
+    else:
+        batches = _group_cells(cell_keys, mode)
+        batch_results = await asyncio.gather(
+            *(
+                _with_limit(process_batch([cells[i] for i in batch], api_key, [cell_keys[i][1] for i in batch]))
+                for batch in batches
+            )
+        )
+        processed_values = [None] * len(cells)
+        for batch, results in zip(batches, batch_results):
+            for cell_index, value in zip(batch, results):
+                processed_values[cell_index] = value
+        logger.info(f"Processed {len(cells)} values in {len(batches)} batches (mode: {mode})")
 
     value_iterator = iter(processed_values)
     for product in extracted_data:
         for factor in product.get("extracted_factors", []):
+            if "definition" not in factor:
+                continue
             factor["value"] = next(value_iterator)
             del factor["definition"]  # Clean up definition before final output
 
@@ -1,15 +1,17 @@
 import asyncio
 import json
+import re
 from typing import Any, Dict, List
-import os
 
-from exa_py import Exa
 from loguru import logger
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
+from pydantic import BaseModel, Field
 
+from app.config import DISCOVERY_MODE, DISCOVERY_SHARD_COUNT
 from app.models.factors import FactorDefinition
+from app.models.tasks import DiscoveryMode
+from app.services.exa_client import run_research_task
+from app.services.factor_registry import get_cached_definition, store_definition
+from app.services.llm import run_agent
 
 
 async def determine_factor_definition(
@@ -18,22 +20,25 @@ async def determine_factor_definition(
     """
     Dynamically determines the complete definition for a factor, including its
     JSON schema and the appropriate processing type, using a single LLM call.
+    Definitions are served from the persistent factor registry when present.
     """
-    provider = GoogleGLAProvider(api_key=api_key)
-    llm = GeminiModel(model_name="gemini-2.0-flash", provider=provider)
-    agent = Agent(
-        model=llm,
-        system_prompt=(
-            "You are a data pipeline architect. Your job is to define how to extract and process a data field based on its name.\n"
-            "1.  **Define the `factor_schema_json`**: For simple text, return a JSON string like `'{\\\"type\\\": \\\"string\\\"}'`. For fields implying a list (e.g., 'Subscription Plans'), return a JSON string for an array of objects, like `'{\\\"type\\\": \\\"array\\\", \\\"items\\\": {\\\"type\\\": \\\"object\\\", \\\"properties\\\": {\\\"tier_name\\\": {\\\"type\\\": \\\"string\\\"}, \\\"price\\\": {\\\"type\\\": \\\"string\\\"}}}}'`. Escape all quotes properly.\n"
-            "2.  **Define the `processing_type`**: Choose 'categorize', 'summarize_prose', 'summarize_keywords', or 'none'.\n"
-            "3.  **Define `categories`**: If you chose 'categorize', provide a list of 3-5 sensible category options."
-        ),
-        output_type=FactorDefinition,
+    cached_definition = get_cached_definition(factor_name)
+    if cached_definition:
+        return cached_definition
+
+    system_prompt = (
+        "You are a data pipeline architect. Your job is to define how to extract and process a data field based on its name.\n"
+        "1.  **Define the `factor_schema_json`**: For simple text, return a JSON string like `'{\\\"type\\\": \\\"string\\\"}'`. For fields implying a list (e.g., 'Subscription Plans'), return a JSON string for an array of objects, like `'{\\\"type\\\": \\\"array\\\", \\\"items\\\": {\\\"type\\\": \\\"object\\\", \\\"properties\\\": {\\\"tier_name\\\": {\\\"type\\\": \\\"string\\\"}, \\\"price\\\": {\\\"type\\\": \\\"string\\\"}}}}'`. Escape all quotes properly.\n"
+        "2.  **Define the `processing_type`**: Choose 'categorize', 'summarize_prose', 'summarize_keywords', or 'none'.\n"
+        "3.  **Define `categories`**: If you chose 'categorize', provide a list of 3-5 sensible category options."
     )
     try:
-        result = await agent.run(f"Define handling for factor: '{factor_name}'")
-        return result.output
+        definition = await run_agent(
+            f"Define handling for factor: '{factor_name}'",
+            system_prompt=system_prompt,
+            output_type=FactorDefinition,
+            api_key=api_key,
+        )
     except Exception as e:
         logger.warning(
             f"Factor definition for '{factor_name}' failed, defaulting to basic string. Error: {e}"
@@ -44,59 +49,171 @@ async def determine_factor_definition(
             categories=None,
         )
 
+    store_definition(factor_name, definition)
+    return definition
+
+
+async def warm_factor_definitions(factor_names: List[str], api_key: str) -> None:
+    """Pre-computes registry entries for factors that are missing or expired."""
+    missing_factors = [name for name in factor_names if get_cached_definition(name) is None]
+    if not missing_factors:
+        return
+    logger.info(f"Warming factor definitions for {len(missing_factors)} factors")
+    await asyncio.gather(*(determine_factor_definition(name, api_key) for name in missing_factors))
+
+
+class DiscoverySegments(BaseModel):
+    """Sub-segments of a product category, each researched by its own discovery task."""
+    segments: List[str] = Field(
+        ...,
+        description="Distinct, non-overlapping sub-segments of the category, such as market tiers or deployment models.",
+    )
+
+
+# Used when the category can't be split by the LLM; market tiers suit most software categories
+_FALLBACK_SEGMENTS = ["enterprise", "mid-market", "small business", "open-source and self-hosted"]
+
+
+async def split_category(product_category: str, api_key: str, count: int = DISCOVERY_SHARD_COUNT) -> List[str]:
+    """Splits a product category into up to `count` sub-segments for sharded discovery."""
+    system_prompt = (
+        "You are a market analyst. Split a software category into distinct sub-segments so that researching "
+        "each one separately finds as many different vendors as possible.\n"
+        "Segment by the dimension that best separates vendors in this category, such as market tier "
+        "(enterprise, mid-market, small business), deployment model (cloud, self-hosted, open-source) "
+        "or industry focus. Segments must not overlap. Return short segment names only."
+    )
+    try:
+        result = await run_agent(
+            f"Split the category '{product_category}' into at most {count} sub-segments.",
+            system_prompt=system_prompt,
+            output_type=DiscoverySegments,
+            api_key=api_key,
+        )
+        segments = list(dict.fromkeys(segment.strip() for segment in result.segments if segment.strip()))
+    except Exception as e:
+        logger.warning(f"Could not split '{product_category}' into segments, using market tiers. Error: {e}")
+        segments = []
+    return segments[:count] or _FALLBACK_SEGMENTS[:count]
+
+
+def _product_key(product_name: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(product_name or "").lower()).strip()
+
+
+def _merge_shard_products(shard_products: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merges product lists from several shards, keeping the first occurrence of
+    each product name. Values a duplicate found that the first one lacks are
+    copied over.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for products in shard_products:
+        for product in products:
+            key = _product_key(product.get("product_name"))
+            if not key:
+                continue
+            if key not in merged:
+                merged[key] = dict(product)
+                continue
+            kept = merged[key]
+            for field, value in product.items():
+                if kept.get(field) in (None, "", "Not found") and value not in (None, "", "Not found"):
+                    kept[field] = value
+    return list(merged.values())
+
 
 async def search_and_extract(
-    product_category: str, comparison_factors: List[str], api_key: str
+    product_category: str,
+    comparison_factors: List[str],
+    api_key: str,
+    mode: DiscoveryMode = DISCOVERY_MODE,
 ) -> List[Dict[str, Any]]:
     """
     Uses Exa to find and extract structured information based on a dynamically
     generated schema from our new, intelligent FactorDefinition model.
-    """
-    exa_api_key = os.getenv("EXA_API_KEY")
-    if not exa_api_key:
-        raise ValueError("EXA_API_KEY environment variable not set")
-    exa = Exa(api_key=exa_api_key)
 
-    definition_tasks = [
-        determine_factor_definition(factor, api_key) for factor in comparison_factors
-    ]
-    factor_definitions = await asyncio.gather(*definition_tasks)
+    In "sharded" mode the category is split into sub-segments that are
+    researched in parallel, so discovery takes as long as the slowest shard
+    while finding several times as many products. Failed shards are skipped.
+    """
+    definitions = asyncio.gather(
+        *(determine_factor_definition(factor, api_key) for factor in comparison_factors)
+    )
+    if mode == "sharded":
+        # The category split doesn't depend on the factor schema, so both LLM calls run at once
+        factor_definitions, segments = await asyncio.gather(
+            definitions, split_category(product_category, api_key)
+        )
+    else:
+        factor_definitions = await definitions
 
     properties = {"product_name": {"type": "string", "description": "The product name."}}
-    instruction_lines = [
-        f"Find and compare 10-15 of the leading software solutions for '{product_category}'.",
-        "For each solution, extract the following information based on the described schema:",
-    ]
+    factor_lines = ["For each solution, extract the following information based on the described schema:"]
 
     for factor, definition in zip(comparison_factors, factor_definitions):
         key = factor.lower().replace(" ", "_").replace("/", "_")
         try:
             schema = json.loads(definition.factor_schema_json)
             properties[key] = schema
-            instruction_lines.append(f"- **{factor}**: Extract this value based on the schema.")
+            factor_lines.append(f"- **{factor}**: Extract this value based on the schema.")
         except json.JSONDecodeError:
             properties[key] = {"type": "string"}
-            instruction_lines.append(f"- **{factor}**: Extract this value.")
+            factor_lines.append(f"- **{factor}**: Extract this value.")
 
     output_schema = {
         "type": "object",
         "required": ["products"],
         "properties": {"products": {"type": "array", "items": {"type": "object", "properties": properties}}},
     }
-    instructions = "\n".join(instruction_lines)
 
-    task = exa.research.create_task(
-        instructions=instructions, output_schema=output_schema, model="exa-research"
-    )
-    logger.info(f"Created Exa research task with ID: {task.id}")
-    result = exa.research.poll_task(task.id)
-    logger.debug(f"Received final result from Exa research poll: {result.data}")
-
-    if not result.data or "products" not in result.data:
-        return []
+    if mode == "sharded":
+        logger.info(f"Running sharded discovery for '{product_category}' across segments: {segments}")
+        shard_results = await asyncio.gather(
+            *(
+                run_research_task(
+                    "\n".join([
+                        f"Find and compare 10-15 of the leading software solutions for '{product_category}' "
+                        f"in the '{segment}' segment.",
+                        *factor_lines,
+                    ]),
+                    output_schema,
+                )
+                for segment in segments
+            ),
+            return_exceptions=True,
+        )
+        shard_products = []
+        for segment, result in zip(segments, shard_results):
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result  # Cancellation or interpreter exit, not a failed shard
+            if isinstance(result, Exception):
+                logger.warning(f"Discovery shard '{segment}' failed: {result}")
+                continue
+            if result and "products" in result:
+                shard_products.append(result["products"])
+        if not shard_products:
+            failures = [result for result in shard_results if isinstance(result, Exception)]
+            if failures:
+                raise failures[0]
+            return []
+        raw_products = _merge_shard_products(shard_products)
+        logger.info(
+            f"Sharded discovery found {sum(len(products) for products in shard_products)} products "
+            f"in {len(shard_products)} shards, {len(raw_products)} after merging duplicates"
+        )
+    else:
+        instructions = "\n".join([
+            f"Find and compare 10-15 of the leading software solutions for '{product_category}'.",
+            *factor_lines,
+        ])
+        research_data = await run_research_task(instructions, output_schema)
+        if not research_data or "products" not in research_data:
+            return []
+        raw_products = research_data["products"]
 
     formatted_products = []
-    for product in result.data["products"]:
+    for product in raw_products:
         formatted_product = {"product_name": product.get("product_name")}
         extracted_factors = []
         for factor, definition in zip(comparison_factors, factor_definitions):
@@ -2,9 +2,8 @@ from typing import List, Dict, Any
 
 from loguru import logger
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent
-from pydantic_ai.models.gemini import GeminiModel
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+from app.services.llm import run_agent
 
 class TargetedQueries(BaseModel):
     """A model to hold a list of targeted search queries for enriching data."""
@@ -27,9 +26,6 @@ async def generate_enrichment_queries(
     Returns:
         A list of specific search query strings.
     """
-    provider = GoogleGLAProvider(api_key=api_key)
-    llm = GeminiModel(model_name="gemini-2.0-flash", provider=provider)
-
     current_data_str = ", ".join(
         f"{factor['name']}: {factor['value']}"
         for factor in product_data.get("extracted_factors", [])
@@ -43,8 +39,6 @@ async def generate_enrichment_queries(
         "   - Bad Query Example: 'CircleCI info'\n"
         "3.  **Focus on Authority**: The queries should aim to find the product's official website."
     )
-    
-    agent = Agent(model=llm, system_prompt=system_prompt, output_type=TargetedQueries)
 
     try:
         query = (
@@ -52,9 +46,11 @@ async def generate_enrichment_queries(
             f"**Product Name**: {product_data.get('product_name')}\n"
             f"**Current Data**: {current_data_str}"
         )
-        result = await agent.run(query)
-        logger.info(f"Generated {len(result.output.queries)} enrichment queries for {product_data.get('product_name')}")
-        return result.output.queries
+        targeted_queries = await run_agent(
+            query, system_prompt=system_prompt, output_type=TargetedQueries, api_key=api_key
+        )
+        logger.info(f"Generated {len(targeted_queries.queries)} enrichment queries for {product_data.get('product_name')}")
+        return targeted_queries.queries
     except Exception as e:
         logger.warning(
             f"Could not generate enrichment queries for {product_data.get('product_name')}. Error: {e}"
@@ -0,0 +1,175 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before any settings are read
+load_dotenv()
+
+
+def _get_int(name: str, default: int) -> int:
+    """Reads an integer setting from the environment, falling back to the default."""
+    raw_value = os.getenv(name)
+    if not raw_value:
+        return default
+    try:
+        return int(raw_value)
+    except ValueError:
+        return default
+
+
+def _get_float(name: str, default: float) -> float:
+    """Reads a float setting from the environment, falling back to the default."""
+    raw_value = os.getenv(name)
+    if not raw_value:
+        return default
+    try:
+        return float(raw_value)
+    except ValueError:
+        return default
+
+
+# --- Storage ---
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# --- Task store ---
+TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "memory")
+TASK_STORE_MAX_TASKS = max(1, _get_int("TASK_STORE_MAX_TASKS", 1000))
+TASK_TTL_SECONDS = _get_float("TASK_TTL_SECONDS", 24 * 60 * 60)
+# Restart tasks left mid-run by a previous API process (inline job queue only)
+RESUME_INTERRUPTED_TASKS = os.getenv("RESUME_INTERRUPTED_TASKS", "true").lower() in ("1", "true", "yes")
+# An API process holds a renewable claim on each task it runs; a claim not renewed within this long lapses
+TASK_CLAIM_TTL_SECONDS = max(3.0, _get_float("TASK_CLAIM_TTL_SECONDS", 30.0))
+
+# --- Job queue ---
+# "inline" runs analyses as background tasks in the API process; "sqlite"
+# queues them for `python -m app.worker` processes (requires the sqlite task store).
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "inline")
+WORKER_CONCURRENCY = max(1, _get_int("WORKER_CONCURRENCY", 2))
+JOB_VISIBILITY_TIMEOUT_SECONDS = _get_float("JOB_VISIBILITY_TIMEOUT_SECONDS", 300.0)
+JOB_POLL_INTERVAL_SECONDS = _get_float("JOB_POLL_INTERVAL_SECONDS", 1.0)
+JOB_MAX_ATTEMPTS = max(1, _get_int("JOB_MAX_ATTEMPTS", 3))
+# How often a running analysis checks the task store for a cancellation request
+# made by another process
+CANCELLATION_POLL_INTERVAL_SECONDS = _get_float("CANCELLATION_POLL_INTERVAL_SECONDS", 2.0)
+
+# --- Admission ---
+# Analyses run at once in the API process (inline job queue; workers use --concurrency)
+MAX_CONCURRENT_ANALYSES = max(1, _get_int("MAX_CONCURRENT_ANALYSES", 4))
+# Analyses allowed to wait for a slot before /analyze answers 429
+MAX_QUEUED_ANALYSES = max(0, _get_int("MAX_QUEUED_ANALYSES", 50))
+# Retry-After sent with a 429 until run durations have been observed
+ADMISSION_RETRY_AFTER_SECONDS = max(1, _get_int("ADMISSION_RETRY_AFTER_SECONDS", 30))
+
+# --- Single-flight analyses ---
+# Identical requests (normalized query and factor set) share an in-flight run, or
+# a run completed within DEDUP_RESULT_TTL_SECONDS, unless force_refresh is set
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_RESULT_TTL_SECONDS = _get_float("DEDUP_RESULT_TTL_SECONDS", 30 * 60)
+
+# --- Analysis cache ---
+# Completed analyses are stored per normalized query. Requests whose factors are
+# covered and whose products were enriched within the freshness window are served
+# from the cache; otherwise stale products are re-enriched and new factor columns
+# filled in, without re-running discovery. Entries older than the max age are dropped.
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANALYSIS_CACHE_FRESHNESS_SECONDS = _get_float("ANALYSIS_CACHE_FRESHNESS_SECONDS", 24 * 60 * 60)
+ANALYSIS_CACHE_MAX_AGE_SECONDS = _get_float("ANALYSIS_CACHE_MAX_AGE_SECONDS", 7 * 24 * 60 * 60)
+
+# --- Progress streaming ---
+# How often an event stream falls back to reading the task store, which picks up
+# changes made by other processes (e.g. queue workers), and sends keep-alives
+EVENT_STREAM_POLL_INTERVAL_SECONDS = _get_float("EVENT_STREAM_POLL_INTERVAL_SECONDS", 5.0)
+
+# --- LLM ---
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_MAX_CONNECTIONS = max(1, _get_int("LLM_MAX_CONNECTIONS", 50))
+LLM_REQUEST_TIMEOUT_SECONDS = _get_float("LLM_REQUEST_TIMEOUT_SECONDS", 600.0)
+LLM_AGENT_CACHE_SIZE = max(1, _get_int("LLM_AGENT_CACHE_SIZE", 256))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_SECONDS = _get_float("LLM_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)
+LLM_CACHE_MAX_BYTES = max(1, _get_int("LLM_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+# Per-attempt timeout and retries with jittered exponential backoff
+LLM_CALL_TIMEOUT_SECONDS = _get_float("LLM_CALL_TIMEOUT_SECONDS", 120.0)
+LLM_MAX_ATTEMPTS = max(1, _get_int("LLM_MAX_ATTEMPTS", 3))
+LLM_RETRY_BASE_DELAY_SECONDS = _get_float("LLM_RETRY_BASE_DELAY_SECONDS", 1.0)
+LLM_RETRY_MAX_DELAY_SECONDS = _get_float("LLM_RETRY_MAX_DELAY_SECONDS", 20.0)
+# Hedging: start a duplicate call once one outlasts this latency percentile
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = min(99.9, max(50.0, _get_float("LLM_HEDGE_PERCENTILE", 95.0)))
+LLM_HEDGE_MIN_SAMPLES = max(1, _get_int("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_MIN_DELAY_SECONDS = _get_float("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0)
+
+# --- Exa ---
+EXA_API_KEY = os.getenv("EXA_API_KEY")
+EXA_POLL_INITIAL_INTERVAL_SECONDS = _get_float("EXA_POLL_INITIAL_INTERVAL_SECONDS", 2.0)
+EXA_POLL_MAX_INTERVAL_SECONDS = _get_float("EXA_POLL_MAX_INTERVAL_SECONDS", 30.0)
+EXA_POLL_BACKOFF_FACTOR = max(1.0, _get_float("EXA_POLL_BACKOFF_FACTOR", 1.5))
+EXA_RESEARCH_TIMEOUT_SECONDS = _get_float("EXA_RESEARCH_TIMEOUT_SECONDS", 15 * 60)
+EXA_CACHE_ENABLED = os.getenv("EXA_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EXA_CACHE_TTL_SECONDS = _get_float("EXA_CACHE_TTL_SECONDS", 24 * 60 * 60)
+EXA_SEARCH_CACHE_MAX_BYTES = max(1, _get_int("EXA_SEARCH_CACHE_MAX_BYTES", 10 * 1024 * 1024))
+EXA_CONTENTS_CACHE_MAX_BYTES = max(1, _get_int("EXA_CONTENTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+# --- Rate limits ---
+# Shared by every agent in a process; each worker process applies its own limits.
+# A rate of 0 disables that limit.
+GEMINI_REQUESTS_PER_MINUTE = max(0.0, _get_float("GEMINI_REQUESTS_PER_MINUTE", 1000.0))
+GEMINI_TOKENS_PER_MINUTE = max(0.0, _get_float("GEMINI_TOKENS_PER_MINUTE", 1_000_000.0))
+GEMINI_MAX_CONCURRENCY = max(1, _get_int("GEMINI_MAX_CONCURRENCY", 20))
+EXA_REQUESTS_PER_SECOND = max(0.0, _get_float("EXA_REQUESTS_PER_SECOND", 5.0))
+EXA_MAX_CONCURRENCY = max(1, _get_int("EXA_MAX_CONCURRENCY", 10))
+
+# --- Factor definitions ---
+FACTOR_DEFINITION_TTL_SECONDS = _get_float("FACTOR_DEFINITION_TTL_SECONDS", 7 * 24 * 60 * 60)
+
+# --- Discovery ---
+# "single" runs one Exa research task for the category; "sharded" first splits the
+# category into up to DISCOVERY_SHARD_COUNT sub-segments (market tier, deployment
+# model, ...) and runs one research task per segment in parallel. Requests can
+# override the mode with `discovery_mode`.
+DISCOVERY_MODE = os.getenv("DISCOVERY_MODE", "single")
+if DISCOVERY_MODE not in ("single", "sharded"):
+    DISCOVERY_MODE = "single"
+DISCOVERY_SHARD_COUNT = min(10, max(2, _get_int("DISCOVERY_SHARD_COUNT", 4)))
+# Near-duplicate discovered products (same product under different casing or edition
+# names) are merged before processing; names match at this trigram similarity or above.
+PRODUCT_DEDUP_ENABLED = os.getenv("PRODUCT_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+PRODUCT_DEDUP_SIMILARITY = min(1.0, max(0.5, _get_float("PRODUCT_DEDUP_SIMILARITY", 0.8)))
+
+# --- Processing ---
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "cell")
+if PROCESSING_MODE not in ("cell", "column", "product"):
+    PROCESSING_MODE = "cell"
+PROCESSING_BATCH_SIZE = max(1, _get_int("PROCESSING_BATCH_SIZE", 25))
+PROCESSING_CONCURRENCY = max(1, _get_int("PROCESSING_CONCURRENCY", 10))
+# Values that local rules can settle (missing-data sentinels, category matches,
+# yes/no synonyms, already-short text) skip the LLM
+PROCESSING_FAST_PATH_ENABLED = os.getenv("PROCESSING_FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# --- Pipeline ---
+# "streaming" moves each product through processing, targeting, fetch and enrichment
+# as soon as its own inputs are ready, with bounded queues between the steps;
+# "staged" finishes each stage for every product before starting the next.
+# Column batching needs every product at once, so PROCESSING_MODE=column always runs staged.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "streaming")
+if PIPELINE_MODE not in ("staged", "streaming"):
+    PIPELINE_MODE = "streaming"
+PIPELINE_QUEUE_SIZE = max(1, _get_int("PIPELINE_QUEUE_SIZE", 10))
+
+# --- Enrichment ---
+ENRICHMENT_CONCURRENCY = max(1, _get_int("ENRICHMENT_CONCURRENCY", 5))
+# Page content is cut to the chunks most relevant to the product's weak factors
+# before it reaches the enrichment prompt. A budget of 0 sends whole pages.
+ENRICHMENT_CONTENT_TOKEN_BUDGET = max(0, _get_int("ENRICHMENT_CONTENT_TOKEN_BUDGET", 4000))
+ENRICHMENT_CONTENT_CHUNK_TOKENS = max(20, _get_int("ENRICHMENT_CONTENT_CHUNK_TOKENS", 200))
+# "single" searches the top targeting query for one page per product; "batched" runs
+# every targeting query concurrently, keeps up to ENRICHMENT_MAX_PAGES_PER_PRODUCT
+# distinct URLs and fetches pages for all products arriving within a short wave
+# in one Exa get_contents call.
+ENRICHMENT_FETCH_MODE = os.getenv("ENRICHMENT_FETCH_MODE", "single")
+if ENRICHMENT_FETCH_MODE not in ("single", "batched"):
+    ENRICHMENT_FETCH_MODE = "single"
+ENRICHMENT_RESULTS_PER_QUERY = max(1, _get_int("ENRICHMENT_RESULTS_PER_QUERY", 1))
+ENRICHMENT_MAX_PAGES_PER_PRODUCT = max(1, _get_int("ENRICHMENT_MAX_PAGES_PER_PRODUCT", 3))
+ENRICHMENT_FETCH_WAVE_SIZE = max(1, _get_int("ENRICHMENT_FETCH_WAVE_SIZE", 10))
+ENRICHMENT_FETCH_WAVE_SECONDS = max(0.0, _get_float("ENRICHMENT_FETCH_WAVE_SECONDS", 0.2))
@@ -1,4 +1,4 @@
-from fastapi import Security, HTTPException, status
+from fastapi import Header, Request, Security, HTTPException, status
 from fastapi.security import APIKeyHeader
 import os
 
@@ -14,4 +14,15 @@ async def get_api_key(api_key: str = Security(api_key_header)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API Key",
-        ) 
\ No newline at end of file
+        ) 
+
+
+async def get_client_id(request: Request, client_id: str | None = Header(default=None, alias="x-client-id")) -> str:
+    """
+    Identifies the caller for fair scheduling. Every client authenticates with
+    the same API_KEY, so it is the X-Client-ID header when sent, else the
+    caller's address.
+    """
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
@@ -1,12 +1,75 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-from app.routers import analysis
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI()
+from loguru import logger
+
+from app.agents.search_agent import warm_factor_definitions
+from app.config import JOB_QUEUE_BACKEND, RESUME_INTERRUPTED_TASKS, TASK_CLAIM_TTL_SECONDS
+from app.routers import analysis, metrics
+from app.services.admission import keep_task_claims, stop_admitted_analyses, submit_analysis
+from app.services.analysis_cache import purge_expired_analyses
+from app.services.analysis_workflow import find_interrupted_task_ids
+from app.services.exa_client import close_exa_client
+from app.services.factor_registry import purge_expired_definitions
+from app.services.llm import close_llm_client
+from app.utils import load_factor_templates
+
+
+# Admission-queue client for tasks resumed at startup, scheduled fairly against new requests
+_RESUMED_TASKS_CLIENT_ID = "resumed-tasks"
+
+
+async def _resume_interrupted_tasks(google_api_key: str) -> None:
+    """
+    Resumes interrupted tasks at startup, then keeps checking for tasks whose
+    owning process stopped renewing its claim. Submitting claims each task
+    atomically, so with several API processes only one of them resumes it.
+    """
+    while True:
+        for task_id in find_interrupted_task_ids():
+            logger.info(f"Resuming interrupted task {task_id}")
+            submit_analysis(task_id, google_api_key, client_id=_RESUMED_TASKS_CLIENT_ID)
+        await asyncio.sleep(TASK_CLAIM_TTL_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    purge_expired_definitions()
+    purge_expired_analyses()
+    startup_tasks = []
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if google_api_key:
+        template_factors = sorted({
+            factor for factors in load_factor_templates().values() for factor in factors
+        })
+        # Warm in the background so startup is not blocked on the LLM
+        startup_tasks.append(asyncio.create_task(warm_factor_definitions(template_factors, google_api_key)))
+
+        if JOB_QUEUE_BACKEND == "inline" and RESUME_INTERRUPTED_TASKS:
+            startup_tasks.append(asyncio.create_task(_resume_interrupted_tasks(google_api_key)))
+    if JOB_QUEUE_BACKEND == "inline":
+        startup_tasks.append(asyncio.create_task(keep_task_claims()))
+
+    yield
+
+    for startup_task in startup_tasks:
+        if not startup_task.done():
+            startup_task.cancel()
+    await stop_admitted_analyses()
+    await close_exa_client()
+    await close_llm_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Set up CORS
 origins = [
@@ -22,8 +85,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses such as result tables; event streams are left uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 app.include_router(analysis.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
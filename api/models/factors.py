@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
@@ -6,6 +6,10 @@ from pydantic import BaseModel, Field
 
 ProcessingType = Literal["categorize", "summarize_prose", "summarize_keywords", "none"]
 
+# How processing requests are grouped: one LLM call per value ("cell"), per
+# factor across all products ("column"), or per product across all factors ("product").
+ProcessingMode = Literal["cell", "column", "product"]
+
 
 class Factor(BaseModel):
     """A single, atomic piece of information about a product."""
@@ -48,3 +52,42 @@ class ProseSummary(BaseModel):
 class KeywordSummary(BaseModel):
     """The result of a keyword summarization task."""
     summary_tags: List[str] = Field(..., description="A list of 1-3 word keywords.")
+
+
+# --- Pydantic AI Output Models for Batched Processing ---
+
+class BatchedCategorizedFactor(CategorizedFactor):
+    """A categorization result for one item of a batch."""
+    index: int = Field(..., description="The index of the item this result belongs to.")
+
+
+class BatchedProseSummary(ProseSummary):
+    """A prose summary result for one item of a batch."""
+    index: int = Field(..., description="The index of the item this result belongs to.")
+
+
+class BatchedKeywordSummary(KeywordSummary):
+    """A keyword summary result for one item of a batch."""
+    index: int = Field(..., description="The index of the item this result belongs to.")
+
+
+class CategorizedFactorBatch(BaseModel):
+    """The results of a batched categorization task."""
+    results: List[BatchedCategorizedFactor] = Field(..., description="One result per input item.")
+
+
+class ProseSummaryBatch(BaseModel):
+    """The results of a batched prose summarization task."""
+    results: List[BatchedProseSummary] = Field(..., description="One result per input item.")
+
+
+class KeywordSummaryBatch(BaseModel):
+    """The results of a batched keyword summarization task."""
+    results: List[BatchedKeywordSummary] = Field(..., description="One result per input item.")
+
+
+class MixedFactorBatch(BaseModel):
+    """The results of a batch mixing categorization and summarization tasks."""
+    results: List[Union[BatchedCategorizedFactor, BatchedProseSummary, BatchedKeywordSummary]] = Field(
+        ..., description="One result per input item, matching the instruction given for that item."
+    )
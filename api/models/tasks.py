@@ -1,7 +1,10 @@
 from __future__ import annotations
 from enum import Enum, auto
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any, Dict
+from typing import List, Literal, Optional, Any, Dict
+
+# How discovery finds products: one research task, or one per category sub-segment
+DiscoveryMode = Literal["single", "sharded"]
 
 
 class ProcurementState(Enum):
@@ -14,6 +17,7 @@ class ProcurementState(Enum):
     FORMATTING = auto()
     COMPLETED = auto()
     ERROR = auto()
+    CANCELLED = auto()
 
 
 class ProcurementData(BaseModel):
@@ -22,21 +26,76 @@ class ProcurementData(BaseModel):
     initial_query: str
     clarified_query: str = ""
     comparison_factors: List[str] = []
+    # Stored apart from the status record; see TaskStore.get_result
     extracted_data: List[Dict[str, Any]] = []
-    formatted_output: Optional[str] = None
+    product_count: int = 0
     error_message: Optional[str] = None
+    # Checkpoint of the last fully completed workflow stage, used to resume
+    last_completed_state: Optional[ProcurementState] = None
+    processed_product_indices: List[int] = []
+    enriched_product_indices: List[int] = []
+    # Seconds spent in each workflow state, and when the current state began
+    stage_timings: Dict[str, float] = {}
+    state_entered_at: Optional[float] = None
+    # Wall-clock time by which the analysis must finish, and whether it had to cut stages short
+    deadline_at: Optional[float] = None
+    deadline_exceeded: bool = False
+    # Set when this task shares another task's identical analysis instead of running its own
+    source_task_id: Optional[str] = None
+    # "hit" when served from the analysis cache, "refresh" when built incrementally from it
+    cache_status: Optional[str] = None
+    # Factors of the cached products this run started from, and when each carried-over product was enriched
+    cached_factors: List[str] = []
+    product_enriched_at: Dict[int, float] = {}
+    # Per-request cache options: bypass the analysis cache, or override its freshness window
+    skip_cache: bool = False
+    cache_max_age_seconds: Optional[float] = None
+    discovery_mode: DiscoveryMode = "single"
 
 
 class AnalyzeRequest(BaseModel):
     query: str
     comparison_factors: Optional[List[str]] = None
+    # Past the deadline, processing and enrichment are skipped and the partial table is returned
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    # Run a fresh analysis even if an identical one is in flight, recently completed or cached
+    force_refresh: bool = False
+    # Cached products enriched longer ago than this are re-enriched (default ANALYSIS_CACHE_FRESHNESS_SECONDS)
+    max_age_seconds: Optional[float] = Field(default=None, ge=0)
+    # Split discovery across category sub-segments for larger product sets (default DISCOVERY_MODE)
+    discovery_mode: Optional[DiscoveryMode] = None
 
 
 class AnalyzeResponse(BaseModel):
     task_id: str
+    # The identical analysis this task shares, if it was attached to one
+    source_task_id: Optional[str] = None
 
 
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
     data: Dict[str, Any]
+
+
+class CachedProduct(BaseModel):
+    """A product from a completed analysis and when its data was last enriched."""
+    product: Dict[str, Any]
+    enriched_at: float
+
+
+class CachedAnalysis(BaseModel):
+    """A completed analysis stored for reuse by later requests for the same query."""
+    query: str
+    comparison_factors: List[str]
+    products: List[CachedProduct]
+    discovery_mode: DiscoveryMode = "single"
+    updated_at: float
+
+
+class QueuedJob(BaseModel):
+    """A claimed job from the analysis job queue."""
+    job_id: str
+    task_id: str
+    attempts: int
+    lease_expires_at: float
@@ -1,20 +1,62 @@
 import asyncio
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+import csv
+import io
+import json
+import time
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from uuid import uuid4
 import os
-from pydantic import BaseModel
-from exa_py import Exa
 from loguru import logger
+from pydantic import BaseModel
 
 from app.models.tasks import AnalyzeRequest, AnalyzeResponse, TaskStatusResponse
-from app.dependencies import get_api_key
-from app.agents.clarification_agent import clarify_query
-from app.agents.search_agent import search_and_extract
-from app.agents.processing_agent import process_data
-from app.agents.targeting_agent import generate_enrichment_queries
-from app.agents.enrichment_agent import enrich_product_data
-from app.agents.formatting_agent import format_data_as_csv
+from app.dependencies import get_api_key, get_client_id
+from app.config import (
+    ADMISSION_RETRY_AFTER_SECONDS,
+    ANALYSIS_CACHE_FRESHNESS_SECONDS,
+    DISCOVERY_MODE,
+    EVENT_STREAM_POLL_INTERVAL_SECONDS,
+    JOB_QUEUE_BACKEND,
+    MAX_QUEUED_ANALYSES,
+)
 from app.models.tasks import ProcurementData, ProcurementState
+from app.agents.formatting_agent import (
+    format_product_row,
+    format_table_header,
+    is_arrow_available,
+    stream_table_arrow,
+    stream_table_csv,
+    stream_table_jsonl,
+)
+from app.services.analysis_workflow import (
+    RESUMABLE_STATES,
+    cancel_analysis,
+    is_analysis_running,
+    is_product_complete,
+)
+from app.services.admission import (
+    estimate_retry_after,
+    get_queue_position,
+    has_capacity,
+    record_rejection,
+    submit_analysis,
+    withdraw_analysis,
+)
+from app.services.analysis_cache import copy_products, count_lookup, find_fresh_analysis
+from app.services.dedup import (
+    count_forced_refresh,
+    dedup_key,
+    find_shareable_task,
+    has_attached_tasks,
+    is_attached,
+    resolve_task,
+)
+from app.services.event_bus import subscribe
+from app.services import job_queue
+from app.services.task_store import TaskStore, get_task_store
+from app.utils import load_factor_templates
 
 
 class ClarificationRequest(BaseModel):
@@ -23,113 +65,154 @@ class ClarificationRequest(BaseModel):
 
 router = APIRouter()
 
-tasks: dict[str, ProcurementData] = {}
+# States after which a task makes no further progress without user action
+_TERMINAL_STATES = {
+    ProcurementState.COMPLETED,
+    ProcurementState.ERROR,
+    ProcurementState.AWAITING_CLARIFICATION,
+    ProcurementState.CANCELLED,
+}
+
+# Serializers for the result endpoint: (streamer, media type, file extension)
+_RESULT_FORMATS = {
+    "csv": (stream_table_csv, "text/csv; charset=utf-8", "csv"),
+    "jsonl": (stream_table_jsonl, "application/x-ndjson", "jsonl"),
+    "arrow": (stream_table_arrow, "application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+def _ensure_admission_capacity() -> None:
+    """Rejects the request with 429 and a Retry-After hint when the analysis queue is full."""
+    if JOB_QUEUE_BACKEND == "sqlite":
+        if job_queue.count_queued_jobs() < MAX_QUEUED_ANALYSES:
+            return
+        retry_after = ADMISSION_RETRY_AFTER_SECONDS
+    else:
+        if has_capacity():
+            return
+        retry_after = estimate_retry_after()
+    record_rejection()
+    raise HTTPException(
+        status_code=429,
+        detail="Too many analyses are queued. Retry later.",
+        headers={"Retry-After": str(retry_after)},
+    )
 
 
-async def run_analysis(task_id: str, api_key: str):
-    """Orchestrates the self-correcting, multi-phase analysis workflow."""
-    task_data = tasks[task_id]
+def _schedule_analysis(task_id: str, google_api_key: str, client_id: str) -> None:
+    """Admits the analysis to this process's run queue, or hands it to the worker pool via the job queue."""
+    if JOB_QUEUE_BACKEND == "sqlite":
+        job_queue.enqueue_job(task_id, client_id)
+        return
+    submit_analysis(task_id, google_api_key, client_id)
 
-    try:
-        # --- 1. Clarification ---
-        if task_data.current_state in [ProcurementState.START, ProcurementState.AWAITING_CLARIFICATION]:
-            task_data.current_state = ProcurementState.CLARIFYING
-            query_to_clarify = task_data.clarified_query or task_data.initial_query
-            clarification_result = await clarify_query(query_to_clarify, api_key)
 
-            if clarification_result.needs_clarification:
-                task_data.current_state = ProcurementState.AWAITING_CLARIFICATION
-                task_data.clarified_query = clarification_result.question_for_user or "Query is too ambiguous."
-                return
+def _get_queue_position(task_id: str) -> int | None:
+    if JOB_QUEUE_BACKEND == "sqlite":
+        return job_queue.get_queue_position(task_id)
+    return get_queue_position(task_id)
+
+
+def _load_task(store: TaskStore, task_id: str) -> ProcurementData:
+    """Returns the task as clients see it, following a shared analysis if the task is attached to one."""
+    task = store.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return resolve_task(store, task)
+
+
+def _load_products(store: TaskStore, task: ProcurementData) -> list[dict]:
+    """Reads the result products of a task loaded with _load_task; attached tasks read the shared run's."""
+    return store.get_result(task.source_task_id or task.task_id)
 
-            task_data.clarified_query = clarification_result.clarified_query
-            if not task_data.comparison_factors:
-                task_data.comparison_factors = clarification_result.comparison_factors
-            task_data.comparison_factors = sorted(list(set(task_data.comparison_factors)))
-
-        # --- 2. Discovery ---
-        task_data.current_state = ProcurementState.EXTRACTING
-        extracted_data = await search_and_extract(
-            product_category=task_data.clarified_query,
-            comparison_factors=task_data.comparison_factors,
-            api_key=api_key,
-        )
-        task_data.extracted_data = extracted_data
-        if not task_data.extracted_data:
-            raise Exception("Phase 1 (Discovery) failed.")
-
-        # --- 3. Initial Processing ---
-        task_data.current_state = ProcurementState.PROCESSING
-        task_data.extracted_data = await process_data(task_data.extracted_data, api_key)
-
-        # --- 4. Dynamic Targeting & Enrichment ---
-        task_data.current_state = ProcurementState.ENRICHING
-        exa_client = Exa(api_key=os.getenv("EXA_API_KEY"))
-        
-        enriched_products = []
-        for product in task_data.extracted_data:
-            product_name = product.get("product_name")
-            if not product_name:
-                enriched_products.append(product)
-                continue
-
-            enrichment_queries = await generate_enrichment_queries(product, api_key)
-            
-            if not enrichment_queries:
-                enriched_products.append(product)
-                continue
-
-            try:
-                top_query = enrichment_queries[0]
-                search_results = exa_client.search(top_query, num_results=1, type="keyword")
-                
-                if search_results.results:
-                    top_result_url = search_results.results[0].url
-                    page_content_response = exa_client.get_contents([top_result_url])
-                    if page_content_response.results:
-                        page_content = page_content_response.results[0].text
-                        enriched_product = await enrich_product_data(product, page_content, api_key)
-                        enriched_products.append(enriched_product)
-                    else:
-                        enriched_products.append(product)
-                else:
-                    enriched_products.append(product)
-            except Exception as e:
-                logger.error(f"Error during enrichment for {product_name}: {e}")
-                enriched_products.append(product)
-
-        task_data.extracted_data = enriched_products
-
-        # --- 5. Final Formatting ---
-        task_data.current_state = ProcurementState.FORMATTING
-        csv_output = format_data_as_csv(
-            extracted_data=task_data.extracted_data,
-            comparison_factors=task_data.comparison_factors,
-        )
-        task_data.formatted_output = csv_output
-        task_data.current_state = ProcurementState.COMPLETED
 
-    except Exception as e:
-        logger.exception(f"An error occurred while running analysis for task {task_id}")
-        task_data.current_state = ProcurementState.ERROR
-        task_data.error_message = str(e)
+def _load_owner_task(store: TaskStore, task_id: str) -> ProcurementData:
+    """Returns the task that owns the run: the shared analysis for an attached task, else the task itself."""
+    task = store.get(task_id)
+    if task and is_attached(task):
+        task = store.get(task.source_task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
 
 
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(request: AnalyzeRequest, background_tasks: BackgroundTasks, api_key: str = Depends(get_api_key)):
+async def analyze(
+    request: AnalyzeRequest,
+    api_key: str = Depends(get_api_key),
+    client_id: str = Depends(get_client_id),
+    store: TaskStore = Depends(get_task_store),
+):
     task_id = str(uuid4())
-    task_data = ProcurementData(
-        task_id=task_id,
-        initial_query=request.query,
-        comparison_factors=request.comparison_factors,
+    comparison_factors = request.comparison_factors or []
+    effective_factors = comparison_factors or load_factor_templates().get("generic", [])
+    max_age_seconds = request.max_age_seconds
+    if max_age_seconds is None:
+        max_age_seconds = ANALYSIS_CACHE_FRESHNESS_SECONDS
+    discovery_mode = request.discovery_mode or DISCOVERY_MODE
+
+    # A fresh cached table covering every factor is served without running anything
+    fresh_analysis = None if request.force_refresh else find_fresh_analysis(
+        request.query, effective_factors, max_age_seconds, discovery_mode
     )
-    tasks[task_id] = task_data
+    if fresh_analysis:
+        cached, cached_factors = fresh_analysis
+        products = copy_products(cached)
+        store.save_result(task_id, products)
+        store.save(ProcurementData(
+            task_id=task_id,
+            current_state=ProcurementState.COMPLETED,
+            initial_query=request.query,
+            clarified_query=cached.query,
+            comparison_factors=sorted(set(cached_factors)),
+            product_count=len(products),
+            last_completed_state=ProcurementState.FORMATTING,
+            state_entered_at=time.time(),
+            cache_status="hit",
+            discovery_mode=cached.discovery_mode,
+        ))
+        count_lookup("hits")
+        return AnalyzeResponse(task_id=task_id)
+
+    # Runs with a deadline may return degraded tables, so they are never shared
+    analysis_key = None
+    if not request.deadline_seconds:
+        analysis_key = dedup_key(request.query, effective_factors, discovery_mode)
+
+    if analysis_key and request.force_refresh:
+        count_forced_refresh()
+    elif analysis_key:
+        shared_task = find_shareable_task(store, analysis_key)
+        if shared_task:
+            store.save(ProcurementData(
+                task_id=task_id,
+                initial_query=request.query,
+                comparison_factors=comparison_factors,
+                source_task_id=shared_task.task_id,
+            ))
+            logger.info(f"Task {task_id} attached to identical analysis {shared_task.task_id}")
+            return AnalyzeResponse(task_id=task_id, source_task_id=shared_task.task_id)
 
     google_api_key = os.getenv("GOOGLE_API_KEY")
     if not google_api_key:
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
 
-    background_tasks.add_task(run_analysis, task_id, google_api_key)
+    _ensure_admission_capacity()
+
+    task_data = ProcurementData(
+        task_id=task_id,
+        initial_query=request.query,
+        comparison_factors=comparison_factors,
+        deadline_at=time.time() + request.deadline_seconds if request.deadline_seconds else None,
+        skip_cache=request.force_refresh,
+        cache_max_age_seconds=request.max_age_seconds,
+        discovery_mode=discovery_mode,
+    )
+    store.save(task_data)
+    _schedule_analysis(task_id, google_api_key, client_id)
+    # Only a run that is actually queued may take followers
+    if analysis_key:
+        store.set_dedup_key(analysis_key, task_id)
 
     return AnalyzeResponse(task_id=task_id)
 
@@ -140,22 +223,21 @@ def _map_procurement_state_to_status(state: ProcurementState) -> str:
         return "completed"
     if state == ProcurementState.ERROR:
         return "failed"
+    if state == ProcurementState.CANCELLED:
+        return "cancelled"
     return "running"
 
 @router.get("/status/{task_id}", response_model=TaskStatusResponse)
-async def get_status(task_id: str):
-    task = tasks.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def get_status(task_id: str, request: Request, store: TaskStore = Depends(get_task_store)):
+    task = _load_task(store, task_id)
 
-    result_url = None
-    if task.current_state == ProcurementState.COMPLETED and task.formatted_output:
-        result_url = f"data:text/csv;charset=utf-8,{task.formatted_output}"
-
-    task_dump = task.model_dump()
+    task_dump = task.model_dump(exclude={"extracted_data"})
     task_dump["current_state"] = task.current_state.name
-    if result_url:
-        task_dump["result"] = result_url
+    if task.current_state == ProcurementState.COMPLETED:
+        task_dump["result"] = str(request.url_for("get_task_result", task_id=task_id))
+    else:
+        # Set while the task waits for an analysis slot
+        task_dump["queue_position"] = _get_queue_position(task.source_task_id or task_id)
 
     return TaskStatusResponse(
         task_id=task.task_id,
@@ -163,11 +245,170 @@ async def get_status(task_id: str):
         data=task_dump,
     )
 
+def _result_etag(task: ProcurementData, output_format: str) -> str:
+    # A completed task's table only changes if the task is re-run, which moves its completion time
+    completed_at = int((task.state_entered_at or 0) * 1000)
+    return f'"{task.task_id}-{completed_at}-{output_format}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@router.get("/tasks/{task_id}/result")
+async def get_task_result(
+    task_id: str,
+    request: Request,
+    format: Literal["csv", "jsonl", "arrow"] = Query("csv"),
+    store: TaskStore = Depends(get_task_store),
+):
+    """
+    Streams the final result table of a completed task as CSV, JSON Lines or an
+    Arrow IPC stream. Responses carry an ETag, so unchanged results are answered
+    with 304 Not Modified.
+    """
+    task = _load_task(store, task_id)
+
+    if task.current_state != ProcurementState.COMPLETED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Task has not completed. Current state: {task.current_state.name}",
+        )
+
+    if format == "arrow" and not is_arrow_available():
+        raise HTTPException(status_code=501, detail="Arrow output requires the optional 'pyarrow' package")
+
+    etag = _result_etag(task, format)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    streamer, media_type, extension = _RESULT_FORMATS[format]
+    headers["Content-Disposition"] = f'attachment; filename="procurement-analysis-{task_id}.{extension}"'
+    return StreamingResponse(
+        streamer(_load_products(store, task), task.comparison_factors),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+@router.get("/tasks/{task_id}/partial")
+async def get_partial_results(
+    task_id: str,
+    format: Literal["json", "csv"] = Query("json"),
+    store: TaskStore = Depends(get_task_store),
+):
+    """
+    Returns the current result table while the analysis runs. Each row is
+    marked 'complete' once the product has been processed and enriched, and
+    'pending' otherwise.
+    """
+    task = _load_task(store, task_id)
+
+    header = format_table_header(task.comparison_factors)
+    rows = [
+        (
+            "complete" if is_product_complete(task, index) else "pending",
+            format_product_row(product, task.comparison_factors),
+        )
+        for index, product in enumerate(_load_products(store, task))
+    ]
+
+    if format == "csv":
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(header + ["Status"])
+        for row_status, row in rows:
+            writer.writerow(row + [row_status])
+        return Response(content=output.getvalue(), media_type="text/csv; charset=utf-8")
+
+    return {
+        "task_id": task_id,
+        "state": task.current_state.name,
+        "completed": sum(1 for row_status, _ in rows if row_status == "complete"),
+        "total": len(rows),
+        "columns": header,
+        "rows": [{"status": row_status, "values": dict(zip(header, row))} for row_status, row in rows],
+    }
+
+
+def _state_event(task: ProcurementData) -> dict:
+    return {
+        "type": "state",
+        "task_id": task.task_id,
+        "timestamp": time.time(),
+        "state": task.current_state.name,
+        "error_message": task.error_message,
+        "processed_products": len(task.processed_product_indices),
+        "enriched_products": len(task.enriched_product_indices),
+        "total_products": task.product_count,
+        "stage_timings": task.stage_timings,
+    }
+
+
+def _format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request, store: TaskStore = Depends(get_task_store)):
+    """
+    Streams task progress as server-sent events: state transitions, per-product
+    progress and per-stage timings. The stream closes once the task reaches a
+    state that needs no further polling.
+    """
+    # Attached tasks stream the events of the analysis they share
+    run_task_id = _load_task(store, task_id).source_task_id or task_id
+
+    async def event_stream():
+        with subscribe(run_task_id) as queue:
+            # Snapshot after subscribing so no transition is missed in between
+            task = store.get(task_id)
+            if not task:
+                return
+            task = resolve_task(store, task)
+            last_state = task.current_state
+            yield _format_sse(_state_event(task))
+
+            while last_state not in _TERMINAL_STATES:
+                if await request.is_disconnected():
+                    return
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    # Events are only published in-process; catch changes made by other processes
+                    task = store.get(task_id)
+                    if not task:
+                        return
+                    task = resolve_task(store, task)
+                    if task.current_state == last_state:
+                        yield ": keep-alive\n\n"
+                        continue
+                    event = _state_event(task)
+
+                yield _format_sse(event)
+                if event["type"] == "state":
+                    last_state = ProcurementState[event["state"]]
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/tasks/{task_id}/clarify")
-async def clarify_task(task_id: str, request: ClarificationRequest, background_tasks: BackgroundTasks, api_key: str = Depends(get_api_key)):
-    task_data = tasks.get(task_id)
-    if not task_data:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def clarify_task(
+    task_id: str,
+    request: ClarificationRequest,
+    api_key: str = Depends(get_api_key),
+    client_id: str = Depends(get_client_id),
+    store: TaskStore = Depends(get_task_store),
+):
+    task_data = _load_owner_task(store, task_id)
+    task_id = task_data.task_id
 
     if task_data.current_state != ProcurementState.AWAITING_CLARIFICATION:
         raise HTTPException(
@@ -175,13 +416,97 @@ async def clarify_task(task_id: str, request: ClarificationRequest, background_t
             detail=f"Task is not awaiting clarification. Current state: {task_data.current_state.name}",
         )
 
+    _ensure_admission_capacity()
+
     task_data.clarified_query = request.query
-    task_data.current_state = ProcurementState.AWAITING_CLARIFICATION 
+    task_data.current_state = ProcurementState.AWAITING_CLARIFICATION
+    store.save(task_data)
 
     google_api_key = os.getenv("GOOGLE_API_KEY")
     if not google_api_key:
         raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
     
-    background_tasks.add_task(run_analysis, task_id, google_api_key)
+    _schedule_analysis(task_id, google_api_key, client_id)
 
     return {"message": "Task clarification received. Resuming analysis."}
+
+
+@router.post("/tasks/{task_id}/resume")
+async def resume_task(
+    task_id: str,
+    api_key: str = Depends(get_api_key),
+    client_id: str = Depends(get_client_id),
+    store: TaskStore = Depends(get_task_store),
+):
+    task_data = _load_owner_task(store, task_id)
+    task_id = task_data.task_id
+
+    if task_data.current_state not in RESUMABLE_STATES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Task cannot be resumed. Current state: {task_data.current_state.name}",
+        )
+
+    # Queued jobs are resumed by the workers themselves unless the task failed
+    is_owned_by_worker = JOB_QUEUE_BACKEND == "sqlite" and task_data.current_state != ProcurementState.ERROR
+    if is_analysis_running(task_id) or is_owned_by_worker:
+        raise HTTPException(status_code=409, detail="Task is still running")
+
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not configured")
+
+    _ensure_admission_capacity()
+    _schedule_analysis(task_id, google_api_key, client_id)
+
+    resume_point = task_data.last_completed_state.name if task_data.last_completed_state else "START"
+    return {"message": f"Resuming analysis after stage {resume_point}."}
+
+
+@router.post("/tasks/{task_id}/cancel", status_code=202)
+async def cancel_task(
+    task_id: str,
+    api_key: str = Depends(get_api_key),
+    store: TaskStore = Depends(get_task_store),
+):
+    """
+    Stops a task. A run in this process is cancelled immediately; a run in a
+    queue worker stops once the worker sees the cancellation flag.
+    """
+    task_data = store.get(task_id)
+    if not task_data:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    current_state = resolve_task(store, task_data).current_state
+    if current_state in (ProcurementState.COMPLETED, ProcurementState.CANCELLED):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Task cannot be cancelled. Current state: {current_state.name}",
+        )
+
+    # An attached task only detaches; the shared analysis keeps running for its other tasks
+    if is_attached(task_data):
+        task_data.current_state = ProcurementState.CANCELLED
+        store.save(task_data)
+        return {"message": "Task cancelled."}
+    # Cancelling a shared run would cancel it for every task attached to it
+    if has_attached_tasks(store, task_id):
+        raise HTTPException(
+            status_code=409,
+            detail="Task is shared by other requests and cannot be cancelled while they are attached.",
+        )
+
+    store.request_cancel(task_id)
+    if cancel_analysis(task_id):
+        return {"message": "Task cancelled."}
+    if withdraw_analysis(task_id):
+        task_data.current_state = ProcurementState.CANCELLED
+        store.save(task_data)
+        return {"message": "Task cancelled."}
+
+    # Paused or failed tasks have no run to stop; a queued or remote run stops on its own
+    if task_data.current_state in (ProcurementState.AWAITING_CLARIFICATION, ProcurementState.ERROR):
+        task_data.current_state = ProcurementState.CANCELLED
+        store.save(task_data)
+        return {"message": "Task cancelled."}
+    return {"message": "Cancellation requested."}
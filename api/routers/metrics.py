@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+
+from app.dependencies import get_api_key
+from app.services.admission import get_admission_stats
+from app.services.analysis_cache import get_analysis_cache_stats
+from app.services.cache import get_cache_stats
+from app.services.content_reducer import get_content_reduction_stats
+from app.services.dedup import get_dedup_stats
+from app.services.event_bus import count_subscribers
+from app.services.processing_rules import get_fast_path_stats
+from app.services.product_dedup import get_product_dedup_stats
+from app.services.rate_limiter import get_rate_limiter_stats
+from app.services.resilience import get_resilience_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics(api_key: str = Depends(get_api_key)):
+    """Returns in-process counters for caches and outbound calls."""
+    return {
+        "admission": get_admission_stats(),
+        "analysis_cache": get_analysis_cache_stats(),
+        "cache": get_cache_stats(),
+        "content_reduction": get_content_reduction_stats(),
+        "dedup": get_dedup_stats(),
+        "event_subscribers": count_subscribers(),
+        "processing_fast_path": get_fast_path_stats(),
+        "product_dedup": get_product_dedup_stats(),
+        "rate_limits": get_rate_limiter_stats(),
+        "resilience": get_resilience_stats(),
+    }
@@ -0,0 +1,176 @@
+import asyncio
+import math
+import os
+import socket
+import time
+from collections import OrderedDict, deque
+from uuid import uuid4
+
+from loguru import logger
+
+from app.config import (
+    ADMISSION_RETRY_AFTER_SECONDS,
+    MAX_CONCURRENT_ANALYSES,
+    MAX_QUEUED_ANALYSES,
+    TASK_CLAIM_TTL_SECONDS,
+)
+from app.services.analysis_workflow import run_analysis
+from app.services.task_store import get_task_store
+
+# Weight of the latest run in the moving average used for Retry-After estimates
+_DURATION_SMOOTHING = 0.2
+
+_running: dict[str, asyncio.Task] = {}
+# Waiting analyses per client, in round-robin order: client_id -> [(task_id, llm_api_key), ...]
+_waiting: OrderedDict[str, deque[tuple[str, str]]] = OrderedDict()
+_average_run_seconds: float | None = None
+_rejected_count = 0
+
+# Owner of this process's task claims in a task store shared with other API processes
+_OWNER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+
+
+def count_waiting() -> int:
+    return sum(len(queue) for queue in _waiting.values())
+
+
+def has_capacity() -> bool:
+    """Whether a new analysis can be admitted, either to run now or to wait in the queue."""
+    return len(_running) < MAX_CONCURRENT_ANALYSES or count_waiting() < MAX_QUEUED_ANALYSES
+
+
+def record_rejection() -> None:
+    global _rejected_count
+    _rejected_count += 1
+
+
+def estimate_retry_after() -> int:
+    """Seconds until a queue slot is likely to free up: one average run spread over the run slots."""
+    if _average_run_seconds is None:
+        return ADMISSION_RETRY_AFTER_SECONDS
+    return max(1, math.ceil(_average_run_seconds / MAX_CONCURRENT_ANALYSES))
+
+
+def submit_analysis(task_id: str, llm_api_key: str, client_id: str) -> None:
+    """
+    Runs the analysis now if a slot is free, otherwise queues it behind other
+    waiting analyses. Clients are served round-robin, so one client's burst
+    can't starve the others. Callers check `has_capacity` first. The task is
+    claimed for this process first, and skipped if another process holds it.
+    """
+    if task_id in _running or _find_waiting(task_id):
+        return
+    if not get_task_store().claim_task(task_id, _OWNER_ID, TASK_CLAIM_TTL_SECONDS):
+        logger.info(f"Task {task_id} is claimed by another process; not running it here")
+        return
+    _waiting.setdefault(client_id, deque()).append((task_id, llm_api_key))
+    _dispatch()
+    position = get_queue_position(task_id)
+    if position is not None:
+        logger.info(f"Queued analysis for task {task_id} at position {position}")
+
+
+def withdraw_analysis(task_id: str) -> bool:
+    """Removes a task that is still waiting for a slot. Returns whether it was waiting."""
+    client_id = _find_waiting(task_id)
+    if client_id is None:
+        return False
+    queue = _waiting[client_id]
+    for entry in list(queue):
+        if entry[0] == task_id:
+            queue.remove(entry)
+    if not queue:
+        del _waiting[client_id]
+    get_task_store().release_task(task_id, _OWNER_ID)
+    return True
+
+
+def _find_waiting(task_id: str) -> str | None:
+    for client_id, queue in _waiting.items():
+        if any(waiting_task_id == task_id for waiting_task_id, _ in queue):
+            return client_id
+    return None
+
+
+def _waiting_order() -> list[str]:
+    """Task IDs in the order they will be started."""
+    queues = [list(queue) for queue in _waiting.values()]
+    order = []
+    for depth in range(max((len(queue) for queue in queues), default=0)):
+        order.extend(queue[depth][0] for queue in queues if depth < len(queue))
+    return order
+
+
+def get_queue_position(task_id: str) -> int | None:
+    """The task's 1-based position among waiting analyses, or None if it isn't waiting."""
+    try:
+        return _waiting_order().index(task_id) + 1
+    except ValueError:
+        return None
+
+
+def _dispatch() -> None:
+    while len(_running) < MAX_CONCURRENT_ANALYSES and _waiting:
+        client_id, queue = next(iter(_waiting.items()))
+        task_id, llm_api_key = queue.popleft()
+        if queue:
+            _waiting.move_to_end(client_id)
+        else:
+            del _waiting[client_id]
+        _start(task_id, llm_api_key)
+
+
+def _start(task_id: str, llm_api_key: str) -> None:
+    started_at = time.monotonic()
+    analysis = asyncio.create_task(run_analysis(task_id, llm_api_key))
+    _running[task_id] = analysis
+    analysis.add_done_callback(lambda finished: _on_finished(task_id, finished, started_at))
+
+
+def _on_finished(task_id: str, analysis: asyncio.Task, started_at: float) -> None:
+    global _average_run_seconds
+    _running.pop(task_id, None)
+    get_task_store().release_task(task_id, _OWNER_ID)
+    if not analysis.cancelled():
+        if analysis.exception() is not None:
+            logger.opt(exception=analysis.exception()).error(f"Analysis for task {task_id} crashed")
+        duration = time.monotonic() - started_at
+        if _average_run_seconds is None:
+            _average_run_seconds = duration
+        else:
+            _average_run_seconds += _DURATION_SMOOTHING * (duration - _average_run_seconds)
+    _dispatch()
+
+
+async def keep_task_claims() -> None:
+    """Renews this process's task claims until cancelled, so other processes don't resume its tasks."""
+    while True:
+        await asyncio.sleep(TASK_CLAIM_TTL_SECONDS / 3)
+        get_task_store().renew_task_claims(_OWNER_ID, TASK_CLAIM_TTL_SECONDS)
+
+
+async def stop_admitted_analyses() -> None:
+    """
+    Drops waiting analyses and cancels running ones, releasing their claims
+    so another process can resume them. Called on application shutdown.
+    """
+    store = get_task_store()
+    for queue in _waiting.values():
+        for task_id, _ in queue:
+            store.release_task(task_id, _OWNER_ID)
+    _waiting.clear()
+    for analysis in _running.values():
+        analysis.cancel()
+    await asyncio.gather(*_running.values(), return_exceptions=True)
+
+
+def get_admission_stats() -> dict[str, float | int | None]:
+    """Returns admission queue counters for this process."""
+    return {
+        "running": len(_running),
+        "queued": count_waiting(),
+        "max_concurrent": MAX_CONCURRENT_ANALYSES,
+        "max_queued": MAX_QUEUED_ANALYSES,
+        "rejected": _rejected_count,
+        "average_run_seconds": round(_average_run_seconds, 1) if _average_run_seconds is not None else None,
+    }
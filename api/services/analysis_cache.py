@@ -0,0 +1,142 @@
+import copy
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any
+
+from loguru import logger
+
+from app.config import ANALYSIS_CACHE_ENABLED, ANALYSIS_CACHE_MAX_AGE_SECONDS
+from app.models.tasks import CachedAnalysis, CachedProduct
+from app.services.dedup import normalize_query
+from app.services.factor_registry import normalize_factor_name
+from app.services.storage import get_connection
+
+_DATABASE_NAME = "analysis_cache"
+
+_counters: Counter[str] = Counter()
+
+
+@lru_cache(maxsize=None)
+def _get_db():
+    """Returns the analysis cache connection, creating the table on first use."""
+    connection = get_connection(_DATABASE_NAME)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS analysis_results (
+            query_key TEXT PRIMARY KEY,
+            analysis_json TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    return connection
+
+
+def get_cached_analysis(query: str, discovery_mode: str = "single") -> CachedAnalysis | None:
+    """
+    Returns the stored analysis for the normalized query, or None if missing or
+    too old. A sharded request can't be served from single-task discovery,
+    which finds fewer products.
+    """
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    row = _get_db().execute(
+        "SELECT analysis_json, updated_at FROM analysis_results WHERE query_key = ?",
+        (normalize_query(query),),
+    ).fetchone()
+    if row is None or time.time() - row["updated_at"] > ANALYSIS_CACHE_MAX_AGE_SECONDS:
+        return None
+    cached = CachedAnalysis.model_validate_json(row["analysis_json"])
+    if discovery_mode == "sharded" and cached.discovery_mode != "sharded":
+        return None
+    return cached
+
+
+def store_analysis(
+    query: str,
+    comparison_factors: list[str],
+    products: list[dict[str, Any]],
+    enriched_at: list[float],
+    discovery_mode: str = "single",
+) -> None:
+    """Stores (or replaces) the analysis for the normalized query."""
+    if not ANALYSIS_CACHE_ENABLED or not products:
+        return
+    now = time.time()
+    analysis = CachedAnalysis(
+        query=query,
+        comparison_factors=sorted(set(comparison_factors)),
+        products=[
+            CachedProduct(product=product, enriched_at=product_enriched_at)
+            for product, product_enriched_at in zip(products, enriched_at)
+        ],
+        discovery_mode=discovery_mode,
+        updated_at=now,
+    )
+    _get_db().execute(
+        "INSERT OR REPLACE INTO analysis_results (query_key, analysis_json, updated_at) VALUES (?, ?, ?)",
+        (normalize_query(query), analysis.model_dump_json(), now),
+    )
+    logger.debug(f"Stored analysis of {len(products)} products for '{query}'")
+
+
+def match_cached_factors(cached: CachedAnalysis, comparison_factors: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Splits requested factors into those the cached products already have,
+    spelled as in the cache, and new ones that need a column added.
+    """
+    cached_names = {normalize_factor_name(factor): factor for factor in cached.comparison_factors}
+    covered, missing = [], []
+    for factor in comparison_factors:
+        cached_name = cached_names.get(normalize_factor_name(factor))
+        if cached_name is None:
+            missing.append(factor)
+        else:
+            covered.append(cached_name)
+    return covered, missing
+
+
+def is_fresh(cached: CachedAnalysis, max_age_seconds: float) -> bool:
+    """Whether every cached product was enriched within `max_age_seconds`."""
+    oldest = min(entry.enriched_at for entry in cached.products)
+    return time.time() - oldest <= max_age_seconds
+
+
+def find_fresh_analysis(
+    query: str, comparison_factors: list[str], max_age_seconds: float, discovery_mode: str = "single"
+) -> tuple[CachedAnalysis, list[str]] | None:
+    """
+    Returns the cached analysis and the requested factors, spelled as in the
+    cache, if the cache covers every factor and every product is fresh.
+    """
+    cached = get_cached_analysis(query, discovery_mode)
+    if cached is None:
+        return None
+    covered_factors, new_factors = match_cached_factors(cached, comparison_factors)
+    if new_factors or not is_fresh(cached, max_age_seconds):
+        return None
+    return cached, covered_factors
+
+
+def copy_products(cached: CachedAnalysis) -> list[dict[str, Any]]:
+    return [copy.deepcopy(entry.product) for entry in cached.products]
+
+
+def count_lookup(outcome: str) -> None:
+    """Counts a cache lookup outcome: 'hits', 'refreshes' or 'misses'."""
+    _counters[outcome] += 1
+
+
+def purge_expired_analyses() -> int:
+    """Deletes analyses older than the max age and returns how many were removed."""
+    cursor = _get_db().execute(
+        "DELETE FROM analysis_results WHERE updated_at < ?",
+        (time.time() - ANALYSIS_CACHE_MAX_AGE_SECONDS,),
+    )
+    return cursor.rowcount
+
+
+def get_analysis_cache_stats() -> dict[str, int]:
+    """Returns analysis cache lookup counters for this process."""
+    return {name: _counters[name] for name in ("hits", "refreshes", "misses")}
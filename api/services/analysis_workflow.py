@@ -0,0 +1,463 @@
+import asyncio
+import time
+from typing import Any, Awaitable
+
+from loguru import logger
+
+from app.agents.clarification_agent import clarify_query
+from app.agents.formatting_agent import format_product_row, format_table_header
+from app.agents.processing_agent import process_data
+from app.agents.search_agent import determine_factor_definition, search_and_extract
+from app.config import (
+    ANALYSIS_CACHE_FRESHNESS_SECONDS,
+    CANCELLATION_POLL_INTERVAL_SECONDS,
+    PIPELINE_MODE,
+    PROCESSING_MODE,
+)
+from app.models.tasks import ProcurementData, ProcurementState
+from app.services.analysis_cache import (
+    copy_products,
+    count_lookup,
+    get_cached_analysis,
+    match_cached_factors,
+    store_analysis,
+)
+from app.services.dedup import dedup_key, is_attached
+from app.services.enrichment_engine import enrich_products
+from app.services.event_bus import publish
+from app.services.product_dedup import merge_duplicate_products
+from app.services.product_pipeline import run_product_pipeline
+from app.services.task_store import TaskStore, get_task_store
+
+
+# Checkpointed stages, in workflow order
+_CHECKPOINT_STAGES = [
+    ProcurementState.CLARIFYING,
+    ProcurementState.EXTRACTING,
+    ProcurementState.PROCESSING,
+    ProcurementState.ENRICHING,
+    ProcurementState.FORMATTING,
+]
+
+# States in which a task is mid-run; after a crash these can be resumed
+RESUMABLE_STATES = [
+    ProcurementState.CLARIFYING,
+    ProcurementState.EXTRACTING,
+    ProcurementState.PROCESSING,
+    ProcurementState.ENRICHING,
+    ProcurementState.FORMATTING,
+    ProcurementState.ERROR,
+]
+
+
+_running_analyses: dict[str, asyncio.Task] = {}
+
+
+def is_analysis_running(task_id: str) -> bool:
+    """Whether this process is currently running the task's analysis."""
+    return task_id in _running_analyses
+
+
+def cancel_analysis(task_id: str) -> bool:
+    """
+    Cancels the task's analysis if it runs in this process. In-flight agent
+    calls and Exa polls are cancelled with it. Returns whether it was running.
+    """
+    analysis = _running_analyses.get(task_id)
+    if analysis is None:
+        return False
+    analysis.cancel()
+    return True
+
+
+def _set_state(task_data: ProcurementData, state: ProcurementState, store: TaskStore) -> None:
+    """Records a state transition and its timing, persists the task and publishes the change."""
+    now = time.time()
+    previous_state = task_data.current_state
+    if task_data.state_entered_at is not None and previous_state != state:
+        elapsed = round(now - task_data.state_entered_at, 3)
+        task_data.stage_timings[previous_state.name] = task_data.stage_timings.get(previous_state.name, 0.0) + elapsed
+        publish(task_data.task_id, "stage_timing", {"stage": previous_state.name, "seconds": elapsed})
+
+    task_data.current_state = state
+    task_data.state_entered_at = now
+    store.save(task_data)
+    publish(task_data.task_id, "state", {"state": state.name, "error_message": task_data.error_message})
+
+
+def _complete_stage(task_data: ProcurementData, state: ProcurementState, store: TaskStore) -> None:
+    """Checkpoints the task after a stage has fully completed."""
+    task_data.last_completed_state = state
+    store.save(task_data)
+
+
+def _is_stage_completed(task_data: ProcurementData, state: ProcurementState) -> bool:
+    if task_data.last_completed_state is None:
+        return False
+    return _CHECKPOINT_STAGES.index(task_data.last_completed_state) >= _CHECKPOINT_STAGES.index(state)
+
+
+def _is_past_deadline(task_data: ProcurementData) -> bool:
+    return task_data.deadline_at is not None and time.time() >= task_data.deadline_at
+
+
+async def _run_until_deadline(task_data: ProcurementData, stage: Awaitable[Any]) -> tuple[bool, Any]:
+    """
+    Awaits a stage, abandoning it if the task's deadline passes first.
+    Returns (finished, result); the result is None when the stage was cut short.
+    """
+    if task_data.deadline_at is None:
+        return True, await stage
+
+    deadline = asyncio.timeout(max(0.0, task_data.deadline_at - time.time()))
+    try:
+        async with deadline:
+            return True, await stage
+    except TimeoutError:
+        if not deadline.expired():
+            raise  # Raised by the stage itself
+        return False, None
+
+
+def _mark_deadline_exceeded(task_data: ProcurementData, stage: ProcurementState, store: TaskStore) -> None:
+    logger.warning(f"Task {task_data.task_id} hit its deadline during {stage.name}; continuing with partial data")
+    task_data.deadline_exceeded = True
+    store.save(task_data)
+    publish(task_data.task_id, "deadline", {"stage": stage.name})
+
+
+async def _start_from_cache(task_data: ProcurementData, api_key: str) -> None:
+    """
+    Seeds the task from a cached analysis of the same query, so discovery and
+    processing are skipped. Products enriched within the freshness window are
+    kept as they are; stale products are re-enriched. New factors get a
+    'Not found' column on every product, which processing and enrichment
+    then fill in; cached columns are not processed again.
+    """
+    cached = get_cached_analysis(task_data.clarified_query, task_data.discovery_mode)
+    if cached is None:
+        count_lookup("misses")
+        return
+
+    covered_factors, new_factors = match_cached_factors(cached, task_data.comparison_factors)
+    products = copy_products(cached)
+    if new_factors:
+        definitions = await asyncio.gather(*(determine_factor_definition(factor, api_key) for factor in new_factors))
+        for product in products:
+            product.setdefault("extracted_factors", []).extend(
+                {"name": factor, "value": "Not found", "definition": definition.model_dump()}
+                for factor, definition in zip(new_factors, definitions)
+            )
+
+    max_age = task_data.cache_max_age_seconds
+    if max_age is None:
+        max_age = ANALYSIS_CACHE_FRESHNESS_SECONDS
+    now = time.time()
+    fresh_products = {
+        index: entry.enriched_at
+        for index, entry in enumerate(cached.products)
+        if not new_factors and now - entry.enriched_at <= max_age
+    }
+
+    task_data.extracted_data = products
+    task_data.comparison_factors = sorted(set(covered_factors + new_factors))
+    task_data.cached_factors = cached.comparison_factors
+    # New factor cells still carry their definitions and go through processing
+    task_data.processed_product_indices = [] if new_factors else list(range(len(products)))
+    task_data.enriched_product_indices = sorted(fresh_products)
+    task_data.product_enriched_at = fresh_products
+    task_data.last_completed_state = ProcurementState.EXTRACTING if new_factors else ProcurementState.PROCESSING
+    task_data.cache_status = "hit" if len(fresh_products) == len(products) else "refresh"
+    count_lookup("hits" if task_data.cache_status == "hit" else "refreshes")
+    logger.info(
+        f"Task {task_data.task_id} starts from a cached analysis: re-enriching "
+        f"{len(products) - len(fresh_products)} of {len(products)} products, {len(new_factors)} new factors"
+    )
+
+
+def _save_products(task_data: ProcurementData, store: TaskStore) -> None:
+    """Persists the whole product table, e.g. after discovery; single products are saved by _record_product."""
+    task_data.product_count = len(task_data.extracted_data)
+    store.save_result(task_data.task_id, task_data.extracted_data)
+
+
+def _store_in_cache(task_data: ProcurementData) -> None:
+    """Stores the finished table for reuse, unless it was cut short by a deadline."""
+    if task_data.deadline_exceeded or task_data.cache_status == "hit":
+        return
+    now = time.time()
+    store_analysis(
+        task_data.clarified_query,
+        task_data.comparison_factors + task_data.cached_factors,
+        task_data.extracted_data,
+        [task_data.product_enriched_at.get(index, now) for index in range(len(task_data.extracted_data))],
+        task_data.discovery_mode,
+    )
+
+
+def _uses_streaming_pipeline() -> bool:
+    """Whether products stream through the stages; column batching needs every product at once."""
+    return PIPELINE_MODE == "streaming" and PROCESSING_MODE != "column"
+
+
+def _record_product(
+    task_data: ProcurementData, stage: ProcurementState, index: int, product: dict, store: TaskStore
+) -> None:
+    """Checkpoints a product that finished a stage and publishes its current row."""
+    completed_indices = (
+        task_data.processed_product_indices
+        if stage == ProcurementState.PROCESSING
+        else task_data.enriched_product_indices
+    )
+    task_data.extracted_data[index] = product
+    completed_indices.append(index)
+    store.save_result_product(task_data.task_id, index, product)
+    store.save(task_data)
+    publish(task_data.task_id, "product", {
+        "stage": stage.name,
+        "index": index,
+        "product_name": product.get("product_name"),
+        "completed": len(completed_indices),
+        "total": len(task_data.extracted_data),
+        "row": dict(zip(
+            format_table_header(task_data.comparison_factors),
+            format_product_row(product, task_data.comparison_factors),
+        )),
+    })
+
+
+async def _run_streaming_stages(task_data: ProcurementData, api_key: str, store: TaskStore) -> None:
+    """
+    Runs processing and enrichment as one per-product dataflow. The task
+    reports PROCESSING until every product is processed and ENRICHING until
+    every product is enriched, although both overlap across products.
+    """
+    product_count = len(task_data.extracted_data)
+    if _is_stage_completed(task_data, ProcurementState.PROCESSING):
+        skip_processing = set(range(product_count))
+    else:
+        skip_processing = set(task_data.processed_product_indices)
+
+    def _all_processed() -> bool:
+        return len(skip_processing | set(task_data.processed_product_indices)) >= product_count
+
+    def _on_product_processed(index: int, product: dict) -> None:
+        _record_product(task_data, ProcurementState.PROCESSING, index, product, store)
+        if _all_processed() and task_data.current_state == ProcurementState.PROCESSING:
+            _complete_stage(task_data, ProcurementState.PROCESSING, store)
+            _set_state(task_data, ProcurementState.ENRICHING, store)
+
+    def _on_product_enriched(index: int, product: dict) -> None:
+        _record_product(task_data, ProcurementState.ENRICHING, index, product, store)
+
+    _set_state(task_data, ProcurementState.ENRICHING if _all_processed() else ProcurementState.PROCESSING, store)
+    finished = False
+    if not _is_past_deadline(task_data):
+        finished, _ = await _run_until_deadline(task_data, run_product_pipeline(
+            task_data.extracted_data,
+            api_key,
+            mode=PROCESSING_MODE,
+            skip_processing=skip_processing,
+            skip_enrichment=set(task_data.enriched_product_indices),
+            on_product_processed=_on_product_processed,
+            on_product_enriched=_on_product_enriched,
+        ))
+    if not finished:
+        # Products that finished a stage before the deadline were already checkpointed into extracted_data
+        _mark_deadline_exceeded(task_data, task_data.current_state, store)
+    _complete_stage(task_data, ProcurementState.ENRICHING, store)
+
+
+async def _watch_for_cancellation(task_id: str, analysis: asyncio.Task) -> None:
+    """Cancels the analysis when another process, e.g. the API, flags the task as cancelled."""
+    store = get_task_store()
+    while not analysis.done():
+        await asyncio.sleep(CANCELLATION_POLL_INTERVAL_SECONDS)
+        if store.is_cancel_requested(task_id):
+            analysis.cancel()
+            return
+
+
+async def run_analysis(task_id: str, api_key: str):
+    """
+    Orchestrates the self-correcting, multi-phase analysis workflow. With the
+    streaming pipeline, each product moves on from processing to enrichment
+    as soon as it is processed. The task is checkpointed after each stage and
+    each product, so a re-run resumes from the last completed stage and skips
+    products that were already processed or enriched. The run stops when the
+    task is cancelled and cuts stages short once its deadline passes.
+    """
+    if is_analysis_running(task_id):
+        logger.warning(f"Analysis for task {task_id} is already running in this process")
+        return
+
+    # A separate task, so cancelling the analysis never cancels the caller
+    analysis = asyncio.create_task(_run_analysis(task_id, api_key))
+    _running_analyses[task_id] = analysis
+    watcher = asyncio.create_task(_watch_for_cancellation(task_id, analysis))
+    try:
+        await analysis
+    finally:
+        watcher.cancel()
+        _running_analyses.pop(task_id, None)
+
+
+async def _run_analysis(task_id: str, api_key: str):
+    store = get_task_store()
+    task_data = store.get(task_id)
+    if not task_data:
+        logger.error(f"Task {task_id} not found in the task store; skipping analysis")
+        return
+    if store.is_cancel_requested(task_id):
+        _set_state(task_data, ProcurementState.CANCELLED, store)
+        return
+    task_data.extracted_data = store.get_result(task_id)
+
+    if task_data.last_completed_state:
+        logger.info(f"Resuming task {task_id} after stage {task_data.last_completed_state.name}")
+    task_data.error_message = None
+    task_data.state_entered_at = None  # Don't count downtime before a resume as stage time
+
+    try:
+        # --- 1. Clarification ---
+        # Decided by the checkpoint, not the state: a task that failed during clarification resumes from ERROR
+        if not _is_stage_completed(task_data, ProcurementState.CLARIFYING):
+            _set_state(task_data, ProcurementState.CLARIFYING, store)
+            query_to_clarify = task_data.clarified_query or task_data.initial_query
+            clarification_result = await clarify_query(query_to_clarify, api_key)
+
+            if clarification_result.needs_clarification:
+                task_data.clarified_query = clarification_result.question_for_user or "Query is too ambiguous."
+                _set_state(task_data, ProcurementState.AWAITING_CLARIFICATION, store)
+                return
+
+            task_data.clarified_query = clarification_result.clarified_query
+            if not task_data.comparison_factors:
+                task_data.comparison_factors = clarification_result.comparison_factors
+            task_data.comparison_factors = sorted(list(set(task_data.comparison_factors)))
+            _complete_stage(task_data, ProcurementState.CLARIFYING, store)
+            if task_data.deadline_at is None:
+                # Let later requests for the clarified query share this run too
+                clarified_key = dedup_key(
+                    task_data.clarified_query, task_data.comparison_factors, task_data.discovery_mode
+                )
+                store.set_dedup_key(clarified_key, task_id)
+            if not task_data.skip_cache:
+                await _start_from_cache(task_data, api_key)
+                if task_data.extracted_data:
+                    _save_products(task_data, store)
+
+        # --- 2. Discovery ---
+        if not _is_stage_completed(task_data, ProcurementState.EXTRACTING):
+            _set_state(task_data, ProcurementState.EXTRACTING, store)
+            finished, extracted_data = await _run_until_deadline(task_data, search_and_extract(
+                product_category=task_data.clarified_query,
+                comparison_factors=task_data.comparison_factors,
+                api_key=api_key,
+                mode=task_data.discovery_mode,
+            ))
+            if not finished:
+                # Nothing to degrade to without discovered products
+                task_data.deadline_exceeded = True
+                raise Exception("Deadline exceeded before discovery finished.")
+            task_data.extracted_data = merge_duplicate_products(extracted_data)
+            if not task_data.extracted_data:
+                raise Exception("Phase 1 (Discovery) failed.")
+            _save_products(task_data, store)
+            _complete_stage(task_data, ProcurementState.EXTRACTING, store)
+
+        # --- 3 & 4. Processing and enrichment, streamed per product ---
+        if _uses_streaming_pipeline() and not _is_stage_completed(task_data, ProcurementState.ENRICHING):
+            await _run_streaming_stages(task_data, api_key, store)
+
+        # --- 3. Initial Processing ---
+        if not _is_stage_completed(task_data, ProcurementState.PROCESSING):
+            _set_state(task_data, ProcurementState.PROCESSING, store)
+            finished, processed_data = False, None
+            pending_indices = [
+                index for index in range(len(task_data.extracted_data))
+                if index not in task_data.processed_product_indices
+            ]
+            if not _is_past_deadline(task_data):
+                finished, processed_data = await _run_until_deadline(task_data, process_data(
+                    [task_data.extracted_data[index] for index in pending_indices], api_key
+                ))
+            if finished:
+                for index, product in zip(pending_indices, processed_data):
+                    task_data.extracted_data[index] = product
+                task_data.processed_product_indices.extend(pending_indices)
+                _save_products(task_data, store)
+            else:
+                _mark_deadline_exceeded(task_data, ProcurementState.PROCESSING, store)
+            _complete_stage(task_data, ProcurementState.PROCESSING, store)
+
+        # --- 4. Dynamic Targeting & Enrichment ---
+        if not _is_stage_completed(task_data, ProcurementState.ENRICHING):
+            _set_state(task_data, ProcurementState.ENRICHING, store)
+
+            def _checkpoint_product(index: int, product: dict) -> None:
+                _record_product(task_data, ProcurementState.ENRICHING, index, product, store)
+
+            finished, enriched_data = False, None
+            if not _is_past_deadline(task_data):
+                finished, enriched_data = await _run_until_deadline(task_data, enrich_products(
+                    task_data.extracted_data,
+                    api_key,
+                    skip_indices=set(task_data.enriched_product_indices),
+                    on_product_enriched=_checkpoint_product,
+                ))
+            if finished:
+                task_data.extracted_data = enriched_data
+                _save_products(task_data, store)
+            else:
+                # Products enriched before the deadline were already checkpointed into extracted_data
+                _mark_deadline_exceeded(task_data, ProcurementState.ENRICHING, store)
+            _complete_stage(task_data, ProcurementState.ENRICHING, store)
+
+        # --- 5. Final Formatting ---
+        # The result endpoint builds the table from the stored products on request
+        _set_state(task_data, ProcurementState.FORMATTING, store)
+        _store_in_cache(task_data)
+        task_data.last_completed_state = ProcurementState.FORMATTING
+        _set_state(task_data, ProcurementState.COMPLETED, store)
+
+    except asyncio.CancelledError:
+        if not store.is_cancel_requested(task_id):
+            raise  # Shutdown; leave the task resumable
+        logger.info(f"Analysis for task {task_id} was cancelled")
+        _set_state(task_data, ProcurementState.CANCELLED, store)
+
+    except Exception as e:
+        logger.exception(f"An error occurred while running analysis for task {task_id}")
+        task_data.error_message = str(e)
+        _set_state(task_data, ProcurementState.ERROR, store)
+
+
+def is_product_complete(task_data: ProcurementData, index: int) -> bool:
+    """Whether a product has finished processing and enrichment."""
+    if _is_stage_completed(task_data, ProcurementState.ENRICHING):
+        return True
+    is_processed = (
+        _is_stage_completed(task_data, ProcurementState.PROCESSING)
+        or index in task_data.processed_product_indices
+    )
+    return is_processed and index in task_data.enriched_product_indices
+
+
+def find_interrupted_task_ids() -> list[str]:
+    """
+    Returns tasks left mid-run or still waiting for an analysis slot, e.g. by
+    a restart, that are not running in this process. Tasks attached to
+    another task's run are skipped; they follow that run.
+    """
+    store = get_task_store()
+    interrupted_states = [ProcurementState.START] + [
+        state for state in RESUMABLE_STATES if state != ProcurementState.ERROR
+    ]
+    interrupted = []
+    for task_id in store.list_task_ids(interrupted_states):
+        task = store.get(task_id)
+        if task is None or is_attached(task) or is_analysis_running(task_id):
+            continue
+        interrupted.append(task_id)
+    return interrupted
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+from loguru import logger
+
+from app.services.storage import get_connection
+
+_DATABASE_NAME = "cache"
+
+# A hit moves an entry up the LRU order at most this often, so hot entries don't cost a write per read
+_ACCESS_REFRESH_SECONDS = 60.0
+# A namespace's total size is checked this often, or sooner once the writes since the
+# last check add up to this share of its budget; between checks it may run over by that much
+_EVICTION_INTERVAL_SECONDS = 30.0
+_EVICTION_WRITE_SHARE = 0.1
+
+_hits: Counter[str] = Counter()
+_misses: Counter[str] = Counter()
+_unchecked_bytes: Counter[str] = Counter()
+_last_eviction_at: dict[str, float] = {}
+
+# The cache runs in worker threads; they share one connection, so one at a time
+_db_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _get_db():
+    """Returns the cache connection, creating the table on first use."""
+    connection = get_connection(_DATABASE_NAME)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            is_compressed INTEGER NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (namespace, cache_key)
+        )
+        """
+    )
+    # Covers the size sum and the LRU walk of an eviction without reading the values
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at, size_bytes)"
+    )
+    return connection
+
+
+async def cache_get(namespace: str, cache_key: str) -> bytes | None:
+    """
+    Returns a cached value, or None if it is missing or expired. Hits refresh
+    the LRU position. The lookup runs in a worker thread.
+    """
+    return await asyncio.to_thread(_get, namespace, cache_key)
+
+
+def _get(namespace: str, cache_key: str) -> bytes | None:
+    now = time.time()
+    with _db_lock:
+        db = _get_db()
+        row = db.execute(
+            """
+            SELECT value, is_compressed, expires_at, accessed_at FROM cache_entries
+            WHERE namespace = ? AND cache_key = ?
+            """,
+            (namespace, cache_key),
+        ).fetchone()
+        if row is None or row["expires_at"] < now:
+            _misses[namespace] += 1
+            return None
+
+        if row["accessed_at"] < now - _ACCESS_REFRESH_SECONDS:
+            db.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND cache_key = ?",
+                (now, namespace, cache_key),
+            )
+        _hits[namespace] += 1
+    value = row["value"]
+    return zlib.decompress(value) if row["is_compressed"] else value
+
+
+async def cache_set(
+    namespace: str,
+    cache_key: str,
+    value: bytes,
+    ttl_seconds: float,
+    max_bytes: int,
+    compress: bool = False,
+) -> None:
+    """
+    Stores a value in a worker thread. The least recently used entries of the
+    namespace are evicted periodically to keep its total size within `max_bytes`.
+    """
+    await asyncio.to_thread(_set, namespace, cache_key, value, ttl_seconds, max_bytes, compress)
+
+
+def _set(
+    namespace: str,
+    cache_key: str,
+    value: bytes,
+    ttl_seconds: float,
+    max_bytes: int,
+    compress: bool,
+) -> None:
+    stored_value = zlib.compress(value) if compress else value
+    if len(stored_value) > max_bytes:
+        return
+
+    now = time.time()
+    with _db_lock:
+        _get_db().execute(
+            """
+            INSERT OR REPLACE INTO cache_entries
+                (namespace, cache_key, value, is_compressed, size_bytes, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (namespace, cache_key, stored_value, int(compress), len(stored_value), now + ttl_seconds, now),
+        )
+        _unchecked_bytes[namespace] += len(stored_value)
+        if (
+            _unchecked_bytes[namespace] >= max_bytes * _EVICTION_WRITE_SHARE
+            or now - _last_eviction_at.get(namespace, 0.0) >= _EVICTION_INTERVAL_SECONDS
+        ):
+            _evict(namespace, max_bytes)
+            _unchecked_bytes[namespace] = 0
+            _last_eviction_at[namespace] = now
+
+
+def _evict(namespace: str, max_bytes: int) -> None:
+    """Drops expired entries, then least recently used ones, until the namespace fits its budget."""
+    db = _get_db()
+    db.execute(
+        "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+        (namespace, time.time()),
+    )
+    total_bytes = db.execute(
+        "SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries WHERE namespace = ?",
+        (namespace,),
+    ).fetchone()[0]
+    if total_bytes <= max_bytes:
+        return
+
+    evicted_keys = []
+    rows = db.execute(
+        "SELECT cache_key, size_bytes FROM cache_entries WHERE namespace = ? ORDER BY accessed_at",
+        (namespace,),
+    )
+    for row in rows:
+        if total_bytes <= max_bytes:
+            break
+        evicted_keys.append((namespace, row["cache_key"]))
+        total_bytes -= row["size_bytes"]
+    rows.close()
+    db.executemany("DELETE FROM cache_entries WHERE namespace = ? AND cache_key = ?", evicted_keys)
+    logger.debug(f"Evicted {len(evicted_keys)} entries from cache namespace '{namespace}'")
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    """Returns hit/miss counters per cache namespace for this process."""
+    namespaces = set(_hits) | set(_misses)
+    return {
+        namespace: {"hits": _hits[namespace], "misses": _misses[namespace]}
+        for namespace in sorted(namespaces)
+    }
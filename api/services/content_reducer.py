@@ -0,0 +1,197 @@
+import math
+import re
+from collections import Counter
+from typing import Any
+
+from loguru import logger
+
+from app.config import ENRICHMENT_CONTENT_CHUNK_TOKENS, ENRICHMENT_CONTENT_TOKEN_BUDGET
+from app.services.rate_limiter import estimate_tokens
+
+# Factor values that say nothing about the product and are worth looking for on the page
+_WEAK_VALUES = {"", "not found", "n/a", "na", "none", "unknown", "not available", "not specified", "varies", "-"}
+
+# Navigation lines of a few words matching these are site chrome rather than product content
+_BOILERPLATE_PATTERN = re.compile(
+    r"cookie|privacy policy|terms of (service|use)|all rights reserved|©|copyright|"
+    r"sign (in|up)|log ?in|subscribe|newsletter|skip to (main )?content|follow us",
+    re.IGNORECASE,
+)
+_LINK_ONLY_PATTERN = re.compile(r"^\s*(?:[-*•|·>]\s*)?(?:!?\[[^\]]*\]\([^)]*\)\s*[|·•,-]?\s*)+$")
+_NAVIGATION_MAX_WORDS = 3
+_REPEATED_LINE_MAX_WORDS = 12
+# Repeated lines with figures are often pricing table cells ("$10/month"), so they are kept
+_FIGURE_PATTERN = re.compile(r"[\d$€£¥₹%]")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "what", "with", "you", "your",
+}
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+
+_GAP_MARKER = "[...]"
+
+_counters: Counter[str] = Counter()
+
+
+def _tokenize(text: str) -> list[str]:
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def strip_boilerplate(text: str) -> str:
+    """
+    Drops navigation, cookie banners, footers and other site chrome: link-only
+    lines, navigation lines of a few words matching common boilerplate
+    phrases, and short lines without figures repeated across the page.
+    """
+    lines = [line.rstrip() for line in text.splitlines()]
+    repeats = Counter(line.strip() for line in lines if line.strip())
+    kept = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            if kept and kept[-1]:
+                kept.append("")
+            continue
+        word_count = len(stripped.split())
+        if _LINK_ONLY_PATTERN.match(stripped):
+            continue
+        if word_count <= _NAVIGATION_MAX_WORDS and _BOILERPLATE_PATTERN.search(stripped):
+            continue
+        if word_count <= _REPEATED_LINE_MAX_WORDS and repeats[stripped] > 2 and not _FIGURE_PATTERN.search(stripped):
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def split_into_chunks(text: str, chunk_tokens: int = ENRICHMENT_CONTENT_CHUNK_TOKENS) -> list[str]:
+    """Groups paragraphs into chunks of about `chunk_tokens`, splitting paragraphs that are larger."""
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        paragraph_tokens = estimate_tokens(paragraph)
+        if current and current_tokens + paragraph_tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if paragraph_tokens > chunk_tokens:
+            words = paragraph.split()
+            words_per_chunk = max(1, len(words) * chunk_tokens // paragraph_tokens)
+            chunks.extend(
+                " ".join(words[start:start + words_per_chunk])
+                for start in range(0, len(words), words_per_chunk)
+            )
+            continue
+        current.append(paragraph)
+        current_tokens += paragraph_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def score_chunks(chunks: list[str], query_terms: list[str]) -> list[float]:
+    """Scores each chunk against the query terms with BM25."""
+    tokenized = [_tokenize(chunk) for chunk in chunks]
+    if not tokenized:
+        return []
+    average_length = sum(len(terms) for terms in tokenized) / len(tokenized) or 1.0
+    document_frequency = Counter(term for terms in tokenized for term in set(terms))
+    unique_query_terms = set(query_terms)
+
+    scores = []
+    for terms in tokenized:
+        frequencies = Counter(terms)
+        score = 0.0
+        for term in unique_query_terms:
+            frequency = frequencies.get(term, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(tokenized) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * len(terms) / average_length))
+        scores.append(score)
+    return scores
+
+
+def weak_factor_names(product: dict[str, Any]) -> list[str]:
+    """Names of factors whose value is missing or says nothing, or every factor if none are weak."""
+    factors = product.get("extracted_factors", [])
+    weak = [
+        factor["name"] for factor in factors
+        if str(factor.get("value") or "").strip().lower() in _WEAK_VALUES
+    ]
+    return weak or [factor["name"] for factor in factors]
+
+
+def reduce_page_content(
+    page_content: str,
+    product: dict[str, Any],
+    search_query: str = "",
+    token_budget: int = ENRICHMENT_CONTENT_TOKEN_BUDGET,
+) -> str:
+    """
+    Cuts a fetched page down to the chunks most relevant to the product's weak
+    factors, within `token_budget`. Chunks keep their page order, with gaps
+    marked. If nothing matches, the start of the page is kept. A budget of 0
+    returns the page unchanged.
+    """
+    if token_budget <= 0:
+        return page_content
+
+    tokens_before = estimate_tokens(page_content)
+    reduced = strip_boilerplate(page_content)
+    if estimate_tokens(reduced) > token_budget:
+        chunks = split_into_chunks(reduced)
+        query_terms = _tokenize(" ".join(weak_factor_names(product)) + " " + search_query)
+        scores = score_chunks(chunks, query_terms)
+        ranked = sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+        if scores and scores[ranked[0]] > 0:
+            ranked = [index for index in ranked if scores[index] > 0]  # Unmatched chunks only pad the prompt
+
+        selected, used_tokens = [], 0
+        for index in ranked:
+            chunk_tokens = estimate_tokens(chunks[index])
+            if selected and used_tokens + chunk_tokens > token_budget:
+                continue
+            selected.append(index)
+            used_tokens += chunk_tokens
+
+        parts, previous = [], None
+        for index in sorted(selected):
+            if previous is not None and index != previous + 1:
+                parts.append(_GAP_MARKER)
+            parts.append(chunks[index])
+            previous = index
+        reduced = "\n\n".join(parts)
+
+    tokens_after = estimate_tokens(reduced)
+    _counters["pages"] += 1
+    _counters["tokens_before"] += tokens_before
+    _counters["tokens_after"] += tokens_after
+    logger.info(
+        f"Reduced page content for {product.get('product_name')} from ~{tokens_before} to ~{tokens_after} tokens "
+        f"({tokens_before - tokens_after} saved)"
+    )
+    return reduced
+
+
+def get_content_reduction_stats() -> dict[str, int]:
+    """Returns page-content reduction counters for this process."""
+    return {
+        "pages": _counters["pages"],
+        "tokens_before": _counters["tokens_before"],
+        "tokens_after": _counters["tokens_after"],
+        "tokens_saved": _counters["tokens_before"] - _counters["tokens_after"],
+    }
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import re
+import time
+from collections import Counter
+
+from app.config import DEDUP_ENABLED, DEDUP_RESULT_TTL_SECONDS
+from app.models.tasks import ProcurementData, ProcurementState
+from app.services.factor_registry import normalize_factor_name
+from app.services.task_store import TaskStore
+
+# Leader states a new request may attach to; paused, failed and cancelled runs are not shared
+_SHAREABLE_STATES = {
+    ProcurementState.START,
+    ProcurementState.CLARIFYING,
+    ProcurementState.EXTRACTING,
+    ProcurementState.PROCESSING,
+    ProcurementState.ENRICHING,
+    ProcurementState.FORMATTING,
+    ProcurementState.COMPLETED,
+}
+
+_counters: Counter[str] = Counter()
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases and collapses whitespace and surrounding punctuation so trivially different queries match."""
+    return re.sub(r"\s+", " ", query).strip(" \t\n.,;:!?\"'").lower()
+
+
+def dedup_key(query: str, comparison_factors: list[str], discovery_mode: str = "single") -> str:
+    """
+    Identifies an analysis by its normalized query and sorted, normalized
+    factor set. Sharded discovery finds more products, so it is keyed apart.
+    """
+    factors = sorted({normalize_factor_name(factor) for factor in comparison_factors})
+    parts = [normalize_query(query), factors]
+    if discovery_mode != "single":
+        parts.append(discovery_mode)
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def find_shareable_task(store: TaskStore, key: str) -> ProcurementData | None:
+    """
+    Returns the task registered under the key if it is still in flight, or
+    completed within DEDUP_RESULT_TTL_SECONDS.
+    """
+    if not DEDUP_ENABLED:
+        return None
+    task_id = store.get_task_id_by_dedup_key(key)
+    leader = store.get(task_id) if task_id else None
+    if leader is None or leader.source_task_id or leader.current_state not in _SHAREABLE_STATES:
+        _counters["misses"] += 1
+        return None
+    if leader.current_state == ProcurementState.COMPLETED and (
+        leader.state_entered_at is None or time.time() - leader.state_entered_at > DEDUP_RESULT_TTL_SECONDS
+    ):
+        _counters["misses"] += 1
+        return None
+    _counters["completed_hits" if leader.current_state == ProcurementState.COMPLETED else "in_flight_hits"] += 1
+    return leader
+
+
+def is_attached(task: ProcurementData) -> bool:
+    """Whether the task shares another task's run rather than running its own."""
+    return bool(task.source_task_id) and task.current_state == ProcurementState.START
+
+
+def has_attached_tasks(store: TaskStore, task_id: str) -> bool:
+    """Whether any task still shares the given task's run."""
+    for candidate_id in store.list_task_ids([ProcurementState.START]):
+        candidate = store.get(candidate_id)
+        if candidate is not None and candidate.source_task_id == task_id:
+            return True
+    return False
+
+
+def resolve_task(store: TaskStore, task: ProcurementData) -> ProcurementData:
+    """
+    Returns the task as clients should see it. An attached task mirrors the
+    run it shares, under its own task ID.
+    """
+    if not is_attached(task):
+        return task
+    leader = store.get(task.source_task_id)
+    if leader is None:
+        return task.model_copy(update={
+            "current_state": ProcurementState.ERROR,
+            "error_message": "The shared analysis this task was attached to has expired.",
+        })
+    return leader.model_copy(update={
+        "task_id": task.task_id,
+        "initial_query": task.initial_query,
+        "source_task_id": leader.task_id,
+    })
+
+
+def count_forced_refresh() -> None:
+    _counters["forced_refreshes"] += 1
+
+
+def get_dedup_stats() -> dict[str, int]:
+    """Returns single-flight lookup counters for this process."""
+    return {
+        name: _counters[name]
+        for name in ("in_flight_hits", "completed_hits", "misses", "forced_refreshes")
+    }
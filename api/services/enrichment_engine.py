@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Callable
+
+from loguru import logger
+
+from app.agents.enrichment_agent import enrich_product_data
+from app.agents.targeting_agent import generate_enrichment_queries
+from app.config import (
+    ENRICHMENT_CONCURRENCY,
+    ENRICHMENT_CONTENT_TOKEN_BUDGET,
+    ENRICHMENT_FETCH_MODE,
+    ENRICHMENT_MAX_PAGES_PER_PRODUCT,
+    ENRICHMENT_RESULTS_PER_QUERY,
+)
+from app.services.content_reducer import reduce_page_content
+from app.services.exa_client import fetch_page_texts, fetch_page_texts_in_wave, search_urls
+
+
+async def fetch_enrichment_pages(queries: list[str]) -> list[tuple[str, str]]:
+    """
+    Returns (url, text) for the pages to enrich a product from. In "single"
+    fetch mode that is the top result of the first targeting query. In
+    "batched" mode every query is searched concurrently, distinct URLs are
+    kept up to ENRICHMENT_MAX_PAGES_PER_PRODUCT, and the pages are fetched in
+    a wave shared with other products. Failed searches are skipped.
+    """
+    if ENRICHMENT_FETCH_MODE == "single":
+        result_urls = await search_urls(queries[0], num_results=1, search_type="keyword")
+        page_texts = await fetch_page_texts(result_urls[:1])
+        return list(page_texts.items())
+
+    search_results = await asyncio.gather(
+        *(search_urls(query, num_results=ENRICHMENT_RESULTS_PER_QUERY, search_type="keyword") for query in queries),
+        return_exceptions=True,
+    )
+    result_urls = []
+    for query, urls in zip(queries, search_results):
+        if isinstance(urls, BaseException):
+            logger.warning(f"Enrichment search failed for '{query}': {urls}")
+            continue
+        result_urls.extend(urls)
+    result_urls = list(dict.fromkeys(result_urls))[:ENRICHMENT_MAX_PAGES_PER_PRODUCT]
+    page_texts = await fetch_page_texts_in_wave(result_urls)
+    return [(url, page_texts[url]) for url in result_urls if url in page_texts]
+
+
+async def enrich_from_pages(
+    product: dict[str, Any], pages: list[tuple[str, str]], queries: list[str], api_key: str
+) -> dict[str, Any]:
+    """
+    Enriches a product from fetched pages. Each page is cut down to the parts
+    relevant to the product's weak factors, sharing the content token budget.
+    """
+    token_budget = ENRICHMENT_CONTENT_TOKEN_BUDGET // len(pages)
+    if ENRICHMENT_CONTENT_TOKEN_BUDGET and not token_budget:
+        token_budget = 1  # Keep reducing; a zero budget would send whole pages
+    search_query = queries[0] if ENRICHMENT_FETCH_MODE == "single" else " ".join(queries)
+    if len(pages) == 1:
+        page_content = reduce_page_content(pages[0][1], product, search_query, token_budget)
+    else:
+        page_content = "\n\n---\n\n".join(
+            f"Source: {url}\n{reduce_page_content(text, product, search_query, token_budget)}"
+            for url, text in pages
+        )
+    return await enrich_product_data(product, page_content, api_key)
+
+
+async def enrich_product(product: dict[str, Any], api_key: str) -> dict[str, Any]:
+    """
+    Runs targeting, search, fetch and enrichment for a single product.
+    Any failure along the way returns the product unchanged.
+    """
+    product_name = product.get("product_name")
+    if not product_name:
+        return product
+
+    enrichment_queries = await generate_enrichment_queries(product, api_key)
+    if not enrichment_queries:
+        return product
+
+    try:
+        pages = await fetch_enrichment_pages(enrichment_queries)
+        if not pages:
+            return product
+
+        return await enrich_from_pages(product, pages, enrichment_queries, api_key)
+    except Exception as e:
+        logger.error(f"Error during enrichment for {product_name}: {e}")
+        return product
+
+
+async def enrich_products(
+    products: list[dict[str, Any]],
+    api_key: str,
+    concurrency: int = ENRICHMENT_CONCURRENCY,
+    skip_indices: set[int] | None = None,
+    on_product_enriched: Callable[[int, dict[str, Any]], None] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Enriches all products concurrently, with at most `concurrency` products
+    in flight at once. The returned list preserves the input order.
+
+    Args:
+        products: The processed products to enrich.
+        api_key: The Google API key for the LLM.
+        concurrency: Maximum number of products enriched at once.
+        skip_indices: Indices of products that are already enriched and are returned as-is.
+        on_product_enriched: Called with (index, product) as soon as each product finishes.
+    """
+    skip_indices = skip_indices or set()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _enrich_with_limit(index: int, product: dict[str, Any]) -> dict[str, Any]:
+        if index in skip_indices:
+            return product
+        async with semaphore:
+            try:
+                enriched_product = await enrich_product(product, api_key)
+            except Exception as e:
+                logger.error(f"Unexpected enrichment failure for {product.get('product_name')}: {e}")
+                enriched_product = product
+        if on_product_enriched:
+            on_product_enriched(index, enriched_product)
+        return enriched_product
+
+    pending_count = len(products) - len(skip_indices & set(range(len(products))))
+    logger.info(f"Enriching {pending_count} of {len(products)} products with concurrency {concurrency}")
+    return list(await asyncio.gather(*(_enrich_with_limit(i, product) for i, product in enumerate(products))))
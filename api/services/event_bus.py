@@ -0,0 +1,44 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from loguru import logger
+
+# Per-subscriber buffer; slow subscribers lose their oldest events rather than block publishers
+_SUBSCRIBER_QUEUE_SIZE = 256
+
+_subscribers: defaultdict[str, set[asyncio.Queue]] = defaultdict(set)
+
+
+def publish(task_id: str, event_type: str, data: dict[str, Any]) -> None:
+    """Fans an event out to every subscriber of the task in this process."""
+    subscribers = _subscribers.get(task_id)
+    if not subscribers:
+        return
+
+    event = {"type": event_type, "task_id": task_id, "timestamp": time.time(), **data}
+    for queue in subscribers:
+        if queue.full():
+            queue.get_nowait()
+            logger.debug(f"Dropped an event for a slow subscriber of task {task_id}")
+        queue.put_nowait(event)
+
+
+@contextmanager
+def subscribe(task_id: str) -> Iterator[asyncio.Queue]:
+    """Registers a subscriber queue for the task's events for the duration of the block."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_SUBSCRIBER_QUEUE_SIZE)
+    _subscribers[task_id].add(queue)
+    try:
+        yield queue
+    finally:
+        _subscribers[task_id].discard(queue)
+        if not _subscribers[task_id]:
+            del _subscribers[task_id]
+
+
+def count_subscribers() -> int:
+    """Returns the number of open subscriptions across all tasks."""
+    return sum(len(queues) for queues in _subscribers.values())
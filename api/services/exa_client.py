@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any
+
+from exa_py import AsyncExa
+from loguru import logger
+
+from app.config import (
+    ENRICHMENT_FETCH_WAVE_SECONDS,
+    ENRICHMENT_FETCH_WAVE_SIZE,
+    EXA_API_KEY,
+    EXA_CACHE_ENABLED,
+    EXA_CACHE_TTL_SECONDS,
+    EXA_CONTENTS_CACHE_MAX_BYTES,
+    EXA_POLL_BACKOFF_FACTOR,
+    EXA_POLL_INITIAL_INTERVAL_SECONDS,
+    EXA_POLL_MAX_INTERVAL_SECONDS,
+    EXA_RESEARCH_TIMEOUT_SECONDS,
+    EXA_SEARCH_CACHE_MAX_BYTES,
+)
+from app.services.cache import cache_get, cache_set
+from app.services.rate_limiter import get_rate_limiter
+
+_SEARCH_CACHE_NAMESPACE = "exa_search"
+_CONTENTS_CACHE_NAMESPACE = "exa_contents"
+
+_RESEARCH_TERMINAL_STATUSES = {"completed", "failed", "complete", "finished", "done"}
+
+_exa_client: AsyncExa | None = None
+
+# Page fetches waiting to be sent together in the next wave: (urls, future for their texts)
+_wave_requests: list[tuple[list[str], asyncio.Future]] = []
+_wave_timer: asyncio.TimerHandle | None = None
+_wave_tasks: set[asyncio.Task] = set()
+
+
+def get_exa_client() -> AsyncExa:
+    """
+    Returns the shared async Exa client. It keeps the HTTP client exa-py
+    creates on first use, so connections are pooled across requests.
+    """
+    global _exa_client
+    if not EXA_API_KEY:
+        raise ValueError("EXA_API_KEY environment variable not set")
+    if _exa_client is None:
+        _exa_client = AsyncExa(api_key=EXA_API_KEY)
+    return _exa_client
+
+
+async def close_exa_client() -> None:
+    """Closes the shared Exa client's connections. Called on application shutdown."""
+    global _exa_client
+    # exa-py creates its HTTP client lazily in the `client` property; read the
+    # attribute so a client that never made a request isn't created just to close it
+    http_client = _exa_client._client if _exa_client is not None else None
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+    _exa_client = None
+
+
+def _hash_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+async def search_urls(query: str, num_results: int = 1, search_type: str = "keyword") -> list[str]:
+    """
+    Runs an Exa search and returns the URLs of the results, best match first.
+    Responses are cached by query and options for EXA_CACHE_TTL_SECONDS.
+    """
+    cache_key = _hash_key(query, num_results, search_type)
+    if EXA_CACHE_ENABLED:
+        cached_urls = await cache_get(_SEARCH_CACHE_NAMESPACE, cache_key)
+        if cached_urls is not None:
+            return json.loads(cached_urls)
+
+    exa = get_exa_client()
+    async with get_rate_limiter("exa").acquire():
+        response = await exa.search(query, num_results=num_results, type=search_type)
+    urls = [result.url for result in response.results if result.url]
+
+    if EXA_CACHE_ENABLED and urls:
+        await cache_set(
+            _SEARCH_CACHE_NAMESPACE,
+            cache_key,
+            json.dumps(urls).encode("utf-8"),
+            ttl_seconds=EXA_CACHE_TTL_SECONDS,
+            max_bytes=EXA_SEARCH_CACHE_MAX_BYTES,
+        )
+    return urls
+
+
+def _match_requested_urls(results: list[Any], requested_urls: list[str]) -> list[tuple[str, Any]]:
+    """
+    Pairs each get_contents result with the URL it was requested under. Exa
+    may return a canonical or redirected `url`, so the result's `id` (the
+    requested URL) is tried first, then its `url`, then its position when
+    every URL came back.
+    """
+    requested = set(requested_urls)
+    matched = []
+    for position, result in enumerate(results):
+        for candidate in (getattr(result, "id", None), result.url):
+            if candidate in requested:
+                matched.append((candidate, result))
+                break
+        else:
+            if len(results) == len(requested_urls):
+                matched.append((requested_urls[position], result))
+            else:
+                logger.warning(f"Could not match fetched page {result.url} to a requested URL; dropping it")
+    return matched
+
+
+async def fetch_page_texts(urls: list[str]) -> dict[str, str]:
+    """
+    Fetches page text for the given URLs, keyed by the URLs as requested.
+    URLs without text are omitted. Page bodies are cached compressed per
+    requested URL; only cache misses hit Exa.
+    """
+    if not urls:
+        return {}
+
+    page_texts = {}
+    missing_urls = []
+    for url in dict.fromkeys(urls):
+        cached_text = await cache_get(_CONTENTS_CACHE_NAMESPACE, _hash_key(url)) if EXA_CACHE_ENABLED else None
+        if cached_text is None:
+            missing_urls.append(url)
+        else:
+            page_texts[url] = cached_text.decode("utf-8")
+
+    if not missing_urls:
+        return page_texts
+
+    exa = get_exa_client()
+    async with get_rate_limiter("exa").acquire():
+        response = await exa.get_contents(missing_urls)
+    for url, result in _match_requested_urls(response.results, missing_urls):
+        if not result.text:
+            continue
+        page_texts[url] = result.text
+        if EXA_CACHE_ENABLED:
+            await cache_set(
+                _CONTENTS_CACHE_NAMESPACE,
+                _hash_key(url),
+                result.text.encode("utf-8"),
+                ttl_seconds=EXA_CACHE_TTL_SECONDS,
+                max_bytes=EXA_CONTENTS_CACHE_MAX_BYTES,
+                compress=True,
+            )
+    return page_texts
+
+
+async def fetch_page_texts_in_wave(urls: list[str]) -> dict[str, str]:
+    """
+    Fetches page text like `fetch_page_texts`, but joins the other fetches
+    requested within ENRICHMENT_FETCH_WAVE_SECONDS (up to
+    ENRICHMENT_FETCH_WAVE_SIZE callers) so the whole wave costs one Exa
+    get_contents call. Returns only the caller's URLs.
+    """
+    global _wave_timer
+    if not urls:
+        return {}
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _wave_requests.append((urls, future))
+    if len(_wave_requests) >= ENRICHMENT_FETCH_WAVE_SIZE:
+        _flush_wave()
+    elif _wave_timer is None:
+        _wave_timer = loop.call_later(ENRICHMENT_FETCH_WAVE_SECONDS, _flush_wave)
+    return await future
+
+
+def _flush_wave() -> None:
+    global _wave_timer
+    if _wave_timer is not None:
+        _wave_timer.cancel()
+        _wave_timer = None
+    wave = _wave_requests.copy()
+    _wave_requests.clear()
+    if wave:
+        task = asyncio.create_task(_fetch_wave(wave))
+        _wave_tasks.add(task)
+        task.add_done_callback(_wave_tasks.discard)
+
+
+async def _fetch_wave(wave: list[tuple[list[str], asyncio.Future]]) -> None:
+    wave = [(urls, future) for urls, future in wave if not future.done()]  # Skip cancelled callers
+    if not wave:
+        return
+    urls = list(dict.fromkeys(url for request_urls, _ in wave for url in request_urls))
+    try:
+        page_texts = await fetch_page_texts(urls)
+    except Exception as e:
+        for _, future in wave:
+            if not future.done():
+                future.set_exception(e)
+        return
+    logger.debug(f"Fetched {len(page_texts)} of {len(urls)} pages for {len(wave)} callers in one wave")
+    for request_urls, future in wave:
+        if not future.done():
+            future.set_result({url: page_texts[url] for url in request_urls if url in page_texts})
+
+
+async def poll_research_task(
+    task_id: str,
+    initial_interval: float = EXA_POLL_INITIAL_INTERVAL_SECONDS,
+    max_interval: float = EXA_POLL_MAX_INTERVAL_SECONDS,
+    backoff_factor: float = EXA_POLL_BACKOFF_FACTOR,
+    timeout_seconds: float = EXA_RESEARCH_TIMEOUT_SECONDS,
+) -> Any:
+    """
+    Polls an Exa research task without blocking the event loop. The delay
+    between polls grows by `backoff_factor` up to `max_interval`.
+
+    Raises:
+        TimeoutError: If the task does not finish within `timeout_seconds`.
+    """
+    exa = get_exa_client()
+    deadline = time.monotonic() + timeout_seconds
+    interval = initial_interval
+
+    while True:
+        async with get_rate_limiter("exa").acquire():
+            task = await exa.research.get_task(task_id)
+        status = task.status.lower() if isinstance(task.status, str) else ""
+        if status in _RESEARCH_TERMINAL_STATUSES:
+            logger.info(f"Exa research task {task_id} finished with status '{status}'")
+            return task
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Exa research task {task_id} did not finish within {timeout_seconds} seconds")
+
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(interval * backoff_factor, max_interval)
+
+
+async def run_research_task(instructions: str, output_schema: dict[str, Any]) -> dict[str, Any] | None:
+    """Creates an Exa research task and waits for its structured result."""
+    exa = get_exa_client()
+    async with get_rate_limiter("exa").acquire():
+        task = await exa.research.create_task(
+            instructions=instructions, output_schema=output_schema, model="exa-research"
+        )
+    logger.info(f"Created Exa research task with ID: {task.id}")
+    result = await poll_research_task(task.id)
+    logger.debug(f"Received final result from Exa research poll: {result.data}")
+    return result.data
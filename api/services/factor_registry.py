@@ -0,0 +1,71 @@
+import re
+import time
+from functools import lru_cache
+
+from loguru import logger
+
+from app.config import FACTOR_DEFINITION_TTL_SECONDS
+from app.models.factors import FactorDefinition
+from app.services.storage import get_connection
+
+_DATABASE_NAME = "factor_definitions"
+
+
+@lru_cache(maxsize=None)
+def _get_db():
+    """Returns the registry connection, creating the table on first use."""
+    connection = get_connection(_DATABASE_NAME)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS factor_definitions (
+            factor_key TEXT PRIMARY KEY,
+            factor_name TEXT NOT NULL,
+            definition_json TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    return connection
+
+
+def normalize_factor_name(factor_name: str) -> str:
+    """Normalizes a factor name so trivially different spellings share a definition."""
+    return re.sub(r"\s+", " ", factor_name).strip().lower()
+
+
+def get_cached_definition(factor_name: str) -> FactorDefinition | None:
+    """Returns the stored definition for a factor, or None if missing or expired."""
+    row = _get_db().execute(
+        "SELECT definition_json, updated_at FROM factor_definitions WHERE factor_key = ?",
+        (normalize_factor_name(factor_name),),
+    ).fetchone()
+    if row is None:
+        return None
+    if time.time() - row["updated_at"] > FACTOR_DEFINITION_TTL_SECONDS:
+        return None
+    return FactorDefinition.model_validate_json(row["definition_json"])
+
+
+def store_definition(factor_name: str, definition: FactorDefinition) -> None:
+    """Stores (or refreshes) the definition for a factor."""
+    _get_db().execute(
+        """
+        INSERT INTO factor_definitions (factor_key, factor_name, definition_json, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(factor_key) DO UPDATE SET
+            factor_name = excluded.factor_name,
+            definition_json = excluded.definition_json,
+            updated_at = excluded.updated_at
+        """,
+        (normalize_factor_name(factor_name), factor_name, definition.model_dump_json(), time.time()),
+    )
+    logger.debug(f"Stored factor definition for '{factor_name}'")
+
+
+def purge_expired_definitions() -> int:
+    """Deletes expired definitions and returns how many were removed."""
+    cursor = _get_db().execute(
+        "DELETE FROM factor_definitions WHERE updated_at < ?",
+        (time.time() - FACTOR_DEFINITION_TTL_SECONDS,),
+    )
+    return cursor.rowcount
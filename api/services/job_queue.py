@@ -0,0 +1,181 @@
+import time
+from functools import lru_cache
+from uuid import uuid4
+
+from loguru import logger
+
+from app.config import JOB_MAX_ATTEMPTS, JOB_VISIBILITY_TIMEOUT_SECONDS
+from app.models.tasks import ProcurementState, QueuedJob
+from app.services.storage import get_connection
+from app.services.task_store import get_task_store
+
+_DATABASE_NAME = "jobs"
+
+
+@lru_cache(maxsize=None)
+def _get_db():
+    """Returns the queue connection, creating the table on first use."""
+    connection = get_connection(_DATABASE_NAME)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            visible_at REAL NOT NULL,
+            worker_id TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            client_id TEXT
+        )
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, visible_at, created_at)")
+    return connection
+
+
+def enqueue_job(task_id: str, client_id: str | None = None) -> str:
+    """Adds an analysis job for the task and returns the job ID."""
+    job_id = str(uuid4())
+    now = time.time()
+    _get_db().execute(
+        """
+        INSERT INTO jobs (job_id, task_id, status, attempts, visible_at, created_at, updated_at, client_id)
+        VALUES (?, ?, 'queued', 0, ?, ?, ?, ?)
+        """,
+        (job_id, task_id, now, now, now, client_id),
+    )
+    logger.info(f"Enqueued job {job_id} for task {task_id}")
+    return job_id
+
+
+def _fail_task(task_id: str) -> None:
+    """Moves the task of a job that ran out of attempts to ERROR, unless it already finished."""
+    store = get_task_store()
+    task = store.get(task_id)
+    if task is None or task.current_state in (ProcurementState.COMPLETED, ProcurementState.CANCELLED):
+        return
+    task.current_state = ProcurementState.ERROR
+    task.error_message = f"The analysis was interrupted {JOB_MAX_ATTEMPTS} times and will not be retried."
+    task.state_entered_at = time.time()
+    store.save(task)
+
+
+def claim_job(worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT_SECONDS) -> QueuedJob | None:
+    """
+    Atomically claims the oldest visible job of the client with the fewest
+    running jobs, so one client's burst can't starve the others. A running job
+    whose lease has expired (its worker crashed or stalled) becomes visible
+    again and is requeued, until it has been attempted JOB_MAX_ATTEMPTS times;
+    then the job fails and its task moves to ERROR.
+    """
+    db = _get_db()
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        exhausted_rows = db.execute(
+            "SELECT job_id, task_id FROM jobs WHERE status = 'running' AND visible_at <= ? AND attempts >= ?",
+            (now, JOB_MAX_ATTEMPTS),
+        ).fetchall()
+        for exhausted in exhausted_rows:
+            logger.error(f"Job {exhausted['job_id']} for task {exhausted['task_id']} exceeded {JOB_MAX_ATTEMPTS} attempts")
+            db.execute(
+                "UPDATE jobs SET status = 'failed', updated_at = ? WHERE job_id = ?",
+                (now, exhausted["job_id"]),
+            )
+        row = db.execute(
+            """
+            SELECT job_id, task_id, attempts FROM jobs AS candidate
+            WHERE status IN ('queued', 'running') AND visible_at <= ?
+            ORDER BY (
+                SELECT COUNT(*) FROM jobs AS running
+                WHERE running.client_id IS candidate.client_id
+                    AND running.status = 'running' AND running.visible_at > ?
+            ), created_at
+            LIMIT 1
+            """,
+            (now, now),
+        ).fetchone()
+        if row is not None:
+            lease_expires_at = now + visibility_timeout
+            db.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, visible_at = ?, worker_id = ?, updated_at = ?
+                WHERE job_id = ?
+                """,
+                (lease_expires_at, worker_id, now, row["job_id"]),
+            )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+    for exhausted in exhausted_rows:
+        _fail_task(exhausted["task_id"])
+    if row is None:
+        return None
+    if row["attempts"] > 0:
+        logger.warning(f"Requeued job {row['job_id']} for task {row['task_id']} (attempt {row['attempts'] + 1})")
+    return QueuedJob(
+        job_id=row["job_id"],
+        task_id=row["task_id"],
+        attempts=row["attempts"] + 1,
+        lease_expires_at=lease_expires_at,
+    )
+
+
+def extend_lease(job_id: str, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT_SECONDS) -> bool:
+    """Keeps a running job invisible to other workers. Returns False if the lease was lost."""
+    now = time.time()
+    cursor = _get_db().execute(
+        """
+        UPDATE jobs SET visible_at = ?, updated_at = ?
+        WHERE job_id = ? AND worker_id = ? AND status = 'running'
+        """,
+        (now + visibility_timeout, now, job_id, worker_id),
+    )
+    return cursor.rowcount == 1
+
+
+def complete_job(job_id: str, worker_id: str) -> None:
+    """Marks a job as finished."""
+    _get_db().execute(
+        "UPDATE jobs SET status = 'done', updated_at = ? WHERE job_id = ? AND worker_id = ?",
+        (time.time(), job_id, worker_id),
+    )
+
+
+def release_job(job_id: str, worker_id: str) -> None:
+    """Returns a job to the queue immediately, e.g. when its worker shuts down mid-run."""
+    now = time.time()
+    _get_db().execute(
+        """
+        UPDATE jobs SET status = 'queued', visible_at = ?, worker_id = NULL, updated_at = ?
+        WHERE job_id = ? AND worker_id = ? AND status = 'running'
+        """,
+        (now, now, job_id, worker_id),
+    )
+
+
+def count_queued_jobs() -> int:
+    """Returns the number of jobs waiting for a worker."""
+    return _get_db().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+
+def get_queue_position(task_id: str) -> int | None:
+    """
+    The 1-based position of the task's queued job by submission time, or None
+    if it has no queued job. Fair scheduling may start it a little earlier or later.
+    """
+    db = _get_db()
+    row = db.execute(
+        "SELECT created_at FROM jobs WHERE task_id = ? AND status = 'queued' ORDER BY created_at LIMIT 1",
+        (task_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    ahead = db.execute(
+        "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (row["created_at"],)
+    ).fetchone()[0]
+    return ahead + 1
@@ -0,0 +1,147 @@
+import hashlib
+import json
+from functools import lru_cache
+from typing import Any
+
+import httpx
+from pydantic import TypeAdapter
+from pydantic_ai import Agent
+from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+from app.config import (
+    GEMINI_MODEL,
+    LLM_AGENT_CACHE_SIZE,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_REQUEST_TIMEOUT_SECONDS,
+)
+from app.services.cache import cache_get, cache_set
+from app.services.rate_limiter import Priority, estimate_tokens, get_rate_limiter
+from app.services.resilience import call_with_resilience
+
+_CACHE_NAMESPACE = "llm"
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide, connection-pooled HTTP client shared by all LLM providers."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+        )
+        # Models and agents hold a reference to the old client; rebuild them too.
+        get_model.cache_clear()
+        get_agent.cache_clear()
+    return _http_client
+
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str, api_key: str) -> GeminiModel:
+    """Builds (once) the Gemini model for a model name and API key."""
+    provider = GoogleGLAProvider(api_key=api_key, http_client=get_http_client())
+    return GeminiModel(model_name=model_name, provider=provider)
+
+
+@lru_cache(maxsize=LLM_AGENT_CACHE_SIZE)
+def get_agent(
+    system_prompt: str, output_type: type, api_key: str, model_name: str = GEMINI_MODEL
+) -> Agent:
+    """Builds (once) an agent for a (model, system prompt, output type) combination."""
+    return Agent(
+        model=get_model(model_name, api_key),
+        system_prompt=system_prompt,
+        output_type=output_type,
+    )
+
+
+@lru_cache(maxsize=None)
+def _output_adapter(output_type: type) -> TypeAdapter:
+    return TypeAdapter(output_type)
+
+
+@lru_cache(maxsize=None)
+def _output_schema_json(output_type: type) -> str:
+    return json.dumps(_output_adapter(output_type).json_schema(), sort_keys=True)
+
+
+def _response_cache_key(model_name: str, system_prompt: str, output_type: type, user_prompt: str) -> str:
+    """Content-addressed key; the output schema is included so model changes invalidate entries."""
+    output_type_name = f"{output_type.__module__}.{output_type.__qualname__}"
+    key_material = json.dumps(
+        [model_name, system_prompt, output_type_name, _output_schema_json(output_type), user_prompt]
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+async def run_agent(
+    user_prompt: str,
+    *,
+    system_prompt: str,
+    output_type: type,
+    api_key: str,
+    model_name: str = GEMINI_MODEL,
+    priority: Priority = Priority.BULK,
+) -> Any:
+    """
+    Runs a prompt through the shared agent for this configuration and returns
+    its output. Identical requests are answered from the response cache; the
+    rest wait for the Gemini rate limiter in the given priority lane, and are
+    timed out, retried and hedged by the resilience layer.
+    """
+    cache_key = None
+    if LLM_CACHE_ENABLED:
+        cache_key = _response_cache_key(model_name, system_prompt, output_type, user_prompt)
+        cached_output = await cache_get(_CACHE_NAMESPACE, cache_key)
+        if cached_output is not None:
+            try:
+                return _output_adapter(output_type).validate_json(cached_output)
+            except ValueError:
+                pass  # Stale or corrupt entry; fall through and refresh it
+
+    get_http_client()  # Rebuilds cached agents if the pooled client was closed
+    agent = get_agent(system_prompt, output_type, api_key, model_name)
+    limiter = get_rate_limiter("gemini")
+    estimated_tokens = estimate_tokens(system_prompt, user_prompt)
+
+    async def _call():
+        result = await agent.run(user_prompt)
+        used_tokens = result.usage().total_tokens
+        if used_tokens:
+            limiter.adjust_tokens(used_tokens - estimated_tokens)
+        return result
+
+    result = await call_with_resilience(
+        f"gemini:{output_type.__qualname__}",
+        _call,
+        admit=lambda: limiter.acquire(priority, tokens=estimated_tokens),
+        should_hedge=limiter.has_spare_capacity,  # Never hedge while calls are queueing
+    )
+
+    if cache_key:
+        await cache_set(
+            _CACHE_NAMESPACE,
+            cache_key,
+            _output_adapter(output_type).dump_json(result.output),
+            ttl_seconds=LLM_CACHE_TTL_SECONDS,
+            max_bytes=LLM_CACHE_MAX_BYTES,
+        )
+    return result.output
+
+
+async def close_llm_client() -> None:
+    """Closes the pooled HTTP client. Called on application shutdown."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    get_model.cache_clear()
+    get_agent.cache_clear()
@@ -0,0 +1,109 @@
+import re
+from collections import Counter, defaultdict
+
+from app.config import PROCESSING_FAST_PATH_ENABLED
+from app.models.factors import FactorDefinition
+
+# Values that mean the data is missing; they are kept as they are
+_SENTINEL_VALUES = {"", "-", "n/a", "na", "none", "not found", "not available", "not specified", "unknown"}
+
+# Answers that mean yes or no, matched against yes/no-like categories
+_AFFIRMATIVE = {"yes", "y", "true", "supported", "available", "included", "offered"}
+_NEGATIVE = {"no", "n", "false", "not supported", "unavailable", "not included", "not offered"}
+
+# A value with a category as a whole word is classified by it only if this short
+_CATEGORY_MENTION_MAX_WORDS = 4
+# Words that can flip or qualify a mentioned category ("Not open source", "Open source: no");
+# values containing them are left to the LLM
+_NEGATORS = {
+    "not", "no", "non", "without", "unavailable", "partially", "partial", "never", "lacks",
+    "isn", "doesn", "don", "except",
+}
+# Text this short already reads as a one-sentence summary or a keyword list
+_SHORT_PROSE_MAX_WORDS = 20
+_KEYWORD_MAX_TAGS = 3
+_KEYWORD_MAX_WORDS_PER_TAG = 3
+
+# Per factor name: cells resolved locally ("local") and sent to the LLM ("llm")
+_counters: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _classify(categories: list[str], value: str) -> str | None:
+    normalized_value = _normalize(value)
+    normalized_categories = {_normalize(category): category for category in categories}
+
+    if normalized_value in normalized_categories:
+        return normalized_categories[normalized_value]
+
+    for answers in (_AFFIRMATIVE, _NEGATIVE):
+        if normalized_value in answers:
+            matches = [category for name, category in normalized_categories.items() if name in answers]
+            if len(matches) == 1:
+                return matches[0]
+
+    words = normalized_value.split()
+    if len(words) <= _CATEGORY_MENTION_MAX_WORDS and not _NEGATORS.intersection(words):
+        mentioned = [
+            category for name, category in normalized_categories.items()
+            if name and re.search(rf"\b{re.escape(name)}\b", normalized_value)
+        ]
+        if len(mentioned) == 1:
+            return mentioned[0]
+    return None
+
+
+def _as_keywords(value: str) -> str | None:
+    tags = [tag.strip() for tag in re.split(r"[,;/|]", value) if tag.strip()]
+    if 0 < len(tags) <= _KEYWORD_MAX_TAGS and all(len(tag.split()) <= _KEYWORD_MAX_WORDS_PER_TAG for tag in tags):
+        return ", ".join(tags)
+    return None
+
+
+def _as_prose(value: str) -> str | None:
+    text = " ".join(value.split())
+    sentence_breaks = len(re.findall(r"[.!?](\s|$)", text.rstrip(".!?")))
+    if len(text.split()) <= _SHORT_PROSE_MAX_WORDS and sentence_breaks == 0:
+        return text
+    return None
+
+
+def resolve_locally(factor_definition: FactorDefinition, value: str) -> str | None:
+    """
+    Handles a value that needs no LLM. These are missing-data sentinels,
+    exact or normalized category matches, yes/no synonyms, short values that
+    name exactly one category without negating it, and text already shorter
+    than its target summary. Returns the processed value, or None if the LLM
+    is needed.
+    """
+    if not PROCESSING_FAST_PATH_ENABLED:
+        return None
+    if _normalize(value) in _SENTINEL_VALUES or value.strip().lower() in _SENTINEL_VALUES:
+        return value
+    if factor_definition.processing_type == "categorize":
+        return _classify(factor_definition.categories or [], value)
+    if factor_definition.processing_type == "summarize_keywords":
+        return _as_keywords(value)
+    if factor_definition.processing_type == "summarize_prose":
+        return _as_prose(value)
+    return None
+
+
+def record_resolution(factor_name: str | None, resolved_locally: bool) -> None:
+    _counters[factor_name or "unknown"]["local" if resolved_locally else "llm"] += 1
+
+
+def get_fast_path_stats() -> dict[str, dict[str, float | int]]:
+    """Returns, per factor, how many processed values skipped the LLM in this process."""
+    stats = {}
+    for factor_name, counts in sorted(_counters.items()):
+        total = counts["local"] + counts["llm"]
+        stats[factor_name] = {
+            "local": counts["local"],
+            "llm": counts["llm"],
+            "hit_rate": round(counts["local"] / total, 3) if total else 0.0,
+        }
+    return stats
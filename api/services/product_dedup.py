@@ -0,0 +1,190 @@
+import re
+from collections import Counter, defaultdict
+from typing import Any
+
+from loguru import logger
+
+from app.config import PROCESSING_MODE, PRODUCT_DEDUP_ENABLED, PRODUCT_DEDUP_SIMILARITY
+
+# Words that name a product's edition or category rather than the product itself
+_GENERIC_WORDS = {
+    "app", "apps", "business", "cloud", "co", "com", "corp", "crm", "edition", "enterprise", "erp",
+    "gmbh", "hub", "inc", "io", "llc", "ltd", "online", "platform", "plus", "pro", "sales",
+    "software", "solution", "solutions", "suite", "system", "systems", "the", "tool", "tools",
+}
+# A word in at least this share of the discovered names is the category, e.g. "crm" in a CRM list
+_CATEGORY_WORD_SHARE = 0.25
+_CATEGORY_WORD_MIN_NAMES = 3
+
+_MISSING_VALUES = (None, "", "Not found")
+
+# Targeting, search, page fetch and enrichment for every product that is enriched
+_ENRICHMENT_CALLS_PER_PRODUCT = 4
+
+_counters: Counter[str] = Counter()
+
+
+def _tokenize_name(name: Any) -> list[str]:
+    return re.sub(r"[^a-z0-9]+", " ", str(name or "").lower()).split()
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(left: set[str], right: set[str]) -> float:
+    return len(left & right) / len(left | right) if left or right else 1.0
+
+
+class _DisjointSet:
+    def __init__(self, size: int):
+        self._parents = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self._parents[item] != item:
+            self._parents[item] = self._parents[self._parents[item]]
+            item = self._parents[item]
+        return item
+
+    def union(self, left: int, right: int) -> None:
+        left_root, right_root = self.find(left), self.find(right)
+        if left_root != right_root:
+            # The earlier product stays the representative
+            self._parents[max(left_root, right_root)] = min(left_root, right_root)
+
+
+def _core_names(products: list[dict[str, Any]]) -> list[str]:
+    """
+    Reduces each product name to its distinctive words: edition, category
+    and company-suffix words are dropped, so "HubSpot CRM" and "HubSpot Sales
+    Hub" both become "hubspot".
+    """
+    token_lists = [_tokenize_name(product.get("product_name")) for product in products]
+    name_counts = Counter(token for tokens in token_lists for token in set(tokens))
+    category_threshold = max(_CATEGORY_WORD_MIN_NAMES, _CATEGORY_WORD_SHARE * len(products))
+    category_words = {token for token, count in name_counts.items() if count >= category_threshold}
+
+    core_names = []
+    for tokens in token_lists:
+        core = [token for token in tokens if token not in _GENERIC_WORDS and token not in category_words]
+        core_names.append(" ".join(core or tokens))
+    return core_names
+
+
+def find_duplicate_groups(
+    products: list[dict[str, Any]], similarity: float = PRODUCT_DEDUP_SIMILARITY
+) -> list[list[int]]:
+    """
+    Clusters products whose distinctive names match exactly or by character
+    trigram similarity. Only products sharing a rare trigram are compared, so
+    the cost grows with the number of products rather than with its square.
+    Returns index groups in discovery order, each led by its earliest product.
+    """
+    core_names = _core_names(products)
+    trigram_sets = [_trigrams(name) if name else set() for name in core_names]
+    groups = _DisjointSet(len(products))
+
+    exact_matches: dict[str, int] = {}
+    blocks: dict[str, list[int]] = defaultdict(list)
+    for index, name in enumerate(core_names):
+        if not name:
+            continue
+        if name in exact_matches:
+            groups.union(exact_matches[name], index)
+            continue
+        exact_matches[name] = index
+        for trigram in trigram_sets[index]:
+            blocks[trigram].append(index)
+
+    # Trigrams shared by many names ("ion", " co") can't tell products apart; skip them as blocking keys
+    max_block_size = max(8, int(len(products) ** 0.5) * 2)
+    compared: set[tuple[int, int]] = set()
+    for members in blocks.values():
+        if len(members) > max_block_size:
+            continue
+        for position, left in enumerate(members):
+            for right in members[position + 1:]:
+                if (left, right) in compared:
+                    continue
+                compared.add((left, right))
+                if _similarity(trigram_sets[left], trigram_sets[right]) >= similarity:
+                    groups.union(left, right)
+
+    clusters: dict[int, list[int]] = defaultdict(list)
+    for index in range(len(products)):
+        clusters[groups.find(index)].append(index)
+    return list(clusters.values())
+
+
+def _merge_group(group: list[dict[str, Any]]) -> dict[str, Any]:
+    """Keeps the first product's name and takes each factor's value from the first product that found one."""
+    merged = dict(group[0])
+    merged_factors = [dict(factor) for factor in group[0].get("extracted_factors", [])]
+    for factor in merged_factors:
+        if factor.get("value") not in _MISSING_VALUES:
+            continue
+        for duplicate in group[1:]:
+            value = next(
+                (
+                    other.get("value")
+                    for other in duplicate.get("extracted_factors", [])
+                    if other.get("name") == factor.get("name")
+                ),
+                None,
+            )
+            if value not in _MISSING_VALUES:
+                factor["value"] = value
+                break
+    merged["extracted_factors"] = merged_factors
+    return merged
+
+
+def _estimate_calls_per_product(product: dict[str, Any]) -> int:
+    """Downstream LLM and Exa calls one product costs in processing and enrichment."""
+    processing_calls = 0
+    if PROCESSING_MODE == "cell":
+        processing_calls = sum(
+            1 for factor in product.get("extracted_factors", [])
+            if factor.get("definition", {}).get("processing_type", "none") != "none"
+        )
+    elif PROCESSING_MODE == "product":
+        processing_calls = 1
+    return processing_calls + _ENRICHMENT_CALLS_PER_PRODUCT
+
+
+def merge_duplicate_products(products: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Collapses near-duplicate discovered products, e.g. the same product with
+    different casing or edition names, before any processing or enrichment
+    is spent on them. Merged products keep the values any duplicate found.
+    """
+    if not PRODUCT_DEDUP_ENABLED or len(products) < 2:
+        return products
+
+    groups = find_duplicate_groups(products)
+    merged_products = []
+    calls_saved = 0
+    for group in groups:
+        group_products = [products[index] for index in group]
+        merged_products.append(_merge_group(group_products) if len(group) > 1 else group_products[0])
+        calls_saved += sum(_estimate_calls_per_product(product) for product in group_products[1:])
+        if len(group) > 1:
+            logger.debug(f"Merged duplicate products: {[product.get('product_name') for product in group_products]}")
+
+    removed = len(products) - len(merged_products)
+    _counters["runs"] += 1
+    _counters["products"] += len(products)
+    _counters["duplicates_removed"] += removed
+    _counters["calls_saved"] += calls_saved
+    if removed:
+        logger.info(
+            f"Merged {removed} duplicate products ({len(products)} -> {len(merged_products)}), "
+            f"saving ~{calls_saved} processing and enrichment calls"
+        )
+    return merged_products
+
+
+def get_product_dedup_stats() -> dict[str, int]:
+    """Returns product deduplication counters for this process; calls saved is an estimate."""
+    return {name: _counters[name] for name in ("runs", "products", "duplicates_removed", "calls_saved")}
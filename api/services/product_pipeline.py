@@ -0,0 +1,140 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from app.agents.processing_agent import process_data
+from app.agents.targeting_agent import generate_enrichment_queries
+from app.config import ENRICHMENT_CONCURRENCY, PIPELINE_QUEUE_SIZE, PROCESSING_CONCURRENCY
+from app.services.enrichment_engine import enrich_from_pages, fetch_enrichment_pages
+
+# Tells a stage's workers that no more items will arrive
+_DONE = object()
+
+# An item moving through the pipeline: (product index, product, payload from the previous step)
+_Item = tuple[int, dict[str, Any], Any]
+
+
+async def _run_stage(
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue | None,
+    workers: int,
+    handle: Callable[[int, dict[str, Any], Any], Awaitable[_Item | None]],
+) -> None:
+    """
+    Runs `workers` consumers of `inbox`. Each item returned by `handle` is
+    passed on to `outbox`; None means the product left the pipeline early.
+    Handlers fall back on the unchanged product when their own step fails, so
+    anything `handle` still raises came from a callback: it is logged and the
+    product leaves the pipeline rather than having its callback run again.
+    """
+    async def _worker() -> None:
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE)  # Let the stage's other workers see it too
+                return
+            try:
+                forwarded = await handle(*item)
+            except Exception as e:
+                logger.error(f"Pipeline step {handle.__name__} failed for {item[1].get('product_name')}: {e}")
+                continue
+            if forwarded is not None and outbox is not None:
+                await outbox.put(forwarded)
+
+    await asyncio.gather(*(_worker() for _ in range(workers)))
+    if outbox is not None:
+        await outbox.put(_DONE)
+
+
+async def run_product_pipeline(
+    products: list[dict[str, Any]],
+    api_key: str,
+    mode: str,
+    skip_processing: set[int],
+    skip_enrichment: set[int],
+    on_product_processed: Callable[[int, dict[str, Any]], None],
+    on_product_enriched: Callable[[int, dict[str, Any]], None],
+) -> None:
+    """
+    Moves each product through processing, targeting, fetch and enrichment as
+    soon as its previous step is done, so LLM and Exa latency overlap across
+    products. Steps are joined by bounded queues, and each step runs its own
+    pool of workers. Callbacks fire as each product finishes processing and
+    enrichment; a failed step leaves the product unchanged.
+
+    Args:
+        products: The discovered products; processed products replace them via the callbacks.
+        api_key: The Google API key for the LLM.
+        mode: The processing mode, "cell" or "product".
+        skip_processing: Indices of products that are already processed.
+        skip_enrichment: Indices of products that are already enriched.
+        on_product_processed: Called with (index, product) when a product finishes processing.
+        on_product_enriched: Called with (index, product) when a product finishes enrichment.
+    """
+    processing_queue: asyncio.Queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    targeting_queue: asyncio.Queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    fetch_queue: asyncio.Queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    enrichment_queue: asyncio.Queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+
+    async def _feed() -> None:
+        for index, product in enumerate(products):
+            if index in skip_processing and index in skip_enrichment:
+                continue
+            await processing_queue.put((index, product, None))
+        await processing_queue.put(_DONE)
+
+    async def _process(index: int, product: dict[str, Any], _: Any) -> _Item | None:
+        if index not in skip_processing:
+            try:
+                product = (await process_data([product], api_key, mode=mode))[0]
+            except Exception as e:
+                logger.error(f"Processing failed for {product.get('product_name')}: {e}")
+            on_product_processed(index, product)
+        if index in skip_enrichment:
+            return None
+        return index, product, None
+
+    async def _target(index: int, product: dict[str, Any], _: Any) -> _Item | None:
+        queries = []
+        if product.get("product_name"):
+            try:
+                queries = await generate_enrichment_queries(product, api_key)
+            except Exception as e:
+                logger.error(f"Error during enrichment for {product.get('product_name')}: {e}")
+        if not queries:
+            on_product_enriched(index, product)
+            return None
+        return index, product, queries
+
+    async def _fetch(index: int, product: dict[str, Any], queries: list[str]) -> _Item | None:
+        try:
+            pages = await fetch_enrichment_pages(queries)
+        except Exception as e:
+            logger.error(f"Error during enrichment for {product.get('product_name')}: {e}")
+            pages = []
+        if not pages:
+            on_product_enriched(index, product)
+            return None
+        return index, product, (queries, pages)
+
+    async def _enrich(
+        index: int, product: dict[str, Any], payload: tuple[list[str], list[tuple[str, str]]]
+    ) -> None:
+        queries, pages = payload
+        try:
+            product = await enrich_from_pages(product, pages, queries, api_key)
+        except Exception as e:
+            logger.error(f"Error during enrichment for {product.get('product_name')}: {e}")
+        on_product_enriched(index, product)
+
+    logger.info(
+        f"Streaming {len(products)} products through the pipeline "
+        f"({len(products) - len(skip_processing)} to process, {len(products) - len(skip_enrichment)} to enrich)"
+    )
+    async with asyncio.TaskGroup() as group:
+        group.create_task(_feed())
+        group.create_task(_run_stage(processing_queue, targeting_queue, PROCESSING_CONCURRENCY, _process))
+        group.create_task(_run_stage(targeting_queue, fetch_queue, ENRICHMENT_CONCURRENCY, _target))
+        group.create_task(_run_stage(fetch_queue, enrichment_queue, ENRICHMENT_CONCURRENCY, _fetch))
+        group.create_task(_run_stage(enrichment_queue, None, ENRICHMENT_CONCURRENCY, _enrich))
@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from functools import lru_cache
+from typing import AsyncIterator
+
+from loguru import logger
+
+from app.config import (
+    EXA_MAX_CONCURRENCY,
+    EXA_REQUESTS_PER_SECOND,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_REQUESTS_PER_MINUTE,
+    GEMINI_TOKENS_PER_MINUTE,
+)
+
+
+class Priority(IntEnum):
+    """Scheduling lanes; lower values are admitted first."""
+
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class TokenBucket:
+    """Refills at `rate` units per second up to `capacity`. The level may go negative after corrections."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def seconds_until_available(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket, not forever
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Debits (positive) or credits (negative) units once the true cost of a call is known."""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+
+class RateLimiter:
+    """
+    Admits calls to one provider within a concurrency limit and optional
+    request and token rates. Waiting calls are admitted by priority, then in
+    arrival order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        requests_per_second: float = 0.0,
+        request_burst: float = 1.0,
+        tokens_per_second: float = 0.0,
+        token_burst: float = 0.0,
+    ):
+        self.name = name
+        self._max_concurrency = max_concurrency
+        self._request_bucket = (
+            TokenBucket(requests_per_second, max(1.0, request_burst)) if requests_per_second > 0 else None
+        )
+        self._token_bucket = (
+            TokenBucket(tokens_per_second, max(1.0, token_burst)) if tokens_per_second > 0 else None
+        )
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future, int]] = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._stats = {
+            priority: {"acquired": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+            for priority in Priority
+        }
+
+    @asynccontextmanager
+    async def acquire(self, priority: Priority = Priority.BULK, tokens: int = 0) -> AsyncIterator[None]:
+        """Waits for a slot for one call costing roughly `tokens`, and holds it for the block."""
+        started_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # Admitted just as the caller was cancelled
+            raise
+
+        self._record_wait(priority, time.monotonic() - started_at)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def adjust_tokens(self, tokens: int) -> None:
+        """Corrects the token bucket by the difference between actual and estimated usage."""
+        if self._token_bucket is not None and tokens:
+            self._token_bucket.adjust(tokens)
+
+    def has_spare_capacity(self) -> bool:
+        """Whether a new call would be admitted without queueing behind others."""
+        return self._active < self._max_concurrency and not any(
+            not future.done() for _, _, future, _ in self._waiters
+        )
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            _, _, future, tokens = self._waiters[0]
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self._active >= self._max_concurrency:
+                return
+
+            delay = 0.0
+            if self._request_bucket is not None:
+                delay = max(delay, self._request_bucket.seconds_until_available(1))
+            if self._token_bucket is not None and tokens:
+                delay = max(delay, self._token_bucket.seconds_until_available(tokens))
+            if delay > 0:
+                self._schedule_dispatch(delay)
+                return
+
+            heapq.heappop(self._waiters)
+            if self._request_bucket is not None:
+                self._request_bucket.consume(1)
+            if self._token_bucket is not None and tokens:
+                self._token_bucket.consume(tokens)
+            self._active += 1
+            future.set_result(None)
+
+    def _schedule_dispatch(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _record_wait(self, priority: Priority, wait_seconds: float) -> None:
+        stats = self._stats[priority]
+        stats["acquired"] += 1
+        stats["wait_seconds_total"] += wait_seconds
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], wait_seconds)
+        if wait_seconds > 5:
+            logger.debug(f"{priority.name} call to {self.name} waited {wait_seconds:.1f}s for the rate limiter")
+
+    def get_stats(self) -> dict:
+        queued = {priority: 0 for priority in Priority}
+        for priority, _, future, _ in self._waiters:
+            if not future.done():
+                queued[Priority(priority)] += 1
+        lanes = {}
+        for priority, stats in self._stats.items():
+            acquired = stats["acquired"]
+            lanes[priority.name.lower()] = {
+                "acquired": acquired,
+                "queued": queued[priority],
+                "wait_seconds_avg": round(stats["wait_seconds_total"] / acquired, 3) if acquired else 0.0,
+                "wait_seconds_max": round(stats["wait_seconds_max"], 3),
+            }
+        return {"active": self._active, "lanes": lanes}
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Returns the process-wide limiter for a provider ("gemini" or "exa")."""
+    if provider == "gemini":
+        return RateLimiter(
+            "gemini",
+            max_concurrency=GEMINI_MAX_CONCURRENCY,
+            requests_per_second=GEMINI_REQUESTS_PER_MINUTE / 60,
+            request_burst=GEMINI_REQUESTS_PER_MINUTE / 60,
+            tokens_per_second=GEMINI_TOKENS_PER_MINUTE / 60,
+            token_burst=GEMINI_TOKENS_PER_MINUTE / 60,
+        )
+    if provider == "exa":
+        return RateLimiter(
+            "exa",
+            max_concurrency=EXA_MAX_CONCURRENCY,
+            requests_per_second=EXA_REQUESTS_PER_SECOND,
+            request_burst=EXA_REQUESTS_PER_SECOND,
+        )
+    raise ValueError(f"Unknown rate-limited provider: {provider}")
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count for budgeting: about four characters per token."""
+    return sum(len(text) for text in texts) // 4 + 1
+
+
+def get_rate_limiter_stats() -> dict[str, dict]:
+    """Returns admission and queue-wait metrics for every provider limiter in this process."""
+    return {provider: get_rate_limiter(provider).get_stats() for provider in ("gemini", "exa")}
@@ -0,0 +1,178 @@
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable
+
+import httpx
+from loguru import logger
+from pydantic_ai.exceptions import ModelHTTPError
+
+from app.config import (
+    LLM_CALL_TIMEOUT_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_PERCENTILE,
+    LLM_MAX_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY_SECONDS,
+    LLM_RETRY_MAX_DELAY_SECONDS,
+)
+
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Recent successful latencies per operation, for the hedging threshold
+_LATENCY_WINDOW = 200
+
+_latencies: defaultdict[str, deque[float]] = defaultdict(lambda: deque(maxlen=_LATENCY_WINDOW))
+_counters: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient: a timeout, a connection failure, or a throttling/server status."""
+    if isinstance(error, (TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, ModelHTTPError):
+        return error.status_code in _RETRYABLE_STATUS_CODES
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in _RETRYABLE_STATUS_CODES
+    return False
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (zero-based) attempt."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * 2**attempt))
+
+
+def _hedge_delay(operation: str) -> float | None:
+    """The latency percentile for the operation, or None until enough samples exist."""
+    samples = _latencies[operation]
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE / 100))
+    return max(LLM_HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+
+async def _timed_call(
+    operation: str,
+    call: Callable[[], Awaitable[Any]],
+    timeout: float,
+    admit: Callable[[], AsyncContextManager] | None,
+    admitted: asyncio.Event,
+) -> Any:
+    """
+    Runs one attempt inside its admission slot. The timeout and the latency
+    sample start only once the slot is held, so queueing is never counted
+    as a slow or timed-out call.
+    """
+    async with admit() if admit else nullcontext():
+        admitted.set()
+        started_at = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                result = await call()
+        except TimeoutError:
+            _counters[operation]["timeouts"] += 1
+            raise
+    _latencies[operation].append(time.monotonic() - started_at)
+    return result
+
+
+async def _hedged_call(
+    operation: str,
+    call: Callable[[], Awaitable[Any]],
+    timeout: float,
+    admit: Callable[[], AsyncContextManager] | None,
+    should_hedge: Callable[[], bool],
+) -> Any:
+    """
+    Runs the call and, if it outlasts the operation's latency percentile
+    after being admitted, starts a duplicate. The first success wins and the
+    other is cancelled.
+    """
+    admitted = asyncio.Event()
+    primary = asyncio.create_task(_timed_call(operation, call, timeout, admit, admitted))
+    hedge_delay = _hedge_delay(operation) if LLM_HEDGE_ENABLED else None
+    if hedge_delay is None:
+        return await primary
+
+    admission = asyncio.create_task(admitted.wait())
+    try:
+        await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    finally:
+        admission.cancel()
+    if done or not should_hedge():
+        return await primary
+
+    _counters[operation]["hedges"] += 1
+    hedge = asyncio.create_task(_timed_call(operation, call, timeout, admit, asyncio.Event()))
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        _counters[operation]["hedges_won"] += 1
+                    return task.result()
+        # Both failed; surface the primary's error
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience(
+    operation: str,
+    call: Callable[[], Awaitable[Any]],
+    *,
+    timeout: float = LLM_CALL_TIMEOUT_SECONDS,
+    max_attempts: int = LLM_MAX_ATTEMPTS,
+    admit: Callable[[], AsyncContextManager] | None = None,
+    should_hedge: Callable[[], bool] = lambda: True,
+) -> Any:
+    """
+    Runs `call` with a per-attempt timeout, optional hedging and bounded
+    retries with jittered backoff for retryable errors. Non-retryable errors
+    and the last attempt's error are raised to the caller.
+
+    `admit`, e.g. a rate limiter slot, is entered before every attempt; time
+    spent waiting for it counts toward neither the timeout nor the latency
+    samples behind the hedging threshold.
+    """
+    counters = _counters[operation]
+    counters["calls"] += 1
+    for attempt in range(max_attempts):
+        try:
+            result = await _hedged_call(operation, call, timeout, admit, should_hedge)
+        except Exception as e:
+            if not is_retryable(e) or attempt + 1 >= max_attempts:
+                counters["failures"] += 1
+                raise
+            delay = _backoff_delay(attempt)
+            counters["retries"] += 1
+            logger.warning(f"Retrying {operation} in {delay:.1f}s after attempt {attempt + 1} failed: {e!r}")
+            await asyncio.sleep(delay)
+            continue
+        counters["successes"] += 1
+        return result
+
+
+def get_resilience_stats() -> dict[str, dict[str, Any]]:
+    """Returns per-operation counters for retries, timeouts and hedges in this process."""
+    stats = {}
+    for operation, counters in sorted(_counters.items()):
+        hedge_delay = _hedge_delay(operation)
+        stats[operation] = {
+            **{name: counters[name] for name in (
+                "calls", "successes", "failures", "retries", "timeouts", "hedges", "hedges_won",
+            )},
+            "hedge_delay_seconds": round(hedge_delay, 3) if hedge_delay is not None else None,
+        }
+    return stats
@@ -0,0 +1,26 @@
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+
+from app.config import DATA_DIR
+
+
+@lru_cache(maxsize=None)
+def get_connection(database_name: str) -> sqlite3.Connection:
+    """
+    Returns the shared SQLite connection for a named database under DATA_DIR.
+    Connections run in autocommit mode with WAL journaling so several
+    processes can read while one writes.
+    """
+    data_dir = Path(DATA_DIR)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(
+        data_dir / f"{database_name}.db",
+        check_same_thread=False,
+        isolation_level=None,
+        timeout=30,
+    )
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
@@ -0,0 +1,339 @@
+import copy
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from loguru import logger
+
+from app.config import TASK_STORE_BACKEND, TASK_STORE_MAX_TASKS, TASK_TTL_SECONDS
+from app.models.tasks import ProcurementData, ProcurementState
+from app.services.storage import get_connection
+
+# Large outputs are kept apart from the status record so status reads stay cheap
+_RESULT_FIELDS = {"extracted_data"}
+
+
+class TaskStore(ABC):
+    """Persists task status records and, separately, their result products."""
+
+    @abstractmethod
+    def get(self, task_id: str) -> ProcurementData | None:
+        """Returns a copy of the task's status record, without its result products."""
+
+    @abstractmethod
+    def save(self, task: ProcurementData) -> None:
+        """Stores the task's status record. The result fields are not stored."""
+
+    @abstractmethod
+    def get_result(self, task_id: str) -> list[dict[str, Any]]:
+        """Returns a copy of the task's result products, in table order."""
+
+    @abstractmethod
+    def save_result(self, task_id: str, products: list[dict[str, Any]]) -> None:
+        """Replaces all of the task's result products."""
+
+    @abstractmethod
+    def save_result_product(self, task_id: str, index: int, product: dict[str, Any]) -> None:
+        """Stores one result product, so a per-product checkpoint doesn't rewrite the whole table."""
+
+    @abstractmethod
+    def list_task_ids(self, states: list[ProcurementState]) -> list[str]:
+        """Returns the IDs of stored tasks currently in any of the given states."""
+
+    @abstractmethod
+    def request_cancel(self, task_id: str) -> None:
+        """Flags the task for cancellation. Kept apart from the record so task saves can't clear it."""
+
+    @abstractmethod
+    def is_cancel_requested(self, task_id: str) -> bool:
+        """Whether cancellation has been requested for the task."""
+
+    @abstractmethod
+    def claim_task(self, task_id: str, owner_id: str, lease_seconds: float) -> bool:
+        """
+        Atomically takes the right to run the task for `lease_seconds`, unless
+        another owner holds a live claim. The current owner may re-claim.
+        """
+
+    @abstractmethod
+    def renew_task_claims(self, owner_id: str, lease_seconds: float) -> None:
+        """Extends every claim held by the owner."""
+
+    @abstractmethod
+    def release_task(self, task_id: str, owner_id: str) -> None:
+        """Gives up the owner's claim on the task, if it still holds it."""
+
+    @abstractmethod
+    def set_dedup_key(self, dedup_key: str, task_id: str) -> None:
+        """Registers the task as the current run for an analysis key, replacing any previous one."""
+
+    @abstractmethod
+    def get_task_id_by_dedup_key(self, dedup_key: str) -> str | None:
+        """Returns the task last registered for an analysis key, if any."""
+
+
+class InMemoryTaskStore(TaskStore):
+    """Process-local store with LRU eviction beyond `max_tasks` and a TTL."""
+
+    def __init__(self, max_tasks: int = TASK_STORE_MAX_TASKS, ttl_seconds: float = TASK_TTL_SECONDS):
+        self._max_tasks = max_tasks
+        self._ttl_seconds = ttl_seconds
+        self._tasks: OrderedDict[str, tuple[ProcurementData, float]] = OrderedDict()
+        self._results: dict[str, list[dict[str, Any]]] = {}
+        self._cancel_requests: set[str] = set()
+        self._dedup_keys: dict[str, str] = {}
+        self._claims: dict[str, tuple[str, float]] = {}
+
+    def _evict(self) -> None:
+        expiry = time.time() - self._ttl_seconds
+        expired_ids = [task_id for task_id, (_, updated_at) in self._tasks.items() if updated_at < expiry]
+        for task_id in expired_ids:
+            self._remove(task_id)
+        while len(self._tasks) > self._max_tasks:
+            oldest_id = next(iter(self._tasks))
+            self._remove(oldest_id)
+            logger.debug(f"Evicted task {oldest_id} from the in-memory task store")
+
+    def _remove(self, task_id: str) -> None:
+        self._tasks.pop(task_id, None)
+        self._results.pop(task_id, None)
+        self._cancel_requests.discard(task_id)
+        self._claims.pop(task_id, None)
+
+    def get(self, task_id: str) -> ProcurementData | None:
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return None
+        task, updated_at = entry
+        if time.time() - updated_at > self._ttl_seconds:
+            self._remove(task_id)
+            return None
+        self._tasks.move_to_end(task_id)
+        return task.model_copy(deep=True)
+
+    def save(self, task: ProcurementData) -> None:
+        stored_task = task.model_copy(update={field: [] for field in _RESULT_FIELDS}).model_copy(deep=True)
+        self._tasks[task.task_id] = (stored_task, time.time())
+        self._tasks.move_to_end(task.task_id)
+        self._evict()
+
+    def get_result(self, task_id: str) -> list[dict[str, Any]]:
+        if task_id not in self._tasks:
+            return []
+        return copy.deepcopy(self._results.get(task_id, []))
+
+    def save_result(self, task_id: str, products: list[dict[str, Any]]) -> None:
+        self._results[task_id] = copy.deepcopy(products)
+
+    def save_result_product(self, task_id: str, index: int, product: dict[str, Any]) -> None:
+        products = self._results.setdefault(task_id, [])
+        products.extend({} for _ in range(index + 1 - len(products)))
+        products[index] = copy.deepcopy(product)
+
+    def list_task_ids(self, states: list[ProcurementState]) -> list[str]:
+        return [task_id for task_id, (task, _) in self._tasks.items() if task.current_state in states]
+
+    def request_cancel(self, task_id: str) -> None:
+        if task_id in self._tasks:
+            self._cancel_requests.add(task_id)
+
+    def is_cancel_requested(self, task_id: str) -> bool:
+        return task_id in self._cancel_requests
+
+    def claim_task(self, task_id: str, owner_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        current_owner, expires_at = self._claims.get(task_id, (owner_id, now))
+        if current_owner != owner_id and expires_at >= now:
+            return False
+        self._claims[task_id] = (owner_id, now + lease_seconds)
+        return True
+
+    def renew_task_claims(self, owner_id: str, lease_seconds: float) -> None:
+        expires_at = time.time() + lease_seconds
+        for task_id, (current_owner, _) in list(self._claims.items()):
+            if current_owner == owner_id:
+                self._claims[task_id] = (owner_id, expires_at)
+
+    def release_task(self, task_id: str, owner_id: str) -> None:
+        if self._claims.get(task_id, (None, 0))[0] == owner_id:
+            del self._claims[task_id]
+
+    def set_dedup_key(self, dedup_key: str, task_id: str) -> None:
+        self._dedup_keys[dedup_key] = task_id
+
+    def get_task_id_by_dedup_key(self, dedup_key: str) -> str | None:
+        task_id = self._dedup_keys.get(dedup_key)
+        if task_id is not None and task_id not in self._tasks:
+            del self._dedup_keys[dedup_key]  # Evicted task
+            return None
+        return task_id
+
+
+class SqliteTaskStore(TaskStore):
+    """Durable store shared by every process using the same DATA_DIR."""
+
+    def __init__(self, database_name: str = "tasks", ttl_seconds: float = TASK_TTL_SECONDS):
+        self._ttl_seconds = ttl_seconds
+        self._db = get_connection(database_name)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                current_state TEXT NOT NULL,
+                data_json TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_results (
+                task_id TEXT NOT NULL,
+                product_index INTEGER NOT NULL,
+                product_json TEXT NOT NULL,
+                PRIMARY KEY (task_id, product_index)
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_cancellations (
+                task_id TEXT PRIMARY KEY,
+                requested_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_claims (
+                task_id TEXT PRIMARY KEY,
+                owner_id TEXT NOT NULL,
+                lease_expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_dedup_keys (
+                dedup_key TEXT PRIMARY KEY,
+                task_id TEXT NOT NULL
+            )
+            """
+        )
+        self.purge_expired()
+
+    def purge_expired(self) -> None:
+        """Deletes tasks not updated within the TTL, with their results, flags, claims and analysis keys."""
+        expiry = time.time() - self._ttl_seconds
+        for table in ("task_results", "task_cancellations", "task_claims", "task_dedup_keys"):
+            self._db.execute(
+                f"DELETE FROM {table} WHERE task_id IN (SELECT task_id FROM tasks WHERE updated_at < ?)",
+                (expiry,),
+            )
+        self._db.execute("DELETE FROM tasks WHERE updated_at < ?", (expiry,))
+
+    def get(self, task_id: str) -> ProcurementData | None:
+        row = self._db.execute(
+            "SELECT data_json, updated_at FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None or time.time() - row["updated_at"] > self._ttl_seconds:
+            return None
+        return ProcurementData.model_validate_json(row["data_json"])
+
+    def save(self, task: ProcurementData) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO tasks (task_id, current_state, data_json, updated_at) VALUES (?, ?, ?, ?)",
+            (task.task_id, task.current_state.name, task.model_dump_json(exclude=_RESULT_FIELDS), time.time()),
+        )
+
+    def get_result(self, task_id: str) -> list[dict[str, Any]]:
+        rows = self._db.execute(
+            "SELECT product_json FROM task_results WHERE task_id = ? ORDER BY product_index", (task_id,)
+        ).fetchall()
+        return [json.loads(row["product_json"]) for row in rows]
+
+    def save_result(self, task_id: str, products: list[dict[str, Any]]) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute("DELETE FROM task_results WHERE task_id = ?", (task_id,))
+            self._db.executemany(
+                "INSERT INTO task_results (task_id, product_index, product_json) VALUES (?, ?, ?)",
+                [(task_id, index, json.dumps(product)) for index, product in enumerate(products)],
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def save_result_product(self, task_id: str, index: int, product: dict[str, Any]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO task_results (task_id, product_index, product_json) VALUES (?, ?, ?)",
+            (task_id, index, json.dumps(product)),
+        )
+
+    def list_task_ids(self, states: list[ProcurementState]) -> list[str]:
+        if not states:
+            return []
+        placeholders = ", ".join("?" for _ in states)
+        rows = self._db.execute(
+            f"SELECT task_id FROM tasks WHERE current_state IN ({placeholders}) AND updated_at >= ?",
+            (*(state.name for state in states), time.time() - self._ttl_seconds),
+        ).fetchall()
+        return [row["task_id"] for row in rows]
+
+    def request_cancel(self, task_id: str) -> None:
+        self._db.execute(
+            "INSERT OR IGNORE INTO task_cancellations (task_id, requested_at) VALUES (?, ?)",
+            (task_id, time.time()),
+        )
+
+    def is_cancel_requested(self, task_id: str) -> bool:
+        row = self._db.execute(
+            "SELECT 1 FROM task_cancellations WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return row is not None
+
+    def claim_task(self, task_id: str, owner_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        cursor = self._db.execute(
+            """
+            INSERT INTO task_claims (task_id, owner_id, lease_expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (task_id) DO UPDATE
+                SET owner_id = excluded.owner_id, lease_expires_at = excluded.lease_expires_at
+            WHERE task_claims.owner_id = excluded.owner_id OR task_claims.lease_expires_at < ?
+            """,
+            (task_id, owner_id, now + lease_seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def renew_task_claims(self, owner_id: str, lease_seconds: float) -> None:
+        self._db.execute(
+            "UPDATE task_claims SET lease_expires_at = ? WHERE owner_id = ?",
+            (time.time() + lease_seconds, owner_id),
+        )
+
+    def release_task(self, task_id: str, owner_id: str) -> None:
+        self._db.execute("DELETE FROM task_claims WHERE task_id = ? AND owner_id = ?", (task_id, owner_id))
+
+    def set_dedup_key(self, dedup_key: str, task_id: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO task_dedup_keys (dedup_key, task_id) VALUES (?, ?)",
+            (dedup_key, task_id),
+        )
+
+    def get_task_id_by_dedup_key(self, dedup_key: str) -> str | None:
+        row = self._db.execute(
+            "SELECT task_id FROM task_dedup_keys WHERE dedup_key = ?", (dedup_key,)
+        ).fetchone()
+        return row["task_id"] if row else None
+
+
+@lru_cache(maxsize=None)
+def get_task_store() -> TaskStore:
+    """Returns the process-wide task store selected by TASK_STORE_BACKEND."""
+    if TASK_STORE_BACKEND == "sqlite":
+        return SqliteTaskStore()
+    return InMemoryTaskStore()
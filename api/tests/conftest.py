@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+# The backend is imported as the `app` package (it is mounted at /app/app in the
+# container); map that name onto this directory so the tests run from a checkout.
+_API_DIR = Path(__file__).resolve().parents[1]
+if "app" not in sys.modules:
+    _package = types.ModuleType("app")
+    _package.__path__ = [str(_API_DIR)]
+    sys.modules["app"] = _package
+
+# Keep SQLite stores and caches out of the working tree, and the analysis off the network
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="procure-tests-"))
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("EXA_CACHE_ENABLED", "false")
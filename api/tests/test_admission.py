@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+import app.services.admission as admission
+from app.models.tasks import ProcurementData
+from app.services.task_store import InMemoryTaskStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    task_store = InMemoryTaskStore()
+    started = []
+
+    async def _run_analysis(task_id, api_key):
+        started.append(task_id)
+
+    monkeypatch.setattr(admission, "get_task_store", lambda: task_store)
+    monkeypatch.setattr(admission, "run_analysis", _run_analysis)
+    task_store.started = started
+    return task_store
+
+
+def _submit_and_settle(task_id: str) -> None:
+    async def _main():
+        admission.submit_analysis(task_id, "key", "client")
+        await asyncio.gather(*admission._running.values())
+        await asyncio.sleep(0)  # Let the done callbacks run
+    asyncio.run(_main())
+
+
+def test_task_claimed_by_another_process_is_not_run(store):
+    store.save(ProcurementData(task_id="task-1", initial_query="crm"))
+    assert store.claim_task("task-1", "other-process", lease_seconds=60)
+
+    _submit_and_settle("task-1")
+    assert store.started == []
+
+
+def test_finished_run_releases_its_claim(store):
+    store.save(ProcurementData(task_id="task-1", initial_query="crm"))
+
+    _submit_and_settle("task-1")
+    assert store.started == ["task-1"]
+    assert store.claim_task("task-1", "other-process", lease_seconds=60)
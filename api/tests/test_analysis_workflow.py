@@ -0,0 +1,224 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import app.services.analysis_workflow as workflow
+import app.services.product_pipeline as pipeline
+from app.models.tasks import CachedAnalysis, CachedProduct, ProcurementData, ProcurementState
+from app.services.task_store import InMemoryTaskStore
+
+_DEFINITION = {"factor_schema_json": '{"type": "string"}', "processing_type": "none", "categories": None}
+
+
+class FakeServices:
+    """Stands in for the LLM and Exa so the workflow runs offline."""
+
+    def __init__(self):
+        self.clarify_failures = 0
+        self.clarified_queries: list[str] = []
+        self.discovery_queries: list[str] = []
+        self.processed_factors: list[str] = []
+        self.product_count = 3
+        self.enrich_delay = 0.0
+
+    async def clarify_query(self, query, api_key):
+        self.clarified_queries.append(query)
+        if self.clarify_failures:
+            self.clarify_failures -= 1
+            raise RuntimeError("clarification failed")
+        return SimpleNamespace(
+            needs_clarification=False,
+            question_for_user=None,
+            clarified_query=f"{query} software",
+            comparison_factors=["Price"],
+        )
+
+    async def search_and_extract(self, product_category, comparison_factors, api_key, mode="single"):
+        self.discovery_queries.append(product_category)
+        return [
+            {
+                "product_name": f"Product {index}",
+                "extracted_factors": [
+                    {"name": factor, "value": "raw", "definition": dict(_DEFINITION)}
+                    for factor in comparison_factors
+                ],
+            }
+            for index in range(self.product_count)
+        ]
+
+    async def process_data(self, products, api_key, mode=None):
+        for product in products:
+            for factor in product["extracted_factors"]:
+                if factor.pop("definition", None) is not None:
+                    self.processed_factors.append(factor["name"])
+                    factor["value"] = "processed"
+        return products
+
+    async def determine_factor_definition(self, factor, api_key):
+        return SimpleNamespace(model_dump=lambda: dict(_DEFINITION))
+
+    async def generate_enrichment_queries(self, product, api_key):
+        return [f"{product['product_name']} pricing"]
+
+    async def fetch_enrichment_pages(self, queries):
+        return [("https://example.com", "page")]
+
+    async def enrich_from_pages(self, product, pages, queries, api_key):
+        await asyncio.sleep(self.enrich_delay)
+        return {
+            **product,
+            "extracted_factors": [{**factor, "value": "enriched"} for factor in product["extracted_factors"]],
+        }
+
+
+@pytest.fixture
+def services(monkeypatch):
+    fakes = FakeServices()
+    store = InMemoryTaskStore()
+    monkeypatch.setattr(workflow, "get_task_store", lambda: store)
+    monkeypatch.setattr(workflow, "get_cached_analysis", lambda *args: None)
+    monkeypatch.setattr(workflow, "store_analysis", lambda *args: None)
+    monkeypatch.setattr(workflow, "clarify_query", fakes.clarify_query)
+    monkeypatch.setattr(workflow, "search_and_extract", fakes.search_and_extract)
+    monkeypatch.setattr(workflow, "process_data", fakes.process_data)
+    monkeypatch.setattr(workflow, "determine_factor_definition", fakes.determine_factor_definition)
+    monkeypatch.setattr(pipeline, "process_data", fakes.process_data)
+    monkeypatch.setattr(pipeline, "generate_enrichment_queries", fakes.generate_enrichment_queries)
+    monkeypatch.setattr(pipeline, "fetch_enrichment_pages", fakes.fetch_enrichment_pages)
+    monkeypatch.setattr(pipeline, "enrich_from_pages", fakes.enrich_from_pages)
+    fakes.store = store
+    return fakes
+
+
+def _new_task(store, task_id="task-1", **fields) -> ProcurementData:
+    task = ProcurementData(task_id=task_id, initial_query="crm", current_state=ProcurementState.START, **fields)
+    store.save(task)
+    return task
+
+
+def test_resume_after_failed_clarification_clarifies_again(services):
+    services.clarify_failures = 1
+    _new_task(services.store)
+
+    asyncio.run(workflow.run_analysis("task-1", "key"))
+    assert services.store.get("task-1").current_state == ProcurementState.ERROR
+
+    asyncio.run(workflow.run_analysis("task-1", "key"))
+    task = services.store.get("task-1")
+    assert task.current_state == ProcurementState.COMPLETED
+    assert services.clarified_queries == ["crm", "crm"]
+    assert services.discovery_queries == ["crm software"]
+    assert task.comparison_factors == ["Price"]
+
+
+def test_resume_after_failed_discovery_keeps_clarification(services, monkeypatch):
+    _new_task(services.store)
+
+    async def _failing_search(*args, **kwargs):
+        raise RuntimeError("discovery failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(workflow, "search_and_extract", _failing_search)
+        asyncio.run(workflow.run_analysis("task-1", "key"))
+    assert services.store.get("task-1").current_state == ProcurementState.ERROR
+
+    asyncio.run(workflow.run_analysis("task-1", "key"))
+    assert services.store.get("task-1").current_state == ProcurementState.COMPLETED
+    assert services.clarified_queries == ["crm"]  # Not repeated on resume
+    assert services.discovery_queries == ["crm software"]
+
+
+def test_interrupted_tasks_include_queued_but_not_attached(services):
+    _new_task(services.store, "queued")
+    _new_task(services.store, "follower", source_task_id="queued")
+    running = ProcurementData(task_id="mid-run", initial_query="crm", current_state=ProcurementState.PROCESSING)
+    failed = ProcurementData(task_id="failed", initial_query="crm", current_state=ProcurementState.ERROR)
+    services.store.save(running)
+    services.store.save(failed)
+
+    assert sorted(workflow.find_interrupted_task_ids()) == ["mid-run", "queued"]
+
+
+def test_cached_analysis_processes_only_new_factor_columns(services, monkeypatch):
+    cached = CachedAnalysis(
+        query="crm software",
+        comparison_factors=["Price"],
+        products=[
+            CachedProduct(
+                product={"product_name": f"Product {index}", "extracted_factors": [{"name": "Price", "value": "$10"}]},
+                enriched_at=0,
+            )
+            for index in range(2)
+        ],
+        updated_at=0,
+    )
+    monkeypatch.setattr(workflow, "get_cached_analysis", lambda *args: cached)
+    _new_task(services.store, comparison_factors=["Price", "Support"])
+
+    asyncio.run(workflow.run_analysis("task-1", "key"))
+
+    task = services.store.get("task-1")
+    assert task.current_state == ProcurementState.COMPLETED
+    assert task.cache_status == "refresh"
+    assert services.discovery_queries == []
+    assert services.processed_factors == ["Support", "Support"]
+    for product in services.store.get_result("task-1"):
+        assert all("definition" not in factor for factor in product["extracted_factors"])
+
+
+async def _run_then(task_id: str, action, delay: float = 0.1) -> None:
+    """Runs the analysis and applies `action` once it is under way."""
+    run = asyncio.create_task(workflow.run_analysis(task_id, "key"))
+    await asyncio.sleep(delay)
+    action()
+    await asyncio.wait_for(run, timeout=2)
+
+
+def test_cancel_stops_a_running_analysis(services):
+    services.enrich_delay = 10
+    _new_task(services.store)
+
+    def _cancel():
+        services.store.request_cancel("task-1")
+        assert workflow.cancel_analysis("task-1")
+
+    asyncio.run(_run_then("task-1", _cancel))
+    assert services.store.get("task-1").current_state == ProcurementState.CANCELLED
+    assert not workflow.is_analysis_running("task-1")
+
+
+def test_cancel_flag_is_picked_up_by_the_watcher(services, monkeypatch):
+    monkeypatch.setattr(workflow, "CANCELLATION_POLL_INTERVAL_SECONDS", 0.02)
+    services.enrich_delay = 10
+    _new_task(services.store)
+
+    asyncio.run(_run_then("task-1", lambda: services.store.request_cancel("task-1")))
+    assert services.store.get("task-1").current_state == ProcurementState.CANCELLED
+
+
+def test_task_cancelled_before_it_starts_does_not_run(services):
+    _new_task(services.store)
+    services.store.request_cancel("task-1")
+
+    asyncio.run(workflow.run_analysis("task-1", "key"))
+    assert services.store.get("task-1").current_state == ProcurementState.CANCELLED
+    assert services.clarified_queries == []
+
+
+def test_deadline_returns_partial_table_without_caching_it(services, monkeypatch):
+    cached = []
+    monkeypatch.setattr(workflow, "store_analysis", lambda *args: cached.append(args))
+    services.enrich_delay = 10
+    _new_task(services.store, deadline_at=time.time() + 0.3)
+
+    asyncio.run(asyncio.wait_for(workflow.run_analysis("task-1", "key"), timeout=2))
+
+    task = services.store.get("task-1")
+    assert task.current_state == ProcurementState.COMPLETED
+    assert task.deadline_exceeded
+    products = services.store.get_result("task-1")
+    assert len(products) == task.product_count == services.product_count
+    assert all(factor["value"] == "processed" for factor in products[0]["extracted_factors"])
+    assert cached == []
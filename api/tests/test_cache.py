@@ -0,0 +1,92 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+import app.services.cache as cache
+
+
+@pytest.fixture
+def namespace():
+    return f"test-{uuid4().hex}"
+
+
+def _stored_keys(namespace: str) -> set[str]:
+    rows = cache._get_db().execute(
+        "SELECT cache_key FROM cache_entries WHERE namespace = ?", (namespace,)
+    ).fetchall()
+    return {row["cache_key"] for row in rows}
+
+
+def _accessed_at(namespace: str, cache_key: str) -> float:
+    return cache._get_db().execute(
+        "SELECT accessed_at FROM cache_entries WHERE namespace = ? AND cache_key = ?",
+        (namespace, cache_key),
+    ).fetchone()[0]
+
+
+def test_values_round_trip_compressed_or_not(namespace):
+    async def scenario():
+        await cache.cache_set(namespace, "plain", b"value", ttl_seconds=60, max_bytes=1000)
+        await cache.cache_set(namespace, "packed", b"x" * 500, ttl_seconds=60, max_bytes=1000, compress=True)
+        return (
+            await cache.cache_get(namespace, "plain"),
+            await cache.cache_get(namespace, "packed"),
+            await cache.cache_get(namespace, "missing"),
+        )
+
+    assert asyncio.run(scenario()) == (b"value", b"x" * 500, None)
+    assert cache.get_cache_stats()[namespace] == {"hits": 2, "misses": 1}
+
+
+def test_hits_refresh_the_lru_position_at_most_once_per_interval(namespace, monkeypatch):
+    asyncio.run(cache.cache_set(namespace, "key", b"value", ttl_seconds=600, max_bytes=1000))
+    stored_at = _accessed_at(namespace, "key")
+
+    asyncio.run(cache.cache_get(namespace, "key"))
+    assert _accessed_at(namespace, "key") == stored_at
+
+    monkeypatch.setattr(cache.time, "time", lambda: stored_at + cache._ACCESS_REFRESH_SECONDS + 1)
+    asyncio.run(cache.cache_get(namespace, "key"))
+    assert _accessed_at(namespace, "key") == stored_at + cache._ACCESS_REFRESH_SECONDS + 1
+
+
+def test_size_is_checked_periodically_rather_than_on_every_write(namespace, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    checks = []
+    monkeypatch.setattr(cache, "_evict", lambda namespace, max_bytes: checks.append(now))
+
+    def store(cache_key: str, size: int):
+        asyncio.run(cache.cache_set(namespace, cache_key, b"x" * size, ttl_seconds=3600, max_bytes=1000))
+
+    store("first", 10)
+    for position in range(5):
+        now += 1
+        store(f"small-{position}", 10)
+    assert checks == [1_000_000.0]
+
+    now += cache._EVICTION_INTERVAL_SECONDS
+    store("later", 10)
+    now += 1
+    store("large", 100)
+    assert len(checks) == 3
+
+
+def test_eviction_drops_least_recently_used_entries(namespace, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+
+    def store(cache_key: str):
+        asyncio.run(cache.cache_set(namespace, cache_key, b"x" * 300, ttl_seconds=3600, max_bytes=1000))
+
+    for position in range(3):
+        now += 1
+        store(f"key-{position}")
+    now += cache._ACCESS_REFRESH_SECONDS + 1
+    asyncio.run(cache.cache_get(namespace, "key-0"))
+    for position in range(3, 5):
+        now += 1
+        store(f"key-{position}")
+
+    assert _stored_keys(namespace) == {"key-0", "key-3", "key-4"}
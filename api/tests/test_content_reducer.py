@@ -0,0 +1,46 @@
+from app.services.content_reducer import reduce_page_content, strip_boilerplate
+
+
+def test_strip_boilerplate_drops_navigation_and_repeated_chrome():
+    page = "\n".join([
+        "Sign in",
+        "Privacy Policy",
+        "[Home](/) | [Pricing](/pricing)",
+        "Contact sales",
+        "Acme CRM tracks deals and contacts.",
+        "Contact sales",
+        "Contact sales",
+    ])
+    assert strip_boilerplate(page) == "Acme CRM tracks deals and contacts."
+
+
+def test_strip_boilerplate_keeps_repeated_pricing_cells():
+    page = "\n".join(["Starter", "$10/month", "Pro", "$10/month", "Team", "$10/month"])
+    kept = strip_boilerplate(page).splitlines()
+    assert kept.count("$10/month") == 3
+
+
+def test_strip_boilerplate_keeps_content_lines_that_mention_keywords():
+    page = "\n".join([
+        "Single sign on and login with SAML are included on every plan.",
+        "Newsletter",
+        "The Pro plan adds a privacy policy editor for GDPR requests.",
+    ])
+    assert strip_boilerplate(page).splitlines() == [
+        "Single sign on and login with SAML are included on every plan.",
+        "The Pro plan adds a privacy policy editor for GDPR requests.",
+    ]
+
+
+def test_reduce_page_content_keeps_chunks_about_weak_factors():
+    product = {
+        "product_name": "Acme CRM",
+        "extracted_factors": [{"name": "Pricing", "value": "Not found"}, {"name": "Support", "value": "24/7"}],
+    }
+    filler = "\n\n".join(f"Acme was founded long ago and has many offices, story part {index}." for index in range(40))
+    page = f"{filler}\n\nPricing starts at $25 per user per month, billed annually.\n\n{filler}"
+
+    reduced = reduce_page_content(page, product, token_budget=40)
+    assert "Pricing starts at $25" in reduced
+    assert len(reduced) < len(page)
+    assert reduce_page_content(page, product, token_budget=0) == page
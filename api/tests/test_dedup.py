@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.tasks import ProcurementData, ProcurementState
+from app.routers import analysis
+from app.services.dedup import dedup_key, has_attached_tasks
+from app.services.task_store import InMemoryTaskStore
+
+
+def _save(store, task_id, state=ProcurementState.START, **fields) -> ProcurementData:
+    task = ProcurementData(task_id=task_id, initial_query="crm", current_state=state, **fields)
+    store.save(task)
+    return task
+
+
+def test_dedup_key_ignores_case_whitespace_and_factor_order():
+    assert dedup_key("  CRM  tools!", ["Price", "Support"]) == dedup_key("crm tools", ["support", "price"])
+    assert dedup_key("crm", ["Price"]) != dedup_key("crm", ["Price"], discovery_mode="sharded")
+
+
+def test_has_attached_tasks_ignores_detached_followers():
+    store = InMemoryTaskStore()
+    _save(store, "leader", ProcurementState.EXTRACTING)
+    _save(store, "follower", source_task_id="leader")
+    assert has_attached_tasks(store, "leader")
+
+    _save(store, "follower", ProcurementState.CANCELLED, source_task_id="leader")
+    assert not has_attached_tasks(store, "leader")
+
+
+def test_cancelling_shared_leader_is_refused(monkeypatch):
+    store = InMemoryTaskStore()
+    _save(store, "leader", ProcurementState.EXTRACTING)
+    _save(store, "follower", source_task_id="leader")
+    monkeypatch.setattr(analysis, "cancel_analysis", lambda task_id: pytest.fail("shared run was cancelled"))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(analysis.cancel_task("leader", api_key="key", store=store))
+    assert error.value.status_code == 409
+
+    asyncio.run(analysis.cancel_task("follower", api_key="key", store=store))
+    assert store.get("follower").current_state == ProcurementState.CANCELLED
+    assert store.get("leader").current_state == ProcurementState.EXTRACTING
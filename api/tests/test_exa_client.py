@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+import app.services.exa_client as exa_client
+
+
+class FakeExa:
+    """Answers get_contents with canonicalized URLs, as Exa does after redirects."""
+
+    def __init__(self, with_ids: bool = True):
+        self.with_ids = with_ids
+        self.error: Exception | None = None
+        self.requests: list[list[str]] = []
+
+    async def get_contents(self, urls):
+        self.requests.append(list(urls))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(results=[
+            SimpleNamespace(
+                id=url if self.with_ids else None,
+                url=url.replace("http://", "https://www.") + "/",
+                text=f"text of {url}",
+            )
+            for url in urls
+        ])
+
+
+@pytest.fixture
+def fake_exa(monkeypatch):
+    fake = FakeExa()
+    monkeypatch.setattr(exa_client, "get_exa_client", lambda: fake)
+    return fake
+
+
+def test_pages_are_keyed_by_the_requested_url(fake_exa):
+    urls = ["http://a.example", "http://b.example"]
+    assert asyncio.run(exa_client.fetch_page_texts(urls)) == {url: f"text of {url}" for url in urls}
+
+
+def test_results_without_ids_are_matched_by_position(fake_exa):
+    fake_exa.with_ids = False
+    urls = ["http://a.example", "http://b.example"]
+    assert asyncio.run(exa_client.fetch_page_texts(urls)) == {url: f"text of {url}" for url in urls}
+
+
+def test_redirected_pages_are_cached_under_the_requested_url(fake_exa, monkeypatch):
+    monkeypatch.setattr(exa_client, "EXA_CACHE_ENABLED", True)
+    url = f"http://{uuid4().hex}.example"
+
+    asyncio.run(exa_client.fetch_page_texts([url]))
+    assert asyncio.run(exa_client.fetch_page_texts([url])) == {url: f"text of {url}"}
+    assert fake_exa.requests == [[url]]
+
+
+@pytest.fixture
+def wave(monkeypatch):
+    def configure(size: int, seconds: float):
+        monkeypatch.setattr(exa_client, "ENRICHMENT_FETCH_WAVE_SIZE", size)
+        monkeypatch.setattr(exa_client, "ENRICHMENT_FETCH_WAVE_SECONDS", seconds)
+
+    return configure
+
+
+def _run_wave(*url_lists: list[str]) -> list:
+    """Fetches each URL list concurrently in a wave; failures are returned in place of results."""
+    async def scenario():
+        fetches = (exa_client.fetch_page_texts_in_wave(urls) for urls in url_lists)
+        return await asyncio.gather(*fetches, return_exceptions=True)
+
+    return asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_full_wave_is_fetched_without_waiting_for_the_timer(fake_exa, wave):
+    wave(size=3, seconds=60)
+
+    results = _run_wave(
+        ["http://a.example", "http://b.example"],
+        ["http://b.example"],
+        ["http://c.example"],
+    )
+
+    assert fake_exa.requests == [["http://a.example", "http://b.example", "http://c.example"]]
+    assert results == [
+        {"http://a.example": "text of http://a.example", "http://b.example": "text of http://b.example"},
+        {"http://b.example": "text of http://b.example"},
+        {"http://c.example": "text of http://c.example"},
+    ]
+
+
+def test_partial_wave_is_fetched_when_the_timer_fires(fake_exa, wave):
+    wave(size=10, seconds=0.01)
+
+    results = _run_wave(["http://a.example"], ["http://b.example"])
+
+    assert fake_exa.requests == [["http://a.example", "http://b.example"]]
+    assert results == [{"http://a.example": "text of http://a.example"}, {"http://b.example": "text of http://b.example"}]
+
+
+def test_cancelled_caller_leaves_the_rest_of_its_wave(fake_exa, wave):
+    wave(size=10, seconds=0.05)
+
+    async def scenario():
+        kept = asyncio.create_task(exa_client.fetch_page_texts_in_wave(["http://a.example"]))
+        cancelled = asyncio.create_task(exa_client.fetch_page_texts_in_wave(["http://b.example"]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept, await asyncio.gather(cancelled, return_exceptions=True)
+
+    kept_result, (cancelled_result,) = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert kept_result == {"http://a.example": "text of http://a.example"}
+    assert isinstance(cancelled_result, asyncio.CancelledError)
+    assert fake_exa.requests == [["http://a.example"]]
+
+
+def test_failed_fetch_reaches_every_caller_in_the_wave(fake_exa, wave):
+    wave(size=2, seconds=60)
+    fake_exa.error = RuntimeError("Exa unavailable")
+
+    results = _run_wave(["http://a.example"], ["http://b.example"])
+
+    assert [str(result) for result in results] == ["Exa unavailable", "Exa unavailable"]
+    assert len(fake_exa.requests) == 1
+
+
+def test_closing_an_unused_client_does_not_create_its_http_client(monkeypatch):
+    monkeypatch.setattr(exa_client, "EXA_API_KEY", "key")
+    client = exa_client.get_exa_client()
+    asyncio.run(exa_client.close_exa_client())
+
+    assert client._client is None
+    assert exa_client._exa_client is None
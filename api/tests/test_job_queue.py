@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import app.worker as worker
+from app.models.tasks import ProcurementData, ProcurementState, QueuedJob
+from app.services import job_queue
+from app.services.task_store import InMemoryTaskStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    job_queue._get_db().execute("DELETE FROM jobs")
+    task_store = InMemoryTaskStore()
+    monkeypatch.setattr(job_queue, "get_task_store", lambda: task_store)
+    return task_store
+
+
+def test_exhausted_job_fails_its_task(store, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    store.save(ProcurementData(task_id="task-1", initial_query="crm", current_state=ProcurementState.ENRICHING))
+    job_queue.enqueue_job("task-1")
+
+    # Each worker "crashes" at once: a zero lease expires immediately
+    assert job_queue.claim_job("worker-a", visibility_timeout=0).attempts == 1
+    assert job_queue.claim_job("worker-b", visibility_timeout=0).attempts == 2
+    assert job_queue.claim_job("worker-c", visibility_timeout=0) is None
+
+    task = store.get("task-1")
+    assert task.current_state == ProcurementState.ERROR
+    assert "2 times" in task.error_message
+
+
+def test_exhausted_job_leaves_cancelled_task_alone(store, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 1)
+    store.save(ProcurementData(task_id="task-1", initial_query="crm", current_state=ProcurementState.CANCELLED))
+    job_queue.enqueue_job("task-1")
+
+    job_queue.claim_job("worker-a", visibility_timeout=0)
+    assert job_queue.claim_job("worker-b") is None
+    assert store.get("task-1").current_state == ProcurementState.CANCELLED
+
+
+def test_lost_lease_stops_the_analysis(monkeypatch):
+    analysis_cancelled = asyncio.Event()
+    completed, released = [], []
+
+    async def _long_analysis(task_id, api_key):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            analysis_cancelled.set()
+            raise
+
+    monkeypatch.setattr(worker, "JOB_VISIBILITY_TIMEOUT_SECONDS", 0.03)
+    monkeypatch.setattr(worker, "run_analysis", _long_analysis)
+    monkeypatch.setattr(worker, "extend_lease", lambda job_id, worker_id: False)
+    monkeypatch.setattr(worker, "complete_job", lambda job_id, worker_id: completed.append(job_id))
+    monkeypatch.setattr(worker, "release_job", lambda job_id, worker_id: released.append(job_id))
+
+    job = QueuedJob(job_id="job-1", task_id="task-1", attempts=1, lease_expires_at=0)
+    asyncio.run(asyncio.wait_for(worker._run_job(job, "worker-a", "key"), timeout=2))
+
+    assert analysis_cancelled.is_set()
+    assert completed == []
+    assert released == ["job-1"]
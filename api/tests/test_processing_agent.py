@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import app.agents.processing_agent as processing_agent
+from app.models.factors import (
+    BatchedCategorizedFactor,
+    BatchedKeywordSummary,
+    BatchedProseSummary,
+    CategorizedFactorBatch,
+    FactorDefinition,
+    MixedFactorBatch,
+)
+
+LICENSE = FactorDefinition(
+    factor_schema_json='{"type": "string"}',
+    processing_type="categorize",
+    categories=["Open Source", "Proprietary", "Free Tier"],
+)
+PROSE = FactorDefinition(factor_schema_json='{"type": "string"}', processing_type="summarize_prose")
+KEYWORDS = FactorDefinition(factor_schema_json='{"type": "string"}', processing_type="summarize_keywords")
+
+# Values the local rules can't settle, so they go to the LLM
+AMBIGUOUS_LICENSE = "Apache 2.0 core with a paid enterprise edition"
+LONG_PROSE = "First sentence. Second sentence that keeps going."
+
+
+class FakeAgent:
+    """Stands in for run_agent, answering each call with the given batch results."""
+
+    def __init__(self, results=(), error: Exception | None = None):
+        self.results = list(results)
+        self.error = error
+        self.output_types: list[type] = []
+
+    async def __call__(self, user_prompt, *, system_prompt, output_type, api_key, **kwargs):
+        self.output_types.append(output_type)
+        if self.error is not None:
+            raise self.error
+        return output_type(results=self.results)
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    def install(**kwargs) -> FakeAgent:
+        agent = FakeAgent(**kwargs)
+        monkeypatch.setattr(processing_agent, "run_agent", agent)
+        return agent
+
+    return install
+
+
+def _process(items):
+    return asyncio.run(processing_agent.process_batch(items, "key"))
+
+
+def test_results_are_matched_to_items_by_index(fake_agent):
+    agent = fake_agent(results=[
+        BatchedCategorizedFactor(index=1, category="Proprietary"),
+        BatchedCategorizedFactor(index=0, category="Open Source"),
+    ])
+
+    assert _process([(LICENSE, AMBIGUOUS_LICENSE), (LICENSE, "Free plus paid add-ons")]) == [
+        "Open Source",
+        "Proprietary",
+    ]
+    assert agent.output_types == [CategorizedFactorBatch]
+
+
+def test_out_of_range_and_duplicate_indices_are_ignored(fake_agent):
+    fake_agent(results=[
+        BatchedCategorizedFactor(index=0, category="Open Source"),
+        BatchedCategorizedFactor(index=0, category="Proprietary"),
+        BatchedCategorizedFactor(index=2, category="Free Tier"),
+        BatchedCategorizedFactor(index=-1, category="Free Tier"),
+    ])
+
+    assert _process([(LICENSE, AMBIGUOUS_LICENSE), (LICENSE, "Free plus paid add-ons")]) == [
+        "Open Source",
+        "Free plus paid add-ons",
+    ]
+
+
+def test_mixed_batch_drops_results_of_the_wrong_type(fake_agent):
+    agent = fake_agent(results=[
+        BatchedProseSummary(index=0, summary="Not a category"),
+        BatchedProseSummary(index=1, summary="A short summary."),
+        BatchedCategorizedFactor(index=2, category="Open Source"),
+    ])
+
+    assert _process([(LICENSE, AMBIGUOUS_LICENSE), (PROSE, LONG_PROSE), (KEYWORDS, LONG_PROSE)]) == [
+        AMBIGUOUS_LICENSE,
+        "A short summary.",
+        LONG_PROSE,
+    ]
+    assert agent.output_types == [MixedFactorBatch]
+
+
+def test_failed_call_keeps_original_values(fake_agent):
+    fake_agent(error=RuntimeError("LLM unavailable"))
+
+    assert _process([(LICENSE, AMBIGUOUS_LICENSE), (LICENSE, "open-source"), (PROSE, 42)]) == [
+        AMBIGUOUS_LICENSE,
+        "Open Source",  # Settled locally before the call
+        42,
+    ]
+
+
+def test_no_call_when_nothing_needs_the_llm(fake_agent):
+    agent = fake_agent()
+
+    assert _process([(LICENSE, "PROPRIETARY"), (PROSE, None), (KEYWORDS, "CRM, Email")]) == [
+        "Proprietary",
+        None,
+        "CRM, Email",
+    ]
+    assert agent.output_types == []
+
+
+@pytest.mark.parametrize(
+    "mode, expected",
+    [
+        ("column", [[0, 2], [4], [1, 3]]),
+        ("product", [[0, 1], [2, 3], [4]]),
+    ],
+)
+def test_cells_are_grouped_into_bounded_batches(monkeypatch, mode, expected):
+    monkeypatch.setattr(processing_agent, "PROCESSING_BATCH_SIZE", 2)
+    cell_keys = [(0, "License"), (0, "Summary"), (1, "License"), (1, "Summary"), (2, "License")]
+
+    assert processing_agent._group_cells(cell_keys, mode) == expected
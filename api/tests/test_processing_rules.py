@@ -0,0 +1,65 @@
+import pytest
+
+from app.models.factors import FactorDefinition
+from app.services.processing_rules import resolve_locally
+
+LICENSE = FactorDefinition(
+    factor_schema_json='{"type": "string"}',
+    processing_type="categorize",
+    categories=["Open Source", "Proprietary", "Free Tier"],
+)
+SSO = FactorDefinition(
+    factor_schema_json='{"type": "string"}',
+    processing_type="categorize",
+    categories=["Yes", "No", "Partial"],
+)
+KEYWORDS = FactorDefinition(factor_schema_json='{"type": "string"}', processing_type="summarize_keywords")
+PROSE = FactorDefinition(factor_schema_json='{"type": "string"}', processing_type="summarize_prose")
+
+
+@pytest.mark.parametrize(
+    "definition, value, expected",
+    [
+        (LICENSE, "open-source", "Open Source"),
+        (LICENSE, "PROPRIETARY", "Proprietary"),
+        (LICENSE, "Free tier plan", "Free Tier"),
+        (SSO, "TRUE", "Yes"),
+        (SSO, "Supported", "Yes"),
+        (SSO, "not supported", "No"),
+        (LICENSE, "Not found", "Not found"),
+        (PROSE, "N/A", "N/A"),
+        (KEYWORDS, "CRM, Email, Automation", "CRM, Email, Automation"),
+        (PROSE, "Cloud CRM for small teams.", "Cloud CRM for small teams."),
+    ],
+)
+def test_settles_trivial_values_locally(definition, value, expected):
+    assert resolve_locally(definition, value) == expected
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "Not open source",
+        "Partially open source",
+        "Open source: no",
+        "No free tier",
+        "free tier not available",
+        "Non-free license",
+    ],
+)
+def test_negated_category_mentions_go_to_the_llm(value):
+    assert resolve_locally(LICENSE, value) is None
+
+
+@pytest.mark.parametrize(
+    "definition, value",
+    [
+        (LICENSE, "Apache 2.0 core with a paid enterprise edition"),
+        (LICENSE, "Open source or proprietary"),  # Names two categories
+        (SSO, "Only on the enterprise plan"),
+        (KEYWORDS, "Email marketing, sales pipelines, reporting dashboards, and more integrations"),
+        (PROSE, "First sentence. Second sentence that keeps going."),
+    ],
+)
+def test_ambiguous_or_long_values_go_to_the_llm(definition, value):
+    assert resolve_locally(definition, value) is None
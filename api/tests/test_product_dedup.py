@@ -0,0 +1,47 @@
+import app.services.product_dedup as product_dedup
+from app.services.product_dedup import find_duplicate_groups, merge_duplicate_products
+
+
+def _product(name: str, **values: str) -> dict:
+    return {
+        "product_name": name,
+        "extracted_factors": [{"name": factor, "value": value} for factor, value in values.items()],
+    }
+
+
+def test_editions_and_casing_of_one_product_are_grouped():
+    products = [
+        _product("HubSpot CRM"),
+        _product("Salesforce"),
+        _product("hubspot sales hub"),
+        _product("Pipedrive"),
+        _product("Salesforce Inc."),
+    ]
+    assert find_duplicate_groups(products) == [[0, 2], [1, 4], [3]]
+
+
+def test_distinct_products_are_not_merged():
+    products = [_product(name) for name in ("Zoho CRM", "Zendesk Sell", "Freshsales", "Monday Sales CRM")]
+    assert find_duplicate_groups(products) == [[0], [1], [2], [3]]
+
+
+def test_merged_product_fills_missing_values_from_duplicates():
+    products = [
+        _product("HubSpot CRM", Price="Not found", Support="Email"),
+        _product("Pipedrive", Price="$14", Support="Chat"),
+        _product("HubSpot", Price="$20", Support="Phone"),
+    ]
+    merged = merge_duplicate_products(products)
+
+    assert [product["product_name"] for product in merged] == ["HubSpot CRM", "Pipedrive"]
+    assert merged[0]["extracted_factors"] == [
+        {"name": "Price", "value": "$20"},
+        {"name": "Support", "value": "Email"},
+    ]
+    assert products[0]["extracted_factors"][0]["value"] == "Not found"  # Inputs are not modified
+
+
+def test_merging_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(product_dedup, "PRODUCT_DEDUP_ENABLED", False)
+    products = [_product("HubSpot CRM"), _product("HubSpot")]
+    assert merge_duplicate_products(products) is products
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+import app.services.product_pipeline as pipeline
+
+
+def _products(count: int) -> list[dict]:
+    return [
+        {"product_name": f"Product {index}", "extracted_factors": [{"name": "Price", "value": "raw"}]}
+        for index in range(count)
+    ]
+
+
+class Recorder:
+    """Fakes the pipeline's LLM and Exa steps and records the callbacks."""
+
+    def __init__(self):
+        self.events: list[tuple[str, int]] = []
+        self.failing_targets: set[str] = set()
+        self.failing_processing: set[str] = set()
+        self.failing_callbacks: set[tuple[str, int]] = set()
+
+    async def process_data(self, products, api_key, mode=None):
+        if products[0]["product_name"] in self.failing_processing:
+            raise RuntimeError("processing failed")
+        await asyncio.sleep(0)
+        return [{**product, "processed": True} for product in products]
+
+    async def generate_enrichment_queries(self, product, api_key):
+        if product["product_name"] in self.failing_targets:
+            raise RuntimeError("targeting failed")
+        return [f"{product['product_name']} pricing"]
+
+    async def fetch_enrichment_pages(self, queries):
+        return [("https://example.com", "page")]
+
+    async def enrich_from_pages(self, product, pages, queries, api_key):
+        return {**product, "enriched": True}
+
+    def run(self, products, skip_processing=(), skip_enrichment=()):
+        processed, enriched = {}, {}
+
+        def _on_processed(index, product):
+            self.events.append(("processed", index))
+            processed[index] = product
+            if ("processed", index) in self.failing_callbacks:
+                raise RuntimeError("checkpoint failed")
+
+        def _on_enriched(index, product):
+            self.events.append(("enriched", index))
+            enriched[index] = product
+            if ("enriched", index) in self.failing_callbacks:
+                raise RuntimeError("checkpoint failed")
+
+        asyncio.run(asyncio.wait_for(pipeline.run_product_pipeline(
+            products, "key", "cell", set(skip_processing), set(skip_enrichment), _on_processed, _on_enriched
+        ), timeout=5))
+        return processed, enriched
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    fakes = Recorder()
+    for name in ("process_data", "generate_enrichment_queries", "fetch_enrichment_pages", "enrich_from_pages"):
+        monkeypatch.setattr(pipeline, name, getattr(fakes, name))
+    return fakes
+
+
+def test_each_product_is_processed_before_it_is_enriched(recorder):
+    processed, enriched = recorder.run(_products(5))
+
+    assert sorted(processed) == sorted(enriched) == list(range(5))
+    for index in range(5):
+        assert recorder.events.index(("processed", index)) < recorder.events.index(("enriched", index))
+    assert all(product["processed"] and product["enriched"] for product in enriched.values())
+
+
+def test_skipped_stages_are_not_repeated(recorder):
+    processed, enriched = recorder.run(_products(3), skip_processing={0, 1}, skip_enrichment={1, 2})
+
+    assert sorted(processed) == [2]
+    assert sorted(enriched) == [0]
+    assert "processed" not in enriched[0]
+
+
+def test_failing_step_passes_its_product_through_unchanged(recorder):
+    recorder.failing_targets = {"Product 1"}
+    processed, enriched = recorder.run(_products(3))
+
+    assert sorted(enriched) == [0, 1, 2]
+    assert enriched[1]["processed"] and "enriched" not in enriched[1]
+    assert enriched[0]["enriched"] and enriched[2]["enriched"]
+
+
+def test_failed_processing_still_enriches_the_product(recorder):
+    recorder.failing_processing = {"Product 0"}
+    processed, enriched = recorder.run(_products(2))
+
+    assert "processed" not in processed[0]
+    assert enriched[0]["enriched"] and "processed" not in enriched[0]
+
+
+def test_failing_callback_is_not_called_again(recorder):
+    recorder.failing_callbacks = {("processed", 0), ("enriched", 1)}
+    processed, enriched = recorder.run(_products(3))
+
+    assert recorder.events.count(("processed", 0)) == 1
+    assert recorder.events.count(("enriched", 1)) == 1
+    assert sorted(enriched) == [1, 2]
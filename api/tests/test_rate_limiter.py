@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import app.services.rate_limiter as rate_limiter
+from app.services.rate_limiter import Priority, RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freezes the limiter's monotonic clock; advance it by adding to `clock.now`."""
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+async def _hold(limiter: RateLimiter, name: str, admitted: list[str], release: asyncio.Event, **kwargs) -> None:
+    async with limiter.acquire(**kwargs):
+        admitted.append(name)
+        await release.wait()
+
+
+def test_interactive_lane_is_admitted_before_earlier_bulk_calls():
+    async def scenario():
+        limiter = RateLimiter("test", max_concurrency=1)
+        admitted: list[str] = []
+        release = asyncio.Event()
+        release.set()
+        blocker = asyncio.Event()
+
+        holder = asyncio.create_task(_hold(limiter, "holder", admitted, blocker))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(_hold(limiter, name, admitted, release, priority=priority))
+            for name, priority in [
+                ("bulk-1", Priority.BULK),
+                ("bulk-2", Priority.BULK),
+                ("interactive", Priority.INTERACTIVE),
+            ]
+        ]
+        await asyncio.sleep(0)
+        assert limiter.get_stats()["lanes"]["bulk"]["queued"] == 2
+        assert not limiter.has_spare_capacity()
+
+        blocker.set()
+        await asyncio.gather(holder, *waiters)
+        return admitted
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5)) == ["holder", "interactive", "bulk-1", "bulk-2"]
+
+
+def test_token_refunds_are_capped_at_the_bucket_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=100)
+    bucket.consume(80)
+    bucket.adjust(-50)
+    assert bucket.seconds_until_available(70) == 0
+    assert bucket.seconds_until_available(71) == pytest.approx(0.1)
+
+    bucket.adjust(-500)
+    assert bucket.seconds_until_available(100) == 0
+
+
+def test_token_overdraft_delays_later_calls_until_repaid(clock):
+    limiter = RateLimiter("test", max_concurrency=10, tokens_per_second=10, token_burst=100)
+    limiter.adjust_tokens(150)  # A call used 150 more tokens than estimated
+
+    bucket = limiter._token_bucket
+    assert bucket.seconds_until_available(10) == pytest.approx(6.0)
+    clock.now += 6.0
+    assert bucket.seconds_until_available(10) == 0
+
+
+def test_adjusting_tokens_without_a_token_rate_is_a_no_op():
+    limiter = RateLimiter("test", max_concurrency=1)
+    limiter.adjust_tokens(1000)
+    assert limiter.has_spare_capacity()
+
+
+def test_cancelled_waiter_is_removed_and_frees_no_slot():
+    async def scenario():
+        limiter = RateLimiter("test", max_concurrency=1)
+        admitted: list[str] = []
+        blocker = asyncio.Event()
+        release = asyncio.Event()
+        release.set()
+
+        holder = asyncio.create_task(_hold(limiter, "holder", admitted, blocker))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(_hold(limiter, "cancelled", admitted, release))
+        kept = asyncio.create_task(_hold(limiter, "kept", admitted, release))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert limiter.get_stats()["lanes"]["bulk"]["queued"] == 1
+
+        blocker.set()
+        await asyncio.gather(holder, kept)
+        return limiter, admitted
+
+    limiter, admitted = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert admitted == ["holder", "kept"]
+    assert limiter._waiters == []
+    assert limiter.get_stats()["active"] == 0
+
+
+def test_waiter_cancelled_as_it_is_admitted_gives_its_slot_back():
+    async def scenario():
+        limiter = RateLimiter("test", max_concurrency=1)
+        admitted: list[str] = []
+        release = asyncio.Event()
+
+        holder = limiter.acquire()
+        await holder.__aenter__()
+        waiter = asyncio.create_task(_hold(limiter, "waiter", admitted, release))
+        await asyncio.sleep(0)
+
+        await holder.__aexit__(None, None, None)  # Admits the waiter before it gets to run
+        assert limiter.get_stats()["active"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limiter, admitted
+
+    limiter, admitted = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert admitted == []
+    assert limiter.get_stats()["active"] == 0
+    assert limiter.has_spare_capacity()
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.services.rate_limiter import RateLimiter
+from app.services.resilience import call_with_resilience, get_resilience_stats
+
+
+def test_queue_wait_does_not_count_toward_the_timeout():
+    limiter = RateLimiter("test", max_concurrency=1)
+
+    async def _slow():
+        await asyncio.sleep(0.3)
+        return "slow"
+
+    async def _fast():
+        await asyncio.sleep(0.01)
+        return "fast"
+
+    async def _run():
+        slow = asyncio.create_task(call_with_resilience(
+            "test:slow", _slow, timeout=1.0, max_attempts=1, admit=limiter.acquire
+        ))
+        await asyncio.sleep(0.05)  # Let the slow call take the only slot
+        # Waits ~0.25s for the slot, far longer than its own timeout
+        fast = await call_with_resilience("test:fast", _fast, timeout=0.1, max_attempts=1, admit=limiter.acquire)
+        return await slow, fast
+
+    assert asyncio.run(_run()) == ("slow", "fast")
+    stats = get_resilience_stats()["test:fast"]
+    assert stats["timeouts"] == 0
+    assert stats["retries"] == 0
+
+
+def test_slow_admitted_call_times_out_and_retries():
+    attempts = []
+
+    async def _hangs_once():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return "ok"
+
+    result = asyncio.run(call_with_resilience("test:hang", _hangs_once, timeout=0.05, max_attempts=2))
+    assert result == "ok"
+    assert get_resilience_stats()["test:hang"]["timeouts"] == 1
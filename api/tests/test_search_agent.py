@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import app.agents.search_agent as search_agent
+from app.models.factors import FactorDefinition
+
+STRING_FACTOR = FactorDefinition(factor_schema_json='{"type": "string"}', processing_type="none")
+
+
+class FakeDiscovery:
+    """Fakes the LLM and Exa calls of discovery and records when each starts and ends."""
+
+    def __init__(self):
+        self.events: list[str] = []
+        self.shard_outcomes: dict[str, object] = {}
+
+    async def determine_factor_definition(self, factor_name, api_key):
+        self.events.append(f"define {factor_name}")
+        await asyncio.sleep(0.01)
+        self.events.append(f"defined {factor_name}")
+        return STRING_FACTOR
+
+    async def split_category(self, product_category, api_key):
+        self.events.append("split")
+        return ["enterprise", "small business"]
+
+    async def run_research_task(self, instructions, output_schema):
+        segment = next((name for name in ("enterprise", "small business") if f"'{name}' segment" in instructions), "all")
+        outcome = self.shard_outcomes.get(segment, {"products": [{"product_name": f"{segment} CRM"}]})
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def discovery(monkeypatch):
+    fake = FakeDiscovery()
+    for name in ("determine_factor_definition", "split_category", "run_research_task"):
+        monkeypatch.setattr(search_agent, name, getattr(fake, name))
+    return fake
+
+
+def _discover(mode="sharded"):
+    return asyncio.run(search_agent.search_and_extract("CRM", ["Price"], "key", mode=mode))
+
+
+def test_category_is_split_while_factors_are_defined(discovery):
+    products = _discover()
+
+    assert discovery.events.index("split") < discovery.events.index("defined Price")
+    assert [product["product_name"] for product in products] == ["enterprise CRM", "small business CRM"]
+
+
+def test_failed_shard_is_skipped(discovery):
+    discovery.shard_outcomes["enterprise"] = RuntimeError("research failed")
+
+    assert [product["product_name"] for product in _discover()] == ["small business CRM"]
+
+
+def test_first_failure_is_raised_when_every_shard_fails(discovery):
+    discovery.shard_outcomes = {"enterprise": RuntimeError("first"), "small business": RuntimeError("second")}
+
+    with pytest.raises(RuntimeError, match="first"):
+        _discover()
+
+
+def test_cancelled_shard_cancels_discovery(discovery):
+    discovery.shard_outcomes["enterprise"] = asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        _discover()
+
+
+def test_single_mode_does_not_split_the_category(discovery):
+    products = _discover(mode="single")
+
+    assert "split" not in discovery.events
+    assert [product["product_name"] for product in products] == ["all CRM"]
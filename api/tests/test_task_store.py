@@ -0,0 +1,68 @@
+from uuid import uuid4
+
+import pytest
+
+from app.models.tasks import ProcurementData, ProcurementState
+from app.services.task_store import InMemoryTaskStore, SqliteTaskStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryTaskStore()
+    return SqliteTaskStore(database_name=f"tasks-{uuid4().hex}")
+
+
+def _products(count: int) -> list[dict]:
+    return [{"product_name": f"Product {index}", "extracted_factors": []} for index in range(count)]
+
+
+def test_status_reads_do_not_load_results(store):
+    task = ProcurementData(task_id="task-1", initial_query="crm", extracted_data=_products(2), product_count=2)
+    store.save_result("task-1", task.extracted_data)
+    store.save(task)
+
+    status = store.get("task-1")
+    assert status.extracted_data == []
+    assert status.product_count == 2
+    assert store.get_result("task-1") == _products(2)
+
+
+def test_single_products_are_saved_in_place(store):
+    store.save(ProcurementData(task_id="task-1", initial_query="crm"))
+    store.save_result("task-1", _products(3))
+    store.save_result_product("task-1", 1, {"product_name": "Enriched", "extracted_factors": []})
+
+    assert [product["product_name"] for product in store.get_result("task-1")] == ["Product 0", "Enriched", "Product 2"]
+
+    store.save_result("task-1", _products(1))
+    assert store.get_result("task-1") == _products(1)
+
+
+def test_results_are_copies(store):
+    store.save(ProcurementData(task_id="task-1", initial_query="crm", current_state=ProcurementState.COMPLETED))
+    products = _products(1)
+    store.save_result("task-1", products)
+    products[0]["product_name"] = "Changed"
+    store.get_result("task-1")[0]["product_name"] = "Changed"
+
+    assert store.get_result("task-1") == _products(1)
+
+
+def test_claims_are_exclusive_until_the_lease_lapses(store):
+    assert store.claim_task("task-1", "process-a", lease_seconds=60)
+    assert store.claim_task("task-1", "process-a", lease_seconds=60)  # The owner may re-claim
+    assert not store.claim_task("task-1", "process-b", lease_seconds=60)
+
+    store.release_task("task-1", "process-b")  # Not the owner: no effect
+    assert not store.claim_task("task-1", "process-b", lease_seconds=60)
+
+    store.release_task("task-1", "process-a")
+    assert store.claim_task("task-1", "process-b", lease_seconds=-1)  # Already lapsed
+    assert store.claim_task("task-1", "process-a", lease_seconds=60)
+
+
+def test_renewing_keeps_claims_live(store):
+    assert store.claim_task("task-1", "process-a", lease_seconds=-1)
+    store.renew_task_claims("process-a", lease_seconds=60)
+    assert not store.claim_task("task-1", "process-b", lease_seconds=60)
@@ -0,0 +1,116 @@
+"""
+Standalone worker that runs queued analyses outside the API process.
+
+Usage:
+    python -m app.worker [--concurrency N]
+
+Start as many worker processes as needed; they coordinate through the
+SQLite job queue and task store under DATA_DIR.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from loguru import logger
+
+from app.config import (
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_VISIBILITY_TIMEOUT_SECONDS,
+    TASK_STORE_BACKEND,
+    WORKER_CONCURRENCY,
+)
+from app.models.tasks import QueuedJob
+from app.services.analysis_workflow import run_analysis
+from app.services.exa_client import close_exa_client
+from app.services.job_queue import claim_job, complete_job, extend_lease, release_job
+from app.services.llm import close_llm_client
+
+
+async def _keep_lease(job: QueuedJob, worker_id: str, analysis: asyncio.Task) -> None:
+    """Extends the job's lease periodically while the analysis runs, and stops the analysis if the lease is lost."""
+    while True:
+        await asyncio.sleep(JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+        if not extend_lease(job.job_id, worker_id):
+            logger.warning(f"Lost the lease on job {job.job_id}; stopping its analysis")
+            analysis.cancel()
+            return
+
+
+async def _run_job(job: QueuedJob, worker_id: str, api_key: str) -> None:
+    logger.info(f"Worker {worker_id} running job {job.job_id} for task {job.task_id} (attempt {job.attempts})")
+    analysis = asyncio.create_task(run_analysis(job.task_id, api_key))
+    lease_task = asyncio.create_task(_keep_lease(job, worker_id, analysis))
+    try:
+        await analysis
+        complete_job(job.job_id, worker_id)
+    except asyncio.CancelledError:
+        release_job(job.job_id, worker_id)
+        if lease_task.done():
+            return  # The job now belongs to whichever worker claims it next
+        raise
+    finally:
+        lease_task.cancel()
+
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY) -> None:
+    """Claims and runs jobs, with at most `concurrency` analyses in flight."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("GOOGLE_API_KEY not configured")
+    if TASK_STORE_BACKEND != "sqlite":
+        logger.warning("TASK_STORE_BACKEND is not 'sqlite'; the API will not see this worker's task updates")
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_name in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_name, stop_event.set)
+
+    running_jobs: set[asyncio.Task] = set()
+    logger.info(f"Worker {worker_id} started with concurrency {concurrency}")
+
+    while not stop_event.is_set():
+        if len(running_jobs) >= concurrency:
+            # All slots busy: wake up when a job finishes or a shutdown is requested
+            stop_waiter = asyncio.create_task(stop_event.wait())
+            await asyncio.wait(running_jobs | {stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            stop_waiter.cancel()
+            continue
+
+        job = claim_job(worker_id)
+        if job is None:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_task = asyncio.create_task(_run_job(job, worker_id, api_key))
+        running_jobs.add(job_task)
+        job_task.add_done_callback(running_jobs.discard)
+
+    logger.info(f"Worker {worker_id} stopping; returning {len(running_jobs)} running jobs to the queue")
+    for job_task in running_jobs:
+        job_task.cancel()
+    await asyncio.gather(*running_jobs, return_exceptions=True)
+    await close_exa_client()
+    await close_llm_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queued procurement analyses.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Maximum concurrent analyses")
+    args = parser.parse_args()
+    asyncio.run(run_worker(max(1, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@ const STATE_LABELS: { [key: string]: string } = {
   COMPLETED: 'Completed',
   AWAITING_CLARIFICATION: 'Awaiting Your Input',
   ERROR: 'Task Failed',
+  CANCELLED: 'Task Cancelled',
 };
 
 interface StatusStepperProps {
@@ -29,6 +30,7 @@ interface StatusStepperProps {
 const StatusStepper: React.FC<StatusStepperProps> = ({ currentState }) => {
   const isAwaitingClarification = currentState === 'AWAITING_CLARIFICATION';
   const isError = currentState === 'ERROR';
+  const isCancelled = currentState === 'CANCELLED';
 
   // Find the index of the current step in the workflow.
   const currentStepIndex = PROCESS_STEPS.indexOf(currentState);
@@ -45,6 +47,17 @@ const StatusStepper: React.FC<StatusStepperProps> = ({ currentState }) => {
     );
   }
 
+  if (isCancelled) {
+    return (
+      <div className="flex items-center space-x-2">
+        <div className="flex items-center justify-center w-6 h-6 bg-gray-400 rounded-full text-white font-bold">
+          ×
+        </div>
+        <span className="text-gray-500 font-semibold">{STATE_LABELS.CANCELLED}</span>
+      </div>
+    );
+  }
+
   return (
     <div className="flex items-center space-x-4 w-full">
       {PROCESS_STEPS.map((step, index) => {
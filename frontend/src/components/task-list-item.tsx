@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useState } from "react";
-import { getTaskStatus, TaskStatus, submitClarification } from "@/services/api";
+import { cancelTask, getTaskStatus, TaskStatus, submitClarification, subscribeToTaskEvents } from "@/services/api";
 import { Button } from "@/components/ui/button";
 import { ResultsViewer } from "./results-viewer";
 import { ClarificationForm } from "./clarification-form";
@@ -33,16 +33,22 @@ export function TaskListItem({ taskId }: TaskListItemProps) {
     }
   };
 
+  const handleCancel = async () => {
+    try {
+      await cancelTask(taskId);
+      toast.success("Cancellation requested.");
+    } catch (err) {
+      console.error("Failed to cancel task:", err);
+      toast.error("Failed to cancel task.");
+    }
+  };
+
   useEffect(() => {
     const fetchStatus = async () => {
       try {
         const result = await getTaskStatus(taskId);
         setStatus(result);
         setError(null);
-
-        if (result.status === "completed" || result.status === "failed") {
-          return;
-        }
       } catch (err) {
         console.error("Failed to fetch task status:", err);
         setError("Failed to fetch status");
@@ -53,10 +59,19 @@ export function TaskListItem({ taskId }: TaskListItemProps) {
       return;
     }
 
+    // Fetch the full status once, then only again when the server pushes a state change
     fetchStatus();
-    const intervalId = setInterval(fetchStatus, 3000);
+    const unsubscribe = subscribeToTaskEvents(
+      taskId,
+      event => {
+        if (event.type === "state") {
+          fetchStatus();
+        }
+      },
+      fetchStatus,
+    );
 
-    return () => clearInterval(intervalId);
+    return unsubscribe;
   }, [taskId, isSubmittingClarification]);
 
   return (
@@ -76,12 +91,23 @@ export function TaskListItem({ taskId }: TaskListItemProps) {
               <p className="font-mono text-xs text-muted-foreground mt-2">
                 {taskId}
               </p>
+              {status.data.queue_position && (
+                <p className="text-sm text-gray-500 mt-1">
+                  Queued: position {status.data.queue_position}
+                </p>
+              )}
             </>
           ) : (
             <p className="font-mono text-sm">{taskId}</p>
           )}
         </div>
 
+        {status?.status === "running" && (
+          <Button onClick={handleCancel} size="sm" variant="outline">
+            Cancel
+          </Button>
+        )}
+
         {status?.status === "completed" && (
           <div className="flex items-center gap-2">
             <Button
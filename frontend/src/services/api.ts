@@ -1,12 +1,16 @@
 import ky from "ky";
 
+export const API_BASE_URL = "http://127.0.0.1:8000"; // This should be in an env variable
+
 const apiClient = ky.create({
-  prefixUrl: "http://127.0.0.1:8000", // This should be in an env variable
+  prefixUrl: API_BASE_URL,
 });
 
 export interface AnalyzeRequest {
   query: string;
   comparison_factors: string[];
+  deadline_seconds?: number;
+  discovery_mode?: "single" | "sharded";
 }
 
 export interface AnalyzeResponse {
@@ -41,6 +45,38 @@ export const getTaskStatus = async (taskId: string): Promise<TaskStatus> => {
   return response.json();
 };
 
+export interface TaskEvent {
+  type: "state" | "product" | "stage_timing" | "deadline";
+  task_id: string;
+  timestamp: number;
+  [key: string]: any;
+}
+
+export const subscribeToTaskEvents = (
+  taskId: string,
+  onEvent: (event: TaskEvent) => void,
+  onError?: () => void,
+): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/tasks/${taskId}/events`);
+  const handleMessage = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+  ["state", "product", "stage_timing", "deadline"].forEach(eventType =>
+    source.addEventListener(eventType, handleMessage as EventListener)
+  );
+  source.onerror = () => {
+    source.close();
+    onError?.();
+  };
+  return () => source.close();
+};
+
+export const cancelTask = async (taskId: string): Promise<void> => {
+  await apiClient.post(`tasks/${taskId}/cancel`, {
+    headers: {
+      "x-api-key": "test-key",
+    },
+  });
+};
+
 export const submitClarification = async (taskId: string, clarification: string): Promise<void> => {
   await apiClient.post(`tasks/${taskId}/clarify`, { json: { clarification } });
 }; 
\ No newline at end of file